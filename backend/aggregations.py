@@ -0,0 +1,234 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+HISTOGRAM_COLUMNS = ('price', 'sqft', 'bed', 'bath')
+DEFAULT_HISTOGRAM_BINS = 30
+MAX_HISTOGRAM_BINS = 1000
+
+
+class HouseColumns:
+    """The house table as plain NumPy columns: city codes plus one array per numeric field"""
+
+    def __init__(self, city_codes: np.ndarray, city_names: Sequence[str], numeric: Dict[str, np.ndarray]):
+        self.size = len(city_codes)
+        # Categorical codes rather than an object array, so snapshot-backed
+        # columns stay shared between workers
+        self.city_codes = city_codes
+        self.city_names = list(city_names)
+        self.city_lookup = {name: code for code, name in enumerate(self.city_names)}
+        self.numeric = dict(numeric)
+
+    @classmethod
+    def from_frame(cls, house_data) -> 'HouseColumns':
+        """Build from a DataFrame whose ``citi`` column is categorical"""
+        return cls(
+            house_data['citi'].cat.codes.to_numpy(),
+            house_data['citi'].cat.categories.tolist(),
+            {col: house_data[col].to_numpy() for col in HISTOGRAM_COLUMNS}
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.numeric[column]
+
+    def mask(self, city: Optional[str] = None, bed: Optional[float] = None, bath: Optional[float] = None,
+             min_price: Optional[float] = None, max_price: Optional[float] = None) -> Optional[np.ndarray]:
+        """Boolean row mask for the optional filters, or None when nothing is filtered"""
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if city is not None:
+            narrow(self.city_codes == self.city_lookup.get(city, -2))
+        if bed is not None:
+            narrow(self.numeric['bed'] == bed)
+        if bath is not None:
+            narrow(self.numeric['bath'] == bath)
+        if min_price is not None:
+            narrow(self.numeric['price'] >= min_price)
+        if max_price is not None:
+            narrow(self.numeric['price'] <= max_price)
+        return mask
+
+
+# Every CityStats field can be sorted on
+CITY_SORT_FIELDS = ('city', 'avg_price', 'house_count', 'min_price', 'max_price', 'avg_sqft', 'avg_bed', 'avg_bath')
+SORT_ORDERS = ('asc', 'desc')
+
+
+class CityStatsTable:
+    """City statistics records with every sort order computed once per data load.
+
+    A request then only masks one precomputed order with its filters and
+    slices out its page; nothing is sorted per request.
+    """
+
+    def __init__(self, records: Sequence[Dict[str, Any]]):
+        self.records = list(records)
+        self.house_count = np.array([record['house_count'] for record in self.records], dtype=np.int64)
+        self.avg_price = np.array([record['avg_price'] for record in self.records], dtype=np.float64)
+        positions = range(len(self.records))
+        self.orders: Dict[Tuple[str, str], np.ndarray] = {}
+        for field in CITY_SORT_FIELDS:
+            values = [record[field] for record in self.records]
+            # sorted() is stable in both directions, so ties keep record order
+            for order in SORT_ORDERS:
+                ranked = sorted(positions, key=values.__getitem__, reverse=order == 'desc')
+                self.orders[field, order] = np.array(ranked, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def select(self, sort: str = 'avg_price', order: str = 'desc', offset: int = 0, limit: Optional[int] = None,
+               min_count: Optional[int] = None, max_count: Optional[int] = None,
+               min_avg_price: Optional[float] = None,
+               max_avg_price: Optional[float] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of records in the requested order, plus how many records matched the filters"""
+        if sort not in CITY_SORT_FIELDS:
+            raise ValueError(f"sort must be one of {list(CITY_SORT_FIELDS)}")
+        if order not in SORT_ORDERS:
+            raise ValueError(f"order must be one of {list(SORT_ORDERS)}")
+        ranked = self.orders[sort, order]
+
+        mask = None
+        for values, bound, keep in ((self.house_count, min_count, np.greater_equal),
+                                    (self.house_count, max_count, np.less_equal),
+                                    (self.avg_price, min_avg_price, np.greater_equal),
+                                    (self.avg_price, max_avg_price, np.less_equal)):
+            if bound is not None:
+                condition = keep(values, bound)
+                mask = condition if mask is None else mask & condition
+        if mask is not None:
+            ranked = ranked[mask[ranked]]
+
+        page = ranked[offset:] if limit is None else ranked[offset:offset + limit]
+        return [self.records[i] for i in page.tolist()], len(ranked)
+
+
+def histogram(columns: HouseColumns, column: str, bins: Optional[int] = None,
+              edges: Optional[Sequence[float]] = None, **filters) -> Dict[str, Any]:
+    """Bin one column of the (optionally filtered) house table with ``np.histogram``"""
+    if column not in HISTOGRAM_COLUMNS:
+        raise ValueError(f"column must be one of {list(HISTOGRAM_COLUMNS)}")
+    if bins is not None and edges is not None:
+        raise ValueError("Pass either bins or edges, not both")
+    for name in ('bed', 'bath', 'min_price', 'max_price'):
+        # NaN compares false with everything, so it would silently empty the selection
+        if filters.get(name) is not None and not np.isfinite(filters[name]):
+            raise ValueError(f"{name} must be a finite number")
+    if edges is not None:
+        edges = np.asarray(edges, dtype=np.float64)
+        if (len(edges) < 2 or len(edges) - 1 > MAX_HISTOGRAM_BINS or not np.all(np.isfinite(edges))
+                or np.any(np.diff(edges) <= 0)):
+            raise ValueError(f"edges must be 2 to {MAX_HISTOGRAM_BINS + 1} finite, strictly increasing values")
+        bin_spec = edges
+    else:
+        bins = DEFAULT_HISTOGRAM_BINS if bins is None else bins
+        if not 1 <= bins <= MAX_HISTOGRAM_BINS:
+            raise ValueError(f"bins must be between 1 and {MAX_HISTOGRAM_BINS}")
+        bin_spec = bins
+
+    values = columns.numeric[column]
+    mask = columns.mask(**filters)
+    if mask is not None:
+        values = values[mask]
+
+    counts, bin_edges = np.histogram(values, bins=bin_spec)
+    return {
+        'column': column,
+        'edges': bin_edges.tolist(),
+        'counts': counts.tolist(),
+        'total': int(len(values)),
+        'filters': {k: v for k, v in filters.items() if v is not None},
+    }
+
+
+# Fixed so downsampled scatter data is identical across requests and workers
+SAMPLE_SEED = 42
+SAMPLE_GRID = 32
+MAX_SCATTER_POINTS = 50000
+MAX_HEXBIN_GRIDSIZE = 200
+
+
+def _grid_coords(values: np.ndarray, cells: int) -> np.ndarray:
+    low, high = float(values.min()), float(values.max())
+    span = high - low or 1.0
+    return np.minimum(((values - low) / span * cells).astype(np.int64), cells - 1)
+
+
+def stratified_sample(x: np.ndarray, y: np.ndarray, max_points: int,
+                      grid: int = SAMPLE_GRID, seed: int = SAMPLE_SEED) -> np.ndarray:
+    """Indices of at most ``max_points`` points, sampled per cell of a ``grid`` x ``grid`` raster.
+
+    Each occupied cell keeps a share proportional to its population, but at
+    least one point, so sparse regions and outliers survive the downsampling
+    that uniform sampling would erase. Sorted indices are returned.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    cell = _grid_coords(x, grid) * grid + _grid_coords(y, grid)
+    # Random order within each cell (one float sort: the jitter never crosses
+    # into the next cell), then rank points inside their cell
+    order = np.argsort(cell + 0.5 * rng.random(n))
+    sorted_cells = cell[order]
+    counts = np.bincount(sorted_cells, minlength=grid * grid)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(n) - starts[sorted_cells]
+
+    quota = np.maximum(np.floor(counts * (max_points / n)), 1)
+    keep = order[rank < quota[sorted_cells]]
+    if len(keep) > max_points:
+        # The one-per-cell floor can overshoot; trim uniformly
+        keep = rng.choice(keep, size=max_points, replace=False)
+    return np.sort(keep)
+
+
+def hexbin(x: np.ndarray, y: np.ndarray, gridsize: int) -> Dict[str, Any]:
+    """Bin points into a hexagonal grid with ``gridsize`` hexagons across the x range.
+
+    Returns occupied cells only, as parallel arrays of cell centres, point
+    counts and mean ``y`` (price) per cell.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) == 0:
+        return {'gridsize': gridsize, 'x': [], 'y': [], 'count': [], 'mean_price': []}
+
+    nx = gridsize
+    ny = max(int(gridsize / np.sqrt(3)), 1)
+    xmin, ymin = float(x.min()), float(y.min())
+    sx = (float(x.max()) - xmin) / nx or 1.0
+    sy = (float(y.max()) - ymin) / ny or 1.0
+
+    # Two offset rectangular lattices; each point goes to the nearer centre
+    ix, iy = (x - xmin) / sx, (y - ymin) / sy
+    ix1, iy1 = np.round(ix), np.round(iy)
+    ix2, iy2 = np.floor(ix), np.floor(iy)
+    d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+    d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+    on_first = d1 < d2
+    cx = np.where(on_first, ix1, ix2 + 0.5)
+    cy = np.where(on_first, iy1, iy2 + 0.5)
+
+    # Half-integer lattice coordinates doubled into one integer key per cell
+    width = 2 * nx + 4
+    key = (2 * cy).astype(np.int64) * width + (2 * cx).astype(np.int64)
+    cells, inverse = np.unique(key, return_inverse=True)
+    counts = np.bincount(inverse)
+    mean_price = np.bincount(inverse, weights=y) / counts
+
+    return {
+        'gridsize': gridsize,
+        'x': ((cells % width) / 2.0 * sx + xmin).tolist(),
+        'y': ((cells // width) / 2.0 * sy + ymin).tolist(),
+        'count': counts.tolist(),
+        'mean_price': mean_price.tolist(),
+    }
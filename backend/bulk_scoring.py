@@ -0,0 +1,238 @@
+import codecs
+import csv
+import io
+import json
+import math
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from starlette.responses import StreamingResponse
+
+from predictor import CompiledLinearModel
+
+# Rows scored per vectorized pass; bounds memory independently of upload size
+BULK_CHUNK_ROWS = 5000
+# A single line longer than this is rejected rather than buffered
+MAX_LINE_CHARS = 64 * 1024
+
+REQUIRED_COLUMNS = ('citi', 'bed', 'bath', 'sqft')
+OUTPUT_COLUMNS = ['row', 'citi', 'bed', 'bath', 'sqft', 'predicted_price', 'price_range', 'error']
+
+BULK_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+_CONTENT_TYPE_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+}
+
+ParsedRow = Tuple[Optional[str], float, float, float, Optional[str]]
+CityResolver = Callable[[str], Optional[str]]
+
+
+class BulkInputError(ValueError):
+    """Raised when an upload cannot be interpreted at all"""
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body is produced while the request body is still being read.
+
+    Starlette's StreamingResponse watches for disconnects by pulling from
+    ``receive``, which would swallow the request body chunks the generator
+    is consuming. Reading the request stream raises ``ClientDisconnect`` on
+    its own, so the watcher is not needed here.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def format_from_content_type(content_type: str) -> Optional[str]:
+    """Map a request Content-Type onto a bulk format name"""
+    return _CONTENT_TYPE_FORMATS.get(content_type.split(';')[0].strip().lower())
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines without holding more than one line in memory"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    async for chunk in chunks:
+        try:
+            pending += decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            raise BulkInputError(f"Upload is not valid UTF-8: {e.reason}")
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+        if len(pending) > MAX_LINE_CHARS:
+            raise BulkInputError(f"Line longer than {MAX_LINE_CHARS} characters")
+    try:
+        pending += decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise BulkInputError(f"Upload is not valid UTF-8: {e.reason}")
+    if pending:
+        yield pending.rstrip('\r')
+
+
+async def read_csv_header(lines: AsyncIterator[str]) -> Dict[str, int]:
+    """Consume the CSV header line and return the position of each required column"""
+    async for line in lines:
+        if not line.strip():
+            continue
+        header = [name.strip() for name in next(csv.reader([line]))]
+        missing = [col for col in REQUIRED_COLUMNS if col not in header]
+        if missing:
+            raise BulkInputError(f"CSV header is missing columns: {missing}")
+        return {col: header.index(col) for col in REQUIRED_COLUMNS}
+    raise BulkInputError("Upload is empty")
+
+
+def _parse_fields(city, bed, bath, sqft) -> ParsedRow:
+    if city is not None and not isinstance(city, str):
+        return None, math.nan, math.nan, math.nan, "citi must be a string"
+    try:
+        bed, bath, sqft = float(bed), float(bath), float(sqft)
+    except (TypeError, ValueError):
+        return city, math.nan, math.nan, math.nan, "bed, bath and sqft must be numbers"
+    # float() accepts 'inf' and 'nan', which would be priced as Infinity or NaN
+    if not (math.isfinite(bed) and math.isfinite(bath) and math.isfinite(sqft)):
+        return city, math.nan, math.nan, math.nan, "bed, bath and sqft must be finite numbers"
+    if not city:
+        return city, bed, bath, sqft, "citi is required"
+    if not (bed > 0 and bath > 0 and sqft > 0):
+        return city, bed, bath, sqft, "bed, bath and sqft must be greater than 0"
+    return city, bed, bath, sqft, None
+
+
+def parse_csv_lines(lines: List[str], columns: Dict[str, int]) -> List[ParsedRow]:
+    rows = []
+    width = max(columns.values()) + 1
+    for fields in csv.reader(lines):
+        if len(fields) < width:
+            rows.append((None, math.nan, math.nan, math.nan, f"expected at least {width} fields"))
+            continue
+        rows.append(_parse_fields(*(fields[columns[col]] for col in REQUIRED_COLUMNS)))
+    return rows
+
+
+def parse_ndjson_lines(lines: List[str]) -> List[ParsedRow]:
+    rows = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            rows.append((None, math.nan, math.nan, math.nan, "invalid JSON"))
+            continue
+        if not isinstance(record, dict):
+            rows.append((None, math.nan, math.nan, math.nan, "expected a JSON object"))
+            continue
+        rows.append(_parse_fields(
+            record.get('citi', record.get('city')), record.get('bed'), record.get('bath'), record.get('sqft')
+        ))
+    return rows
+
+
+def score_rows(model: CompiledLinearModel, rows: List[ParsedRow],
+               resolve_city: Optional[CityResolver] = None) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """Score one chunk of parsed rows in a single vectorized pass.
+
+    ``resolve_city`` maps input spellings onto canonical city names (None for
+    an unknown city); without it only the model's exact city names are known.
+    """
+    errors = [row[4] for row in rows]
+    cities = []
+    for i, row in enumerate(rows):
+        city = None
+        if errors[i] is None:
+            city = resolve_city(row[0]) if resolve_city is not None else (row[0] if model.has_city(row[0]) else None)
+            if city is None:
+                errors[i] = f"Unknown city: {row[0]}"
+        cities.append(city if errors[i] is None else '')
+    prices = model.predict_many(
+        sqft=np.array([row[3] for row in rows]),
+        bed=np.array([row[1] for row in rows]),
+        bath=np.array([row[2] for row in rows]),
+        city_idx=model.city_index(cities)
+    )
+    # Finite inputs can still overflow; Infinity is not valid JSON
+    for i in np.flatnonzero(~np.isfinite(prices)).tolist():
+        if errors[i] is None:
+            errors[i] = "Model produced an invalid prediction"
+    return prices, errors
+
+
+def _format_chunk(fmt: str, first_row: int, rows: List[ParsedRow], prices: np.ndarray,
+                  errors: List[Optional[str]], price_range: Callable[[float], str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n') if fmt == 'csv' else None
+    for offset, (row, price, error) in enumerate(zip(rows, prices.tolist(), errors)):
+        city, bed, bath, sqft, _ = row
+        predicted = None if error is not None else price
+        record = {
+            'row': first_row + offset,
+            'citi': city,
+            'bed': None if math.isnan(bed) else bed,
+            'bath': None if math.isnan(bath) else bath,
+            'sqft': None if math.isnan(sqft) else sqft,
+            'predicted_price': predicted,
+            'price_range': None if predicted is None else price_range(predicted),
+            'error': error,
+        }
+        if writer is not None:
+            writer.writerow(['' if record[col] is None else record[col] for col in OUTPUT_COLUMNS])
+        else:
+            buffer.write(json.dumps(record))
+            buffer.write('\n')
+    return buffer.getvalue()
+
+
+def _error_line(fmt: str, row: int, message: str) -> str:
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerow([row] + [''] * (len(OUTPUT_COLUMNS) - 2) + [message])
+        return buffer.getvalue()
+    return json.dumps({'row': row, 'error': message}) + '\n'
+
+
+async def score_stream(model: CompiledLinearModel, lines: AsyncIterator[str], fmt: str,
+                       columns: Optional[Dict[str, int]], price_range: Callable[[float], str],
+                       chunk_rows: int = BULK_CHUNK_ROWS,
+                       resolve_city: Optional[CityResolver] = None) -> AsyncIterator[bytes]:
+    """Yield scored output for an upload chunk by chunk as the lines arrive"""
+    if fmt == 'csv':
+        yield (','.join(OUTPUT_COLUMNS) + '\n').encode()
+
+    next_row = 0
+    batch: List[str] = []
+
+    def flush() -> bytes:
+        rows = parse_csv_lines(batch, columns) if fmt == 'csv' else parse_ndjson_lines(batch)
+        prices, errors = score_rows(model, rows, resolve_city)
+        return _format_chunk(fmt, next_row, rows, prices, errors, price_range).encode()
+
+    try:
+        async for line in lines:
+            if not line.strip():
+                continue
+            batch.append(line)
+            if len(batch) >= chunk_rows:
+                yield flush()
+                next_row += len(batch)
+                batch = []
+    except BulkInputError as e:
+        # The response has already started, so report the problem in-band
+        if batch:
+            yield flush()
+            next_row += len(batch)
+        yield _error_line(fmt, next_row, str(e)).encode()
+        return
+
+    if batch:
+        yield flush()
@@ -0,0 +1,124 @@
+import copy
+import difflib
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+# Queries at least this long fall back to fuzzy matching when prefixes run out
+FUZZY_MIN_CHARS = 3
+FUZZY_CUTOFF = 0.75
+# Names sharing the most trigrams with the query that difflib then scores
+FUZZY_CANDIDATES = 20
+
+# Every city in the data is in California, so the state is optional in input
+_STATE_SUFFIXES = (' ca', ' california')
+# Abbreviations spelled out, so "Mt. Baldy" and "Mount Baldy" meet
+_ABBREVIATIONS = {'st': 'saint', 'mt': 'mount', 'ft': 'fort', 'pt': 'point'}
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_city(name: str) -> str:
+    """Case-, accent-, punctuation- and state-insensitive form of a city name"""
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+    text = _NON_ALNUM.sub(' ', text).strip()
+    for suffix in _STATE_SUFFIXES:
+        if text.endswith(suffix) and len(text) > len(suffix):
+            text = text[:-len(suffix)]
+            break
+    return ' '.join(_ABBREVIATIONS.get(word, word) for word in text.split())
+
+
+def _trigrams(text: str) -> set:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityIndex:
+    """Normalized city names mapped to their canonical spelling, plus a sorted prefix index.
+
+    ``prefixes`` holds the normalized full name of every city and each of its
+    word-boundary suffixes ("san diego", "diego"), sorted, so all cities with
+    a word starting with the query sit in one contiguous run found by bisect.
+    """
+
+    def __init__(self, cities: Iterable[str], house_counts: Optional[Mapping[str, int]] = None):
+        self.canonical: Dict[str, str] = {}
+        for city in cities:
+            self.canonical.setdefault(normalize_city(city), city)
+        self._set_house_counts(house_counts or {})
+
+        entries: List[Tuple[str, int, str]] = []
+        for key, city in self.canonical.items():
+            words = key.split()
+            for start in range(len(words)):
+                # 0 = the query is a prefix of the whole name, ranked first
+                entries.append((' '.join(words[start:]), 0 if start == 0 else 1, city))
+        entries.sort()
+        self.prefixes = [entry[0] for entry in entries]
+        self._entries = entries
+        self._names = list(self.canonical)
+        self._trigram_names = defaultdict(list)
+        for position, key in enumerate(self._names):
+            for trigram in _trigrams(key):
+                self._trigram_names[trigram].append(position)
+
+    def _set_house_counts(self, house_counts: Mapping[str, int]):
+        self.house_counts = {city: int(house_counts.get(city, 0)) for city in self.canonical.values()}
+        self.by_popularity = sorted(self.house_counts, key=lambda city: (-self.house_counts[city], city))
+
+    def with_house_counts(self, house_counts: Mapping[str, int]) -> 'CityIndex':
+        """A copy ranked by new listing counts, sharing this index's name tables"""
+        index = copy.copy(self)
+        index._set_house_counts(house_counts)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.canonical)
+
+    def resolve(self, city: str) -> Optional[str]:
+        """Canonical spelling of ``city``, or None if it is not a known city"""
+        return self.canonical.get(normalize_city(city))
+
+    def suggest(self, city: str, limit: int = 3) -> List[str]:
+        """Closest known spellings for an unrecognized city"""
+        return [self.canonical[key] for key in self._close_matches(normalize_city(city), limit, 0.6)]
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> List[Dict[str, object]]:
+        """Autocomplete: whole-name prefix matches, then word prefix matches, then fuzzy ones.
+
+        Within each group the cities with more listings come first.
+        """
+        q = normalize_city(query)
+        if not q:
+            return [self._result(city, 'popular') for city in self.by_popularity[:limit]]
+
+        best: Dict[str, int] = {}
+        position = bisect_left(self.prefixes, q)
+        while position < len(self._entries) and self.prefixes[position].startswith(q):
+            _, rank, city = self._entries[position]
+            best[city] = min(rank, best.get(city, rank))
+            position += 1
+        ordered = sorted(best, key=lambda city: (best[city], -self.house_counts[city], city))
+        results = [self._result(city, 'prefix' if best[city] == 0 else 'word') for city in ordered[:limit]]
+
+        if len(results) < limit and len(q) >= FUZZY_MIN_CHARS:
+            for key in self._close_matches(q, limit, FUZZY_CUTOFF):
+                city = self.canonical[key]
+                if city not in best and len(results) < limit:
+                    results.append(self._result(city, 'fuzzy'))
+        return results
+
+    def _close_matches(self, q: str, limit: int, cutoff: float) -> List[str]:
+        """difflib.get_close_matches over only the names sharing the most trigrams with ``q``"""
+        shared = Counter()
+        for trigram in _trigrams(q):
+            shared.update(self._trigram_names.get(trigram, ()))
+        candidates = [self._names[position] for position, _ in shared.most_common(FUZZY_CANDIDATES)]
+        return difflib.get_close_matches(q, candidates, n=limit, cutoff=cutoff)
+
+    def _result(self, city: str, match: str) -> Dict[str, object]:
+        return {'city': city, 'house_count': self.house_counts[city], 'match': match}
@@ -0,0 +1,220 @@
+"""Nearest comparable listings by normalized (sqft, bed, bath), per city.
+
+    python comparables.py [--scale 100] [--queries 2000]
+
+benchmarks the index against a brute-force scan, optionally on the house
+table replicated ``--scale`` times to stand in for a larger listing feed.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from aggregations import HouseColumns
+
+DEFAULT_COMPARABLES = 5
+MAX_COMPARABLES = 50
+FEATURES = ('sqft', 'bed', 'bath')
+
+
+def _bucket_heads(points: np.ndarray, codes: Optional[np.ndarray] = None) -> np.ndarray:
+    """Positions where (city,) bed or bath changes in rows sorted by them"""
+    change = (np.diff(points[:, 1]) != 0) | (np.diff(points[:, 2]) != 0)
+    if codes is not None:
+        change |= np.diff(codes) != 0
+    return np.concatenate(([0], np.flatnonzero(change) + 1))
+
+
+class _Block:
+    """Rows of one city (or of every city) bucketed by exact (bed, bath), each bucket sorted by sqft.
+
+    bed and bath take few distinct values, so the distance from a query to
+    a whole bucket has a lower bound from those two coordinates alone.
+    Buckets are visited from the lowest bound up and the search stops once
+    the bound exceeds the k-th distance found so far; inside a bucket only
+    the run of rows nearest in sqft is scored.
+    """
+
+    __slots__ = ('bed', 'bath', 'sqft', 'rows', 'bounds')
+
+    def __init__(self, rows: np.ndarray, points: np.ndarray, heads: Optional[np.ndarray] = None):
+        """``points`` (scaled sqft, bed, bath) must already be sorted by bed, bath, then sqft.
+
+        ``heads`` are the first positions of each bucket, when already known.
+        """
+        if heads is None:
+            heads = _bucket_heads(points)
+        self.bed, self.bath = points[heads, 1], points[heads, 2]
+        self.sqft = points[:, 0]
+        self.rows = rows
+        # Bucket b is sqft[bounds[b]:bounds[b + 1]]
+        self.bounds = np.append(heads, len(rows)).tolist()
+
+    def nearest(self, query: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact k nearest rows and their distances, nearest first; ties go to the lower row"""
+        want = k if exclude is None else k + len(exclude)
+        bound = (self.bed - query[1]) ** 2 + (self.bath - query[2]) ** 2
+        found_rows, found_dist = [], []
+        kth = np.inf
+        count = 0
+        for bucket in np.argsort(bound, kind='stable').tolist():
+            if bound[bucket] > kth:
+                break
+            first, last = self.bounds[bucket], self.bounds[bucket + 1]
+            sqft = self.sqft[first:last]
+            # The ``want`` rows nearest in sqft, widened to every row tied with the last of them
+            centre = int(np.searchsorted(sqft, query[0]))
+            lo, hi = max(centre - want, 0), min(centre + want, len(sqft))
+            gap = np.abs(sqft[lo:hi] - query[0])
+            if hi - lo >= want:
+                reach = np.partition(gap, want - 1)[want - 1]
+                lo = int(np.searchsorted(sqft, query[0] - reach, side='left'))
+                hi = int(np.searchsorted(sqft, query[0] + reach, side='right'))
+            squared = bound[bucket] + (sqft[lo:hi] - query[0]) ** 2
+            found_rows.append(self.rows[first + lo:first + hi])
+            found_dist.append(squared)
+            count += hi - lo
+            if count >= want:
+                kth = np.partition(np.concatenate(found_dist), want - 1)[want - 1]
+
+        rows = np.concatenate(found_rows) if found_rows else np.empty(0, dtype=np.intp)
+        dist = np.concatenate(found_dist) if found_dist else np.empty(0)
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(rows, exclude)
+            rows, dist = rows[keep], dist[keep]
+        order = np.lexsort((rows, dist))[:k]
+        return rows[order], np.sqrt(dist[order])
+
+
+class ComparablesIndex:
+    """Per-city bucketed index over ``FEATURES`` scaled by their standard deviation.
+
+    Built once per data load. A query looks at its own city first and fills
+    any shortfall from the whole table (there are no coordinates to find
+    geographically nearby cities). Results are exact: the same rows a
+    brute-force scan of the city would return.
+    """
+
+    def __init__(self, houses: HouseColumns):
+        self.houses = houses
+        raw = np.column_stack([np.asarray(houses[f], dtype=np.float64) for f in FEATURES])
+        std = raw.std(axis=0)
+        self.scale = np.where(std > 0, std, 1.0)
+        points = raw / self.scale
+
+        # One sort by (city, bed, bath, sqft); every city's block is then a
+        # contiguous, already-sorted slice
+        codes = np.asarray(houses.city_codes, dtype=np.int64)
+        order = np.lexsort((points[:, 0], points[:, 2], points[:, 1], codes))
+        ordered = points[order]
+        heads = _bucket_heads(ordered, codes[order])
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(houses.city_names)))))
+        first_heads = np.searchsorted(heads, bounds).tolist()
+        bounds = bounds.tolist()
+        self.blocks: Dict[int, _Block] = {}
+        for code in range(len(houses.city_names)):
+            lo, hi = bounds[code], bounds[code + 1]
+            if hi > lo:
+                city_heads = heads[first_heads[code]:first_heads[code + 1]] - lo
+                self.blocks[code] = _Block(order[lo:hi], ordered[lo:hi], city_heads)
+        everywhere = np.lexsort((points[:, 0], points[:, 2], points[:, 1]))
+        self.everywhere = _Block(everywhere, points[everywhere])
+
+    def query(self, city: Optional[str], sqft: float, bed: float, bath: float,
+              k: int = DEFAULT_COMPARABLES) -> List[Dict[str, object]]:
+        """The ``k`` listings closest to the house, same-city listings first"""
+        point = np.array([sqft, bed, bath], dtype=np.float64) / self.scale
+        block = self.blocks.get(self.houses.city_lookup.get(city, -1)) if city is not None else None
+
+        rows = np.empty(0, dtype=np.intp)
+        dist = np.empty(0)
+        if block is not None:
+            rows, dist = block.nearest(point, k)
+        same_city = len(rows)
+        if len(rows) < k:
+            extra_rows, extra_dist = self.everywhere.nearest(point, k - len(rows), exclude=rows)
+            rows, dist = np.concatenate((rows, extra_rows)), np.concatenate((dist, extra_dist))
+
+        names = self.houses.city_names
+        codes = self.houses.city_codes
+        return [
+            {
+                'row': int(row),
+                'city': names[codes[row]],
+                'sqft': float(self.houses['sqft'][row]),
+                'bed': float(self.houses['bed'][row]),
+                'bath': float(self.houses['bath'][row]),
+                'price': float(self.houses['price'][row]),
+                'distance': round(float(d), 6),
+                'same_city': i < same_city,
+            }
+            for i, (row, d) in enumerate(zip(rows.tolist(), dist.tolist()))
+        ]
+
+
+def brute_force(houses: HouseColumns, scale: np.ndarray, city: Optional[str], sqft: float, bed: float,
+                bath: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reference scan of the whole table, for tests and the benchmark"""
+    points = np.column_stack([np.asarray(houses[f], dtype=np.float64) for f in FEATURES]) / scale
+    delta = points - np.array([sqft, bed, bath]) / scale
+    # Summed in the index's order, so equal distances compare equal in both
+    dist = np.sqrt((delta[:, 1] ** 2 + delta[:, 2] ** 2) + delta[:, 0] ** 2)
+    in_city = np.asarray(houses.city_codes) == houses.city_lookup.get(city, -2)
+    rows = np.flatnonzero(in_city)
+    rows = rows[np.lexsort((rows, dist[rows]))][:k]
+    if len(rows) < k:
+        others = np.setdiff1d(np.arange(len(dist)), rows)
+        others = others[np.lexsort((others, dist[others]))][:k - len(rows)]
+        rows = np.concatenate((rows, others))
+    return rows, dist[rows]
+
+
+def _replicate(houses: HouseColumns, times: int, seed: int = 0) -> HouseColumns:
+    rng = np.random.default_rng(seed)
+    numeric = {}
+    for col in ('price', *FEATURES):
+        values = np.tile(np.asarray(houses[col], dtype=np.float64), times)
+        if col == 'sqft':
+            values = values * rng.uniform(0.95, 1.05, len(values))
+        numeric[col] = values
+    return HouseColumns(np.tile(houses.city_codes, times), houses.city_names, numeric)
+
+
+def main():
+    import argparse
+    import time
+
+    from dataset import load_house_dataset
+
+    parser = argparse.ArgumentParser(description="Comparables index vs brute force")
+    parser.add_argument('--scale', type=int, default=1, help="Replicate the house table this many times")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('-k', type=int, default=DEFAULT_COMPARABLES)
+    args = parser.parse_args()
+
+    houses = load_house_dataset().house_data
+    if args.scale > 1:
+        houses = _replicate(houses, args.scale)
+    started = time.perf_counter()
+    index = ComparablesIndex(houses)
+    print(f"{len(houses)} listings, index built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(houses), args.queries)
+    queries = [(houses.city_names[houses.city_codes[i]], float(houses['sqft'][i]) * rng.uniform(0.8, 1.2),
+                float(houses['bed'][i]), float(houses['bath'][i])) for i in picks]
+
+    for label, run in [
+        ('index', lambda q: index.query(*q, k=args.k)),
+        ('brute force', lambda q: brute_force(houses, index.scale, *q, k=args.k)),
+    ]:
+        timings = []
+        for q in queries[:args.queries if label == 'index' else max(args.queries // 10, 50)]:
+            t = time.perf_counter()
+            run(q)
+            timings.append((time.perf_counter() - t) * 1e6)
+        timings = np.array(timings)
+        print(f"{label:>12}: median {np.median(timings):.0f} us, p99 {np.percentile(timings, 99):.0f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from aggregations import HouseColumns
+from predictor import CompiledLinearModel, load_artifact
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# The only socal2.csv columns the backend reads; street, image_id and n_citi are never used
+HOUSE_COLUMNS = ['citi', 'bed', 'bath', 'sqft', 'price']
+# groupby aggregate -> CityStats field
+CITY_STAT_COLUMNS = {
+    ('price', 'mean'): 'avg_price',
+    ('price', 'count'): 'house_count',
+    ('price', 'min'): 'min_price',
+    ('price', 'max'): 'max_price',
+    ('sqft', 'mean'): 'avg_sqft',
+    ('bed', 'mean'): 'avg_bed',
+    ('bath', 'mean'): 'avg_bath',
+}
+# The price bands of house_stats['price_ranges']; a price equal to a max belongs to that band
+PRICE_RANGES = {
+    'low': {'min': 195000, 'max': 796666},
+    'mid': {'min': 796667, 'max': 1398333},
+    'high': {'min': 1398334, 'max': 2000000},
+}
+
+# Bump whenever the snapshot layout or the derived statistics change
+SNAPSHOT_VERSION = 4
+CSV_PATH = Path(__file__).parent.parent / 'images' / 'socal2.csv'
+MODEL_PATH = Path(__file__).parent.parent / 'linear_regression_model_retrained.json'
+SNAPSHOT_PATH = Path(os.environ.get('HOUSE_SNAPSHOT_PATH', CSV_PATH.with_suffix('.snapshot')))
+
+
+class HouseDataset(NamedTuple):
+    """Everything the server derives from socal2.csv, in pandas-free form"""
+    house_data: HouseColumns
+    city_stats: List[Dict[str, Any]]
+    house_stats: Dict[str, Any]
+    correlations: Dict[str, float]
+    source: str
+
+
+# pandas is imported inside the CSV functions only: serving from a snapshot never needs it
+
+def frame_memory(df: 'pd.DataFrame') -> int:
+    """Bytes held by a frame, including the contents of string and categorical columns"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def downcast_lossless(series: 'pd.Series') -> 'pd.Series':
+    """Narrow int64 to int32 and float64 to float32, but only when every value round-trips exactly"""
+    import pandas as pd
+    
+    if pd.api.types.is_integer_dtype(series.dtype):
+        info = np.iinfo(np.int32)
+        if series.empty or (series.min() >= info.min and series.max() <= info.max):
+            return series.astype(np.int32)
+    elif pd.api.types.is_float_dtype(series.dtype):
+        narrowed = series.astype(np.float32)
+        if narrowed.astype(series.dtype).equals(series):
+            return narrowed
+    return series
+
+
+def compact_house_frame(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Keep the used columns with the city as a categorical and numbers downcast losslessly"""
+    compact = df[HOUSE_COLUMNS].copy()
+    compact['citi'] = compact['citi'].astype('category')
+    for col in HOUSE_COLUMNS[1:]:
+        compact[col] = downcast_lossless(compact[col])
+    return compact
+
+
+def read_house_csv(csv_path: Path) -> Tuple['pd.DataFrame', Dict[str, int]]:
+    """Read socal2.csv into the compact representation and report its memory before and after"""
+    import pandas as pd
+    
+    raw = pd.read_csv(csv_path, usecols=HOUSE_COLUMNS)
+    compact = compact_house_frame(raw)
+    report = {'default_bytes': frame_memory(raw), 'compact_bytes': frame_memory(compact)}
+    logging.info(
+        f"House data memory: {report['default_bytes'] / 1e6:.2f} MB default-typed -> "
+        f"{report['compact_bytes'] / 1e6:.2f} MB compact "
+        f"({', '.join(f'{col}={dtype}' for col, dtype in compact.dtypes.items())})"
+    )
+    return compact, report
+
+
+def compute_house_stats(house_data: 'pd.DataFrame') -> Tuple['pd.DataFrame', Dict[str, Any], Dict[str, float]]:
+    """Per-city aggregates, overall statistics and price correlations for the house table"""
+    # Calculate city statistics
+    city_stats = house_data.groupby('citi', observed=True).agg({
+        'price': ['mean', 'count', 'min', 'max'],
+        'sqft': 'mean',
+        'bed': 'mean',
+        'bath': 'mean'
+    }).round(2)
+    
+    # Calculate overall statistics
+    house_stats = {
+        'total_houses': len(house_data),
+        'avg_price': house_data['price'].mean(),
+        'avg_sqft': house_data['sqft'].mean(),
+        'avg_bed': house_data['bed'].mean(),
+        'avg_bath': house_data['bath'].mean(),
+        'price_ranges': {name: {**bounds, 'count': 0} for name, bounds in PRICE_RANGES.items()},
+        'bed_distribution': {str(k): v for k, v in house_data['bed'].value_counts().to_dict().items()},
+        'bath_distribution': {str(k): v for k, v in house_data['bath'].value_counts().to_dict().items()}
+    }
+    
+    # Calculate price range counts
+    low_max, mid_max = PRICE_RANGES['low']['max'], PRICE_RANGES['mid']['max']
+    house_stats['price_ranges']['low']['count'] = len(house_data[house_data['price'] <= low_max])
+    house_stats['price_ranges']['mid']['count'] = len(house_data[(house_data['price'] > low_max) & (house_data['price'] <= mid_max)])
+    house_stats['price_ranges']['high']['count'] = len(house_data[house_data['price'] > mid_max])
+    
+    correlations = {
+        'price_sqft': float(house_data[['price', 'sqft']].corr().iloc[0, 1]),
+        'price_bed': float(house_data[['price', 'bed']].corr().iloc[0, 1]),
+        'price_bath': float(house_data[['price', 'bath']].corr().iloc[0, 1])
+    }
+    return city_stats, house_stats, correlations
+
+
+def city_stats_records(city_names: List[str], stats: Dict[Tuple[str, str], np.ndarray]) -> List[Dict[str, Any]]:
+    """One CityStats-shaped dict per city from the aggregate columns"""
+    columns = {field: stats[stat].tolist() for stat, field in CITY_STAT_COLUMNS.items()}
+    return [
+        {'city': city, **{field: values[i] for field, values in columns.items()}}
+        for i, city in enumerate(city_names)
+    ]
+
+
+def dataset_from_frame(house_data: 'pd.DataFrame', source: str = 'csv') -> HouseDataset:
+    """Derive statistics with pandas and hand them over as NumPy columns and plain records"""
+    city_stats, house_stats, correlations = compute_house_stats(house_data)
+    records = city_stats_records(
+        city_stats.index.astype(str).tolist(),
+        {stat: city_stats[stat].to_numpy() for stat in CITY_STAT_COLUMNS}
+    )
+    # Round-trip through JSON types so both load paths hand out identical plain values
+    house_stats = json.loads(json.dumps(house_stats, default=_json_default))
+    return HouseDataset(HouseColumns.from_frame(house_data), records, house_stats, correlations, source)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    # NumPy scalars from value_counts() and the aggregations
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def write_snapshot(csv_path: Path = CSV_PATH, snapshot_path: Path = SNAPSHOT_PATH,
+                   model_path: Optional[Path] = MODEL_PATH) -> Path:
+    """Build the binary snapshot: one .npy per column plus meta.json with the derived statistics.
+    
+    The compiled model's coefficient vector is stored alongside, so every
+    uvicorn worker memory-maps the same read-only pages for both. The
+    directory is written beside its final location and renamed into place,
+    so a running server never sees a half-written snapshot.
+    """
+    house_data, _ = read_house_csv(csv_path)
+    city_stats, house_stats, correlations = compute_house_stats(house_data)
+    
+    staging = snapshot_path.with_name(snapshot_path.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    
+    np.save(staging / 'citi_codes.npy', house_data['citi'].cat.codes.to_numpy())
+    for col in HOUSE_COLUMNS[1:]:
+        np.save(staging / f'{col}.npy', house_data[col].to_numpy())
+    for stat in CITY_STAT_COLUMNS:
+        np.save(staging / f'city_stats.{stat[0]}.{stat[1]}.npy', city_stats[stat].to_numpy())
+    
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'source': csv_path.name,
+        'source_sha256': file_sha256(csv_path),
+        'rows': len(house_data),
+        'cities': house_data['citi'].cat.categories.tolist(),
+        'city_stats_index': city_stats.index.astype(str).tolist(),
+        'house_stats': house_stats,
+        'correlations': correlations,
+    }
+    if model_path is not None and model_path.exists():
+        model = load_artifact(model_path)
+        np.save(staging / 'model_coef.npy', model.coef)
+        meta['model'] = {
+            'source': model_path.name,
+            'source_sha256': file_sha256(model_path),
+            'feature_names': model.feature_names,
+            'intercept': model.intercept,
+            'intervals': model.intervals,
+        }
+    with open(staging / 'meta.json', 'w') as f:
+        json.dump(meta, f, default=_json_default)
+    
+    shutil.rmtree(snapshot_path, ignore_errors=True)
+    os.replace(staging, snapshot_path)
+    return snapshot_path
+
+
+def _read_snapshot_meta(snapshot_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(snapshot_path / 'meta.json') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != SNAPSHOT_VERSION:
+        logging.info(f"Ignoring snapshot {snapshot_path}: version {meta.get('version')} != {SNAPSHOT_VERSION}")
+        return None
+    return meta
+
+
+def load_snapshot(snapshot_path: Path = SNAPSHOT_PATH, csv_path: Path = CSV_PATH) -> Optional[HouseDataset]:
+    """Memory-map a snapshot, or return None if it is missing, stale or from another version"""
+    meta = _read_snapshot_meta(snapshot_path)
+    if meta is None:
+        return None
+    if meta.get('source_sha256') != file_sha256(csv_path):
+        logging.info(f"Ignoring snapshot {snapshot_path}: {csv_path.name} changed since it was built")
+        return None
+    
+    def column(name: str) -> np.ndarray:
+        return np.load(snapshot_path / f'{name}.npy', mmap_mode='r')
+    
+    codes = column('citi_codes')
+    if len(codes) != meta['rows'] or (len(codes) and (codes.min() < 0 or codes.max() >= len(meta['cities']))):
+        return None
+    house_data = HouseColumns(codes, meta['cities'], {col: column(col) for col in HOUSE_COLUMNS[1:]})
+    city_stats = city_stats_records(
+        meta['city_stats_index'],
+        {stat: column(f'city_stats.{stat[0]}.{stat[1]}') for stat in CITY_STAT_COLUMNS}
+    )
+    return HouseDataset(house_data, city_stats, meta['house_stats'], meta['correlations'], 'snapshot')
+
+
+def load_snapshot_model(snapshot_path: Path = SNAPSHOT_PATH, model_path: Path = MODEL_PATH) -> Optional[CompiledLinearModel]:
+    """The compiled model over the snapshot's memory-mapped coefficients, if built from ``model_path``"""
+    meta = _read_snapshot_meta(snapshot_path)
+    if meta is None or 'model' not in meta:
+        return None
+    if not model_path.exists() or meta['model']['source_sha256'] != file_sha256(model_path):
+        logging.info(f"Ignoring snapshot model in {snapshot_path}: {model_path.name} changed since it was built")
+        return None
+    coef = np.load(snapshot_path / 'model_coef.npy', mmap_mode='r')
+    return CompiledLinearModel(meta['model']['feature_names'], coef, meta['model']['intercept'],
+                               meta['model'].get('intervals'))
+
+
+def load_house_dataset(csv_path: Path = CSV_PATH, snapshot_path: Path = SNAPSHOT_PATH) -> HouseDataset:
+    """Load from a valid snapshot when there is one, otherwise parse the CSV and recompute"""
+    started = time.perf_counter()
+    dataset = load_snapshot(snapshot_path, csv_path)
+    if dataset is None:
+        house_data, _ = read_house_csv(csv_path)
+        dataset = dataset_from_frame(house_data)
+    logging.info(f"House data loaded from {dataset.source} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="House dataset maintenance")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('snapshot', help="Write the binary snapshot the server loads at startup")
+    sub.add_parser('memory', help="Compare the compact frame with a default pd.read_csv")
+    sub.add_parser('bench', help="Time a CSV load against a snapshot load")
+    args = parser.parse_args()
+    
+    if args.command == 'snapshot':
+        path = write_snapshot()
+        print(f"Wrote {path} (version {SNAPSHOT_VERSION})")
+    elif args.command == 'memory':
+        import pandas as pd
+        
+        # Full comparison against the old load path, which kept every column
+        full = pd.read_csv(CSV_PATH)
+        compact = compact_house_frame(full)
+        before, after = frame_memory(full), frame_memory(compact)
+        print(f"pd.read_csv, all columns: {before / 1e6:.2f} MB")
+        print(f"compact:                  {after / 1e6:.2f} MB ({before / after:.1f}x smaller)")
+        print(compact.dtypes.to_string())
+    elif args.command == 'bench':
+        for label, loader in [('csv', lambda: load_house_dataset(snapshot_path=Path('/nonexistent'))),
+                              ('snapshot', load_house_dataset)]:
+            timings = []
+            for _ in range(5):
+                started = time.perf_counter()
+                dataset = loader()
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{label:>8} ({dataset.source}): best {min(timings):.1f} ms, median {sorted(timings)[2]:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+# Processed images are ~5-100 KB, so this holds a few hundred to a few thousand
+IMAGE_CACHE_BYTES = int(os.environ.get('IMAGE_CACHE_BYTES', 32 * 1024 * 1024))
+# Optional second tier that survives restarts and is shared by workers on one host
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR')
+IMAGE_CACHE_DISK_BYTES = int(os.environ.get('IMAGE_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+_HASH_CHUNK = 1024 * 1024
+
+ProcessedImage = Tuple[bytes, str]
+
+
+def upload_digest(image_data: Union[bytes, BinaryIO]) -> str:
+    """SHA-256 of the uploaded bytes; a file is read in chunks and rewound"""
+    digest = hashlib.sha256()
+    if isinstance(image_data, bytes):
+        digest.update(image_data)
+    else:
+        for chunk in iter(lambda: image_data.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+        image_data.seek(0)
+    return digest.hexdigest()
+
+
+def cache_key(digest: str, *params) -> str:
+    """Content hash plus every processing parameter that changes the output"""
+    return hashlib.sha256(':'.join([digest, *map(str, params)]).encode()).hexdigest()
+
+
+class ProcessedImageCache:
+    """Byte-bounded LRU of processed images, with an optional on-disk tier.
+
+    Safe to use from the image pool's worker threads. Disk entries are
+    written to a temporary file and renamed into place, so concurrent
+    workers never read a partial file.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_BYTES, disk_dir: Optional[str] = IMAGE_CACHE_DIR,
+                 max_disk_bytes: int = IMAGE_CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        # Running estimate; other workers writing to the same directory are
+        # accounted for whenever a trim rescans it
+        self._disk_size = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_size = sum(f.stat().st_size for f in self.disk_dir.glob('*/*'))
+        self._entries: 'OrderedDict[str, ProcessedImage]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: str) -> Optional[ProcessedImage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+        entry = self._read_disk(key)
+        with self._lock:
+            self.counters['disk_hits' if entry is not None else 'misses'] += 1
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: ProcessedImage):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['disk_hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': round((lookups - self.counters['misses']) / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'disk': self.disk_dir is not None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remember(self, key: str, entry: ProcessedImage):
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.counters['evictions'] += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def _read_disk(self, key: str) -> Optional[ProcessedImage]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            raw = path.read_bytes()
+            # Recently used entries survive trimming, which goes by mtime
+            os.utime(path)
+        except OSError:
+            return None
+        mime_type, _, body = raw.partition(b'\n')
+        return body, mime_type.decode()
+
+    def _write_disk(self, key: str, entry: ProcessedImage):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f'{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+            raw = entry[1].encode() + b'\n' + entry[0]
+            tmp_path.write_bytes(raw)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_size += len(raw)
+                over_budget = self._disk_size > self.max_disk_bytes
+            if over_budget:
+                self._trim_disk()
+        except OSError:
+            # The disk tier is best effort; the memory tier already has the entry
+            pass
+
+    def _trim_disk(self):
+        files = [(f.stat(), f) for f in self.disk_dir.glob('*/*') if not f.name.endswith('.tmp')]
+        total = sum(st.st_size for st, _ in files)
+        # Oldest first, until the tier is back under 90% of its budget
+        for st, f in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            f.unlink(missing_ok=True)
+            total -= st.st_size
+        with self._lock:
+            self._disk_size = total
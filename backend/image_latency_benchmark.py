@@ -0,0 +1,116 @@
+"""Measure /api/predict latency while large image uploads are in flight.
+
+    python image_latency_benchmark.py [--uploaders 4] [--requests 400]
+
+Starts a single uvicorn worker, records /api/predict latency on an idle
+server, then again while ``--uploaders`` threads keep posting a large JPEG
+to /api/image-predict, and prints p50/p95/p99 for both runs.
+"""
+import argparse
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import requests
+
+BACKEND_DIR = Path(__file__).parent
+PREDICT_BODY = {'sqft': 1800, 'bed': 3, 'bath': 2, 'city': 'Irvine, CA'}
+
+
+def make_photo(width: int = 4000, height: int = 3000) -> bytes:
+    """A camera-sized JPEG with enough detail that decoding it is not trivial"""
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 256, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    pixels = np.repeat(np.repeat(coarse, 8, axis=0), 8, axis=1)
+    pixels = pixels ^ rng.integers(0, 32, size=pixels.shape, dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.array(samples) * 1000
+    return {f'p{q}': round(float(np.percentile(values, q)), 1) for q in (50, 95, 99)}
+
+
+def predict_latencies(base_url: str, count: int) -> List[float]:
+    session = requests.Session()
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        session.post(f'{base_url}/api/predict', json=PREDICT_BODY).raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run(uploaders: int, count: int) -> Dict[str, Dict[str, float]]:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, '-W', 'ignore', '-m', 'uvicorn', 'server:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=dict(os.environ)
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                requests.get(f'{base_url}/api/health', timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+
+        photo = make_photo()
+        report = {'idle': percentiles(predict_latencies(base_url, count))}
+
+        stop = threading.Event()
+        uploads = {'ok': 0, 'busy': 0}
+
+        def upload():
+            session = requests.Session()
+            while not stop.is_set():
+                response = session.post(f'{base_url}/api/image-predict',
+                                        files={'image': ('photo.jpg', photo, 'image/jpeg')})
+                uploads['ok' if response.status_code == 200 else 'busy'] += 1
+
+        threads = [threading.Thread(target=upload, daemon=True) for _ in range(uploaders)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1)
+        report['with_uploads'] = percentiles(predict_latencies(base_url, count))
+        stop.set()
+        for thread in threads:
+            thread.join()
+        report['uploads'] = uploads
+        return report
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/predict latency under image upload load")
+    parser.add_argument('--uploaders', type=int, default=4, help="Concurrent image upload loops")
+    parser.add_argument('--requests', type=int, default=400, help="/api/predict calls per run")
+    args = parser.parse_args()
+
+    report = run(args.uploaders, args.requests)
+    for label in ('idle', 'with_uploads'):
+        print(f"{label:>12}: " + ', '.join(f"{k} {v:.1f} ms" for k, v in report[label].items()))
+    print(f"image uploads completed: {report['uploads']['ok']}, rejected as busy: {report['uploads']['busy']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Tuple, Union
+
+from image_cache import ProcessedImageCache, cache_key, upload_digest
+
+# Teachable Machine image models take 224x224 RGB input
+IMAGE_SIZE = (224, 224)
+
+# Pillow releases the GIL while decoding, resizing and encoding, so a small
+# thread pool runs these in parallel without copying uploads between processes
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', min(4, os.cpu_count() or 1)))
+# Uploads accepted beyond the ones currently being processed; past this the
+# server answers 503 instead of queueing without bound
+MAX_QUEUED_IMAGES = int(os.environ.get('MAX_QUEUED_IMAGES', IMAGE_WORKERS * 4))
+
+# format name -> (Pillow encoder, MIME type)
+OUTPUT_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+DEFAULT_OUTPUT_FORMAT = 'jpeg'
+DEFAULT_QUALITY = 85
+# Part of every cache key; bump when preprocess_image output changes so the
+# disk cache tier never serves images processed the old way
+PREPROCESS_VERSION = 1
+
+# Leading bytes needed to recognise every format in IMAGE_SIGNATURES
+SNIFF_BYTES = 12
+# (offset, magic bytes) -> format, for the formats Pillow decodes here
+IMAGE_SIGNATURES = [
+    ((0, b'\xff\xd8\xff'), 'jpeg'),
+    ((0, b'\x89PNG\r\n\x1a\n'), 'png'),
+    ((8, b'WEBP'), 'webp'),
+    ((0, b'GIF87a'), 'gif'),
+    ((0, b'GIF89a'), 'gif'),
+    ((0, b'BM'), 'bmp'),
+    ((0, b'II*\x00'), 'tiff'),
+    ((0, b'MM\x00*'), 'tiff'),
+]
+
+
+class ImagePoolBusy(RuntimeError):
+    """Raised when the image pool already holds as many uploads as it will accept"""
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Image format named by the first SNIFF_BYTES of a file, or None if it is not a supported image"""
+    for (offset, magic), name in IMAGE_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic and (name != 'webp' or head[:4] == b'RIFF'):
+            return name
+    return None
+
+
+def preprocess_image(image_data: Union[bytes, BinaryIO], output_format: str = DEFAULT_OUTPUT_FORMAT,
+                     quality: int = DEFAULT_QUALITY) -> Tuple[bytes, str]:
+    """Decode, resize to IMAGE_SIZE and re-encode one upload; returns (encoded bytes, MIME type).
+
+    ``image_data`` may be an open file, such as an upload's spooled file, which
+    Pillow then reads directly instead of from an in-memory copy.
+    """
+    from PIL import Image
+
+    encoder, mime_type = OUTPUT_FORMATS[output_format]
+    image = Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data)
+    # For JPEG, decode at the smallest 1/2, 1/4 or 1/8 scale that is still at
+    # least IMAGE_SIZE; a no-op for other formats
+    image.draft('RGB', IMAGE_SIZE)
+    image = image.resize(IMAGE_SIZE)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    if encoder == 'PNG':
+        image.save(buffer, format=encoder)
+    else:
+        image.save(buffer, format=encoder, quality=quality)
+    return buffer.getvalue(), mime_type
+
+
+def preprocess_cached(cache: Optional[ProcessedImageCache], image_data: Union[bytes, BinaryIO],
+                      output_format: str = DEFAULT_OUTPUT_FORMAT,
+                      quality: int = DEFAULT_QUALITY) -> Tuple[bytes, str]:
+    """preprocess_image, served from ``cache`` when the same bytes were processed the same way before"""
+    if cache is None:
+        return preprocess_image(image_data, output_format, quality)
+    key = cache_key(upload_digest(image_data), PREPROCESS_VERSION, IMAGE_SIZE, output_format, quality)
+    processed = cache.get(key)
+    if processed is None:
+        processed = preprocess_image(image_data, output_format, quality)
+        cache.put(key, processed)
+    return processed
+
+
+class ImagePool:
+    """Bounded worker pool that keeps image preprocessing off the event loop"""
+
+    def __init__(self, workers: int = IMAGE_WORKERS, max_queued: int = MAX_QUEUED_IMAGES,
+                 cache: Optional[ProcessedImageCache] = None):
+        self.workers = workers
+        self.capacity = workers + max_queued
+        self.in_flight = 0
+        self.cache = cache
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def preprocess(self, image_data: Union[bytes, BinaryIO], output_format: str = DEFAULT_OUTPUT_FORMAT,
+                         quality: int = DEFAULT_QUALITY) -> Tuple[bytes, str]:
+        """Run preprocess_cached on a worker thread, or raise ImagePoolBusy when full"""
+        if self.in_flight >= self.capacity:
+            raise ImagePoolBusy(f"{self.in_flight} images already being processed")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image')
+        # Only touched from the event loop thread, so no lock is needed
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # Hashing the upload for the cache key also happens off the event loop
+            return await loop.run_in_executor(self._executor, preprocess_cached, self.cache,
+                                              image_data, output_format, quality)
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
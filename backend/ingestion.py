@@ -0,0 +1,244 @@
+"""Append new listings to the in-memory house table without recomputing its statistics.
+
+Every statistic the API serves is a count, sum, minimum, maximum, counter or
+co-moment, so each can be updated from a batch of listings alone. A batch
+costs O(batch) arithmetic plus copying the O(cities) list of city records;
+the existing rows are never rescanned.
+"""
+import csv
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Mapping, Sequence
+
+import numpy as np
+
+from aggregations import HouseColumns
+from dataset import PRICE_RANGES, HouseDataset
+
+# Columns every listing must provide
+LISTING_COLUMNS = ('city', 'bed', 'bath', 'sqft', 'price')
+# Order of the co-moment matrix; correlations pair price with each of the others
+MOMENT_COLUMNS = ('price', 'sqft', 'bed', 'bath')
+# Upper bounds of the low and mid price ranges
+PRICE_RANGE_BOUNDS = (PRICE_RANGES['low']['max'], PRICE_RANGES['mid']['max'])
+
+
+def _moments(values: np.ndarray):
+    """Row count, column means and co-moment matrix of an (n, k) block"""
+    mean = values.mean(axis=0)
+    centred = values - mean
+    return len(values), mean, centred.T @ centred
+
+
+def _scalar(value, dtype: np.dtype):
+    """A plain Python number, typed like the column the value came from"""
+    return np.asarray(value).astype(dtype).item()
+
+
+class ListingAggregates:
+    """Sufficient statistics for city_stats, house_stats and the price correlations.
+
+    Per city: row count, sums of every column and the price min and max.
+    Overall: means and co-moments of (price, sqft, bed, bath), merged per
+    batch with Chan's parallel update so no running sum of squares is ever
+    large enough to lose precision, plus bed, bath and price range counters.
+    """
+
+    def __init__(self, houses: HouseColumns):
+        cities = len(houses.city_names)
+        codes = np.asarray(houses.city_codes, dtype=np.intp)
+        self.dtypes = {col: houses[col].dtype for col in MOMENT_COLUMNS}
+        self.count = np.bincount(codes, minlength=cities)
+        self.sums = {
+            col: np.bincount(codes, weights=np.asarray(houses[col], dtype=np.float64), minlength=cities)
+            for col in MOMENT_COLUMNS
+        }
+        price = np.asarray(houses['price'], dtype=np.float64)
+        self.price_min = np.full(cities, np.inf)
+        self.price_max = np.full(cities, -np.inf)
+        np.minimum.at(self.price_min, codes, price)
+        np.maximum.at(self.price_max, codes, price)
+
+        self.n, self.mean, self.comoment = 0, np.zeros(len(MOMENT_COLUMNS)), np.zeros((len(MOMENT_COLUMNS),) * 2)
+        self.bed_counts: Counter = Counter()
+        self.bath_counts: Counter = Counter()
+        self.range_counts = np.zeros(len(PRICE_RANGES), dtype=np.int64)
+        self._add_overall({col: houses[col] for col in MOMENT_COLUMNS})
+
+    def add(self, codes: np.ndarray, columns: Mapping[str, np.ndarray]):
+        """Fold in a batch of rows; ``codes`` may include cities beyond the current ones"""
+        codes = np.asarray(codes, dtype=np.intp)
+        cities = max(len(self.count), int(codes.max()) + 1)
+        if cities > len(self.count):
+            grow = cities - len(self.count)
+            self.count = np.append(self.count, np.zeros(grow, dtype=self.count.dtype))
+            self.sums = {col: np.append(s, np.zeros(grow)) for col, s in self.sums.items()}
+            self.price_min = np.append(self.price_min, np.full(grow, np.inf))
+            self.price_max = np.append(self.price_max, np.full(grow, -np.inf))
+        np.add.at(self.count, codes, 1)
+        for col in MOMENT_COLUMNS:
+            np.add.at(self.sums[col], codes, np.asarray(columns[col], dtype=np.float64))
+        price = np.asarray(columns['price'], dtype=np.float64)
+        np.minimum.at(self.price_min, codes, price)
+        np.maximum.at(self.price_max, codes, price)
+        self._add_overall(columns)
+
+    def _add_overall(self, columns: Mapping[str, np.ndarray]):
+        values = np.column_stack([np.asarray(columns[col], dtype=np.float64) for col in MOMENT_COLUMNS])
+        if len(values) == 0:
+            return
+        n_b, mean_b, comoment_b = _moments(values)
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / n)
+        self.comoment = self.comoment + comoment_b + np.outer(delta, delta) * (self.n * n_b / n)
+        self.n = n
+        self.bed_counts.update(np.asarray(columns['bed']).tolist())
+        self.bath_counts.update(np.asarray(columns['bath']).tolist())
+        # side='left' puts a price equal to a bound in the lower range, like ``price <= max``
+        self.range_counts += np.bincount(np.searchsorted(PRICE_RANGE_BOUNDS, values[:, 0]), minlength=3)
+
+    def city_record(self, code: int, city: str) -> Dict[str, Any]:
+        """One CityStats-shaped record, rounded like the pandas groupby"""
+        count = int(self.count[code])
+        return {
+            'city': city,
+            'avg_price': round(self.sums['price'][code] / count, 2),
+            'house_count': count,
+            'min_price': _scalar(self.price_min[code], self.dtypes['price']),
+            'max_price': _scalar(self.price_max[code], self.dtypes['price']),
+            'avg_sqft': round(self.sums['sqft'][code] / count, 2),
+            'avg_bed': round(self.sums['bed'][code] / count, 2),
+            'avg_bath': round(self.sums['bath'][code] / count, 2),
+        }
+
+    def house_stats(self) -> Dict[str, Any]:
+        """The /stats payload, shaped like dataset.compute_house_stats"""
+        def distribution(counts: Counter, dtype: np.dtype) -> Dict[str, int]:
+            # Most common first, like value_counts()
+            return {str(_scalar(value, dtype)): count for value, count in counts.most_common()}
+
+        means = dict(zip(MOMENT_COLUMNS, self.mean.tolist()))
+        return {
+            'total_houses': self.n,
+            'avg_price': means['price'],
+            'avg_sqft': means['sqft'],
+            'avg_bed': means['bed'],
+            'avg_bath': means['bath'],
+            'price_ranges': {
+                name: {**bounds, 'count': int(count)}
+                for (name, bounds), count in zip(PRICE_RANGES.items(), self.range_counts)
+            },
+            'bed_distribution': distribution(self.bed_counts, self.dtypes['bed']),
+            'bath_distribution': distribution(self.bath_counts, self.dtypes['bath']),
+        }
+
+    def correlations(self) -> Dict[str, float]:
+        m = self.comoment
+        return {
+            f'price_{col}': float(m[0, j] / np.sqrt(m[0, 0] * m[j, j]))
+            for j, col in enumerate(MOMENT_COLUMNS) if j > 0
+        }
+
+
+class _GrowableColumn:
+    """Append-only array with spare capacity.
+
+    Readers get views of the filled prefix. Appends only write past it, so
+    a view handed out earlier never changes; when the capacity runs out the
+    rows move to a new, larger buffer and old views keep the old one alive.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.size = len(values)
+        self.buffer = np.empty(max(2 * self.size, 1024), dtype=values.dtype)
+        self.buffer[:self.size] = values
+
+    def append(self, values: np.ndarray):
+        values = np.asarray(values)
+        dtype = self.buffer.dtype
+        if not np.array_equal(values.astype(dtype), values):
+            # e.g. a fractional value arriving in an integer column
+            dtype = np.result_type(dtype, values.dtype)
+        end = self.size + len(values)
+        if end > len(self.buffer) or dtype != self.buffer.dtype:
+            grown = np.empty(max(2 * end, len(self.buffer)), dtype=dtype)
+            grown[:self.size] = self.buffer[:self.size]
+            self.buffer = grown
+        self.buffer[self.size:end] = values
+        self.size = end
+
+    def view(self) -> np.ndarray:
+        view = self.buffer[:self.size]
+        view.flags.writeable = False
+        return view
+
+
+class ListingIngestor:
+    """Single writer that appends listings and hands out a new HouseDataset per batch.
+
+    The returned datasets share column buffers but never change after they
+    are returned, so the server can publish each one by swapping a single
+    reference while requests keep reading the previous one.
+    """
+
+    def __init__(self, dataset: HouseDataset):
+        houses = dataset.house_data
+        self.city_names = list(houses.city_names)
+        self.city_lookup = dict(houses.city_lookup)
+        self.columns = {'city_codes': _GrowableColumn(np.asarray(houses.city_codes))}
+        self.columns.update({col: _GrowableColumn(np.asarray(houses[col])) for col in houses.numeric})
+        self.aggregates = ListingAggregates(houses)
+        self.city_stats = list(dataset.city_stats)
+        self.record_position = {record['city']: i for i, record in enumerate(self.city_stats)}
+        self.lock = threading.Lock()
+
+    def append(self, listings: Sequence[Mapping[str, Any]]) -> HouseDataset:
+        """Add listings (dicts with LISTING_COLUMNS) and return the dataset that includes them"""
+        with self.lock:
+            for listing in listings:
+                if listing['city'] not in self.city_lookup:
+                    self.city_lookup[listing['city']] = len(self.city_names)
+                    self.city_names.append(listing['city'])
+            codes = np.array([self.city_lookup[listing['city']] for listing in listings], dtype=np.intp)
+            batch = {col: np.array([listing[col] for listing in listings]) for col in LISTING_COLUMNS[1:]}
+
+            # Codes keep their narrow dtype until there are too many cities for it
+            self.columns['city_codes'].append(codes)
+            for col, values in batch.items():
+                self.columns[col].append(values)
+            self.aggregates.add(codes, batch)
+
+            for code in np.unique(codes).tolist():
+                record = self.aggregates.city_record(code, self.city_names[code])
+                position = self.record_position.setdefault(record['city'], len(self.city_stats))
+                if position == len(self.city_stats):
+                    self.city_stats.append(record)
+                else:
+                    self.city_stats[position] = record
+
+            houses = HouseColumns(
+                self.columns['city_codes'].view(),
+                self.city_names,
+                {col: column.view() for col, column in self.columns.items() if col != 'city_codes'}
+            )
+            return HouseDataset(houses, list(self.city_stats), self.aggregates.house_stats(),
+                                self.aggregates.correlations(), 'ingested')
+
+
+def append_listings_csv(csv_path: Path, listings: Sequence[Mapping[str, Any]]):
+    """Append listings to socal2.csv in its own layout, so a restart loads them too.
+
+    Columns the listings do not provide (image_id, n_citi, and street when
+    missing) are left empty.
+    """
+    with open(csv_path, newline='') as f:
+        header = next(csv.reader(f))
+    rows = []
+    for listing in listings:
+        row = {'citi': listing['city'], 'street': listing.get('street') or ''}
+        row.update((col, listing[col]) for col in LISTING_COLUMNS[1:])
+        rows.append([row.get(col, '') for col in header])
+    with open(csv_path, 'a', newline='') as f:
+        csv.writer(f, lineterminator='\r\n').writerows(rows)
@@ -0,0 +1,246 @@
+"""K-fold cross-validation of candidate price models, run in parallel.
+
+    python model_comparison.py [--folds 5] [--workers N] [--output report.json]
+
+Every candidate is the training script's regression (bed, bath, sqft plus a
+per-city offset), fitted with a different penalty, so each one compiles to
+a CompiledLinearModel and its latency is measured on the serving path. Fold
+fits run in a process pool; latencies are timed afterwards in this process
+alone, so they are not skewed by the workers competing for the CPU.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from online_training import NUMERIC_FEATURES, iqr_bounds
+from predictor import CITY_PREFIX, CompiledLinearModel
+from sparse_training import TRAINING_CSV_PATH, read_listing_columns
+
+# Rows scored per call when timing batch inference
+LATENCY_BATCH_ROWS = 1000
+
+
+class Candidate(NamedTuple):
+    """A penalized least-squares variant of the price model.
+
+    ``slope_penalty`` and ``city_penalty`` are ridge penalties on the
+    numeric slopes and on the city offsets; the intercept is never
+    penalized. ``cities=False`` drops the city offsets altogether.
+    """
+    name: str
+    slope_penalty: float = 0.0
+    city_penalty: float = 0.0
+    cities: bool = True
+
+
+CANDIDATES = (
+    Candidate('ols'),
+    *(Candidate(f'ridge_{alpha:g}', alpha, alpha) for alpha in (0.1, 1, 10, 100)),
+    # Offsets shrunk towards the overall level, about n_c / (n_c + penalty) of
+    # the way for a city with n_c listings; thinly listed cities move most
+    *(Candidate(f'city_shrinkage_{alpha:g}', city_penalty=alpha) for alpha in (1, 3, 10, 30)),
+    Candidate('no_city', cities=False),
+)
+
+
+def fit_candidate(candidate: Candidate, codes: np.ndarray, numeric: np.ndarray, price: np.ndarray,
+                  city_names: Sequence[str]) -> CompiledLinearModel:
+    """Solve the candidate's normal equations, assembled from per-city sums.
+
+    The centred design's Gram matrix only needs the k x k feature scatter,
+    per-city feature sums and row counts, so it is (k + cities) square
+    however many rows there are. Without penalties the solution is the
+    minimum-norm one sklearn's LinearRegression gives; with both penalties
+    equal it is sklearn's Ridge on the one-hot design.
+    """
+    numeric = np.asarray(numeric, dtype=np.float64)
+    price = np.asarray(price, dtype=np.float64)
+    n, k = numeric.shape
+    feature_mean, price_mean = numeric.mean(axis=0), price.mean()
+    z = numeric - feature_mean
+    y = price - price_mean
+
+    if candidate.cities:
+        # Offsets for the cities with rows here, in pd.get_dummies order
+        order = sorted(np.unique(codes).tolist(), key=city_names.__getitem__)
+        column = np.full(len(city_names), -1, dtype=np.intp)
+        column[order] = np.arange(len(order))
+        col = column[codes]
+    else:
+        order, col = [], np.zeros(n, dtype=np.intp)
+    c = len(order)
+    counts = np.bincount(col, minlength=c)[:c].astype(np.float64)
+    city_z = np.zeros((c, k))
+    if c:
+        np.add.at(city_z, col, z)
+
+    gram = np.empty((k + c, k + c))
+    gram[:k, :k] = z.T @ z
+    gram[:k, k:] = city_z.T
+    gram[k:, :k] = city_z
+    # Centred dummies: diag(n_c) - n p p' with p the city shares
+    gram[k:, k:] = np.diag(counts) - np.outer(counts, counts) / n
+    rhs = np.concatenate([z.T @ y, np.bincount(col, weights=y, minlength=c)[:c]])
+    penalty = np.concatenate([np.full(k, candidate.slope_penalty), np.full(c, candidate.city_penalty)])
+
+    gram += np.diag(penalty)
+    if c and candidate.city_penalty == 0:
+        # Unpenalized, shifting every offset by the same amount changes nothing. Adding
+        # s * uu' along that direction u makes the system regular and forces u'w = 0,
+        # i.e. offsets summing to zero: the minimum-norm solution, without an SVD
+        gram[k:, k:] += n / c
+    coef = np.linalg.solve(gram, rhs)
+    intercept = price_mean - feature_mean @ coef[:k] - counts @ coef[k:] / n
+    return CompiledLinearModel(
+        [*NUMERIC_FEATURES, *(CITY_PREFIX + city_names[code] for code in order)], coef, intercept
+    )
+
+
+def score(model: CompiledLinearModel, codes: np.ndarray, numeric: np.ndarray, price: np.ndarray,
+          city_names: Sequence[str]) -> Dict[str, float]:
+    """R^2, RMSE and MAE of ``model`` on the given rows"""
+    slots = model.city_index(city_names)
+    predicted = model.predict_many(numeric[:, 2], numeric[:, 0], numeric[:, 1], slots[codes])
+    residual = price - predicted
+    return {
+        'r2': float(1 - residual @ residual / np.sum((price - price.mean()) ** 2)),
+        'rmse': float(np.sqrt(np.mean(residual ** 2))),
+        'mae': float(np.mean(np.abs(residual))),
+    }
+
+
+# Training rows of a pool worker, set once by _init_worker instead of pickled per task
+_worker_data: Optional[tuple] = None
+
+
+def _init_worker(codes, numeric, price, city_names):
+    global _worker_data
+    _worker_data = (codes, numeric, price, city_names)
+
+
+def _run_fold(candidate: Candidate, train: np.ndarray, test: np.ndarray) -> Dict[str, float]:
+    codes, numeric, price, city_names = _worker_data
+    started = time.perf_counter()
+    model = fit_candidate(candidate, codes[train], numeric[train], price[train], city_names)
+    fit_ms = (time.perf_counter() - started) * 1000
+    return {**score(model, codes[test], numeric[test], price[test], city_names), 'fit_ms': fit_ms}
+
+
+def measure_latency(model: CompiledLinearModel, codes: np.ndarray, numeric: np.ndarray,
+                    city_names: Sequence[str], calls: int = 2000, seed: int = 0) -> Dict[str, float]:
+    """Median single-row ``predict`` and best batch ``predict_many`` time, in microseconds"""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(codes), calls).tolist()
+    houses = [(float(numeric[i, 2]), float(numeric[i, 0]), float(numeric[i, 1]), city_names[codes[i]]) for i in rows]
+    timings = []
+    for house in houses:
+        started = time.perf_counter()
+        model.predict(*house)
+        timings.append(time.perf_counter() - started)
+
+    batch = rng.integers(0, len(codes), LATENCY_BATCH_ROWS)
+    sqft, bed, bath = numeric[batch, 2], numeric[batch, 0], numeric[batch, 1]
+    batch_cities = [city_names[code] for code in codes[batch].tolist()]
+    batch_timings = []
+    for _ in range(20):
+        started = time.perf_counter()
+        model.predict_many(sqft, bed, bath, model.city_index(batch_cities))
+        batch_timings.append(time.perf_counter() - started)
+    return {
+        'single_us': float(np.median(timings) * 1e6),
+        'batch_us': float(min(batch_timings) * 1e6),
+        'batch_us_per_row': float(min(batch_timings) * 1e6 / LATENCY_BATCH_ROWS),
+    }
+
+
+def compare_models(codes: np.ndarray, numeric: np.ndarray, price: np.ndarray, city_names: List[str],
+                   candidates: Sequence[Candidate] = CANDIDATES, folds: int = 5, random_state: int = 42,
+                   workers: Optional[int] = None) -> Dict[str, Any]:
+    """Cross-validate every candidate and time its inference; returns the report as plain data.
+
+    ``workers=0`` runs the folds in this process instead of a pool.
+    """
+    from sklearn.model_selection import KFold
+
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=random_state).split(numeric))
+    tasks = [(candidate, train, test) for candidate in candidates for train, test in splits]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    started = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(codes, numeric, price, city_names)) as pool:
+            results = list(pool.map(_run_fold, *zip(*tasks)))
+    else:
+        _init_worker(codes, numeric, price, city_names)
+        results = [_run_fold(*task) for task in tasks]
+    cv_seconds = time.perf_counter() - started
+
+    report = []
+    for i, candidate in enumerate(candidates):
+        fold_results = results[i * folds:(i + 1) * folds]
+        metrics = {name: np.array([r[name] for r in fold_results]) for name in ('r2', 'rmse', 'mae', 'fit_ms')}
+        latency = measure_latency(fit_candidate(candidate, codes, numeric, price, city_names), codes, numeric, city_names)
+        report.append({
+            **candidate._asdict(),
+            'r2_mean': float(metrics['r2'].mean()),
+            'r2_std': float(metrics['r2'].std()),
+            'rmse_mean': float(metrics['rmse'].mean()),
+            'mae_mean': float(metrics['mae'].mean()),
+            'fit_ms_median': float(np.median(metrics['fit_ms'])),
+            **latency,
+            'r2_per_single_us': float(metrics['r2'].mean() / latency['single_us']),
+            'folds': fold_results,
+        })
+    return {
+        'rows': len(price),
+        'cities': len(np.unique(codes)),
+        'folds': folds,
+        'random_state': random_state,
+        'workers': workers,
+        'cv_seconds': cv_seconds,
+        'best_r2': max(report, key=lambda r: r['r2_mean'])['name'],
+        'best_r2_per_single_us': max(report, key=lambda r: r['r2_per_single_us'])['name'],
+        'candidates': report,
+    }
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="K-fold comparison of OLS, ridge and city-shrinkage price models")
+    parser.add_argument('--csv', type=Path, default=TRAINING_CSV_PATH)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None, help="Pool size; default one per CPU, 0 for no pool")
+    parser.add_argument('--output', type=Path, default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # The training script's rows: outliers removed by the sequential 1.5 IQR rule
+    listings = read_listing_columns(args.csv)
+    keep, _ = iqr_bounds(listings.columns)
+    numeric = np.column_stack([np.asarray(listings.columns[f][keep], dtype=np.float64) for f in NUMERIC_FEATURES])
+    price = np.asarray(listings.columns['price'][keep], dtype=np.float64)
+    report = compare_models(listings.city_codes[keep], numeric, price, listings.city_names,
+                            folds=args.folds, random_state=args.random_state, workers=args.workers)
+    report['source'] = args.csv.name
+
+    text = json.dumps(report, indent=1)
+    if args.output is None:
+        print(text)
+        return
+    args.output.write_text(text)
+    print(f"{report['rows']} rows, {report['folds']} folds on {report['workers']} workers in {report['cv_seconds']:.1f} s")
+    for r in sorted(report['candidates'], key=lambda r: -r['r2_mean']):
+        print(f"{r['name']:>20}: R^2 {r['r2_mean']:.4f} +/- {r['r2_std']:.4f}, RMSE {r['rmse_mean']:,.0f}, "
+              f"fit {r['fit_ms_median']:.1f} ms, single {r['single_us']:.2f} us, batch {r['batch_us_per_row']:.3f} us/row")
+    print(f"best R^2: {report['best_r2']}; best R^2 per single-row us: {report['best_r2_per_single_us']}")
+
+
+if __name__ == '__main__':
+    main()
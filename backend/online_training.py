@@ -0,0 +1,222 @@
+"""Online least squares for the price model, from sufficient statistics in city-block form.
+
+    python online_training.py [--batches 20]
+
+folds the house table in batch by batch and compares the result with a
+dense sklearn refit on the same rows.
+"""
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from aggregations import HouseColumns
+from predictor import CITY_PREFIX, CompiledLinearModel
+
+# Numeric features in the order the training script's design matrix has them
+NUMERIC_FEATURES = ('bed', 'bath', 'sqft')
+# Columns filtered with the 1.5 IQR rule, in the training script's order
+OUTLIER_COLUMNS = ('price', 'sqft', 'bed', 'bath')
+
+
+def iqr_bounds(columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, Tuple[float, float]]]:
+    """remove_outliers_iqr from the training script: each column filtered on the rows the previous ones kept.
+
+    Returns the mask of kept rows and the bounds used, so later listings
+    can be held to the same limits.
+    """
+    keep = np.ones(len(columns['price']), dtype=bool)
+    bounds = {}
+    for col in OUTLIER_COLUMNS:
+        values = np.asarray(columns[col], dtype=np.float64)
+        q1, q3 = np.quantile(values[keep], [0.25, 0.75])
+        lower, upper = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        keep &= (values >= lower) & (values <= upper)
+        bounds[col] = (float(lower), float(upper))
+    return keep, bounds
+
+
+class OnlineLeastSquares:
+    """X'X and X'y of the one-hot city regression, kept per city block.
+
+    For ``price = level[city] + slopes . (bed, bath, sqft)`` the normal
+    equations only need, per city, the row count and the sums of the
+    features and of the price, plus the overall k x k feature cross
+    products. Adding rows is O(batch * k^2); solving eliminates the city
+    levels (a Schur complement) and costs O(cities * k^2), never touching
+    the dense one-hot matrix. Features and prices are shifted by a fixed
+    reference so the sums of squares do not lose precision.
+    """
+
+    def __init__(self, shift: Sequence[float], price_shift: float,
+                 bounds: Optional[Dict[str, Tuple[float, float]]] = None):
+        k = len(NUMERIC_FEATURES)
+        self.shift = np.asarray(shift, dtype=np.float64)
+        self.price_shift = float(price_shift)
+        # Rows outside these (inclusive) limits are not learned from
+        self.bounds = bounds or {}
+        self.city_names: List[str] = []
+        self.city_lookup: Dict[str, int] = {}
+        self.count = np.zeros(0)
+        self.feature_sums = np.zeros((0, k))
+        self.price_sums = np.zeros(0)
+        self.cross = np.zeros((k, k))
+        self.feature_price = np.zeros(k)
+        self.price_squares = 0.0
+        self.rows = 0
+
+    @classmethod
+    def from_houses(cls, houses: HouseColumns) -> 'OnlineLeastSquares':
+        """Statistics over the house table, outliers removed the way the training script does.
+
+        The IQR bounds are computed once, here, and later rows are filtered
+        by them rather than by bounds recomputed with those rows included.
+        Build this before adding new listings to the table, or the listings
+        would move the bounds that later ones are held to.
+        """
+        columns = {col: np.asarray(houses[col], dtype=np.float64) for col in OUTLIER_COLUMNS}
+        keep, bounds = iqr_bounds(columns)
+        numeric = np.column_stack([columns[f][keep] for f in NUMERIC_FEATURES])
+        model = cls(numeric.mean(axis=0), columns['price'][keep].mean(), bounds)
+        names = houses.city_names
+        model.add([names[code] for code in np.asarray(houses.city_codes)[keep].tolist()],
+                  numeric, columns['price'][keep])
+        return model
+
+    def add(self, cities: Sequence[str], numeric: np.ndarray, price: np.ndarray) -> int:
+        """Fold in rows of (bed, bath, sqft) and price; returns how many were within bounds"""
+        numeric = np.asarray(numeric, dtype=np.float64).reshape(-1, len(NUMERIC_FEATURES))
+        price = np.asarray(price, dtype=np.float64)
+        keep = np.ones(len(price), dtype=bool)
+        for col, (lower, upper) in self.bounds.items():
+            values = price if col == 'price' else numeric[:, NUMERIC_FEATURES.index(col)]
+            keep &= (values >= lower) & (values <= upper)
+        if not keep.any():
+            return 0
+
+        for city in cities:
+            if city not in self.city_lookup:
+                self.city_lookup[city] = len(self.city_names)
+                self.city_names.append(city)
+        if len(self.city_names) > len(self.count):
+            grow = len(self.city_names) - len(self.count)
+            self.count = np.append(self.count, np.zeros(grow))
+            self.feature_sums = np.vstack([self.feature_sums, np.zeros((grow, len(NUMERIC_FEATURES)))])
+            self.price_sums = np.append(self.price_sums, np.zeros(grow))
+
+        codes = np.array([self.city_lookup[city] for city in cities], dtype=np.intp)[keep]
+        z = numeric[keep] - self.shift
+        y = price[keep] - self.price_shift
+        np.add.at(self.count, codes, 1)
+        np.add.at(self.feature_sums, codes, z)
+        np.add.at(self.price_sums, codes, y)
+        self.cross += z.T @ z
+        self.feature_price += z.T @ y
+        self.price_squares += float(y @ y)
+        self.rows += len(y)
+        return len(y)
+
+    def solve(self) -> CompiledLinearModel:
+        """Least-squares coefficients as a compiled model, with prediction interval statistics.
+
+        Coefficients use the minimum-norm convention sklearn's LinearRegression
+        lands on for the rank-deficient dummies-plus-intercept design: the
+        intercept is the mean city level and the city offsets sum to zero,
+        so unknown cities are scored exactly as by the batch-trained model.
+        """
+        seen = self.count > 0
+        if not seen.any():
+            raise ValueError("No rows to fit")
+        order = sorted(np.flatnonzero(seen).tolist(), key=lambda code: self.city_names[code])
+        count = self.count[order]
+        feature_sums, price_sums = self.feature_sums[order], self.price_sums[order]
+        feature_means = feature_sums / count[:, None]
+        price_means = price_sums / count
+
+        # Schur complement of the city block: pooled within-city scatter and cross-product
+        within = self.cross - feature_sums.T @ feature_means
+        within_price = self.feature_price - feature_sums.T @ price_means
+        slopes = np.linalg.solve(within, within_price)
+        levels = price_means - feature_means @ slopes + self.price_shift - self.shift @ slopes
+        intercept = float(levels.mean())
+
+        k = len(NUMERIC_FEATURES)
+        dof = self.rows - len(order) - k
+        if dof <= 0:
+            raise ValueError("Too few rows for the number of cities")
+        residual = self.price_squares - price_sums @ price_means - within_price @ slopes
+        intervals = {
+            'numeric_features': list(NUMERIC_FEATURES),
+            'sigma2': float(max(residual, 0.0) / dof),
+            'dof': int(dof),
+            'mean': (feature_sums.sum(axis=0) / self.rows + self.shift).tolist(),
+            'within_inv': np.linalg.inv(within).tolist(),
+            'city_counts': count.astype(int).tolist(),
+            'city_means': (feature_means + self.shift).tolist(),
+        }
+        cities = [self.city_names[code] for code in order]
+        model = CompiledLinearModel(
+            [*NUMERIC_FEATURES, *(CITY_PREFIX + city for city in cities)],
+            np.concatenate([slopes, levels - intercept]),
+            intercept,
+            intervals,
+        )
+        model.metadata = {'estimator': 'OnlineLeastSquares', 'train_rows': self.rows}
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        return {'rows': self.rows, 'cities': int(np.count_nonzero(self.count))}
+
+
+def main():
+    import argparse
+    import warnings
+
+    from sklearn.linear_model import LinearRegression
+
+    from dataset import load_house_dataset
+
+    parser = argparse.ArgumentParser(description="Online least squares vs a dense batch refit")
+    parser.add_argument('--batches', type=int, default=20)
+    args = parser.parse_args()
+
+    houses = load_house_dataset().house_data
+    columns = {col: np.asarray(houses[col], dtype=np.float64) for col in OUTLIER_COLUMNS}
+    keep, bounds = iqr_bounds(columns)
+    rows = np.flatnonzero(keep)
+    numeric = np.column_stack([columns[f] for f in NUMERIC_FEATURES])
+    cities = [houses.city_names[code] for code in np.asarray(houses.city_codes).tolist()]
+
+    started = time.perf_counter()
+    online = OnlineLeastSquares(numeric[rows].mean(axis=0), columns['price'][rows].mean(), bounds)
+    add_ms = []
+    for batch in np.array_split(rows, args.batches):
+        t = time.perf_counter()
+        online.add([cities[i] for i in batch], numeric[batch], columns['price'][batch])
+        add_ms.append((time.perf_counter() - t) * 1000)
+    t = time.perf_counter()
+    model = online.solve()
+    solve_ms = (time.perf_counter() - t) * 1000
+    print(f"online: {online.rows} rows in {args.batches} batches, "
+          f"{np.median(add_ms):.2f} ms per add, solve {solve_ms:.2f} ms, total {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    t = time.perf_counter()
+    city_names = model.cities
+    dummies = np.zeros((len(rows), len(city_names)))
+    lookup = {city: i for i, city in enumerate(city_names)}
+    dummies[np.arange(len(rows)), [lookup[cities[i]] for i in rows]] = 1
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        dense = LinearRegression().fit(np.column_stack([numeric[rows], dummies]), columns['price'][rows])
+    print(f"dense sklearn refit: {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    coef = np.asarray(model.coef[:-1])
+    print(f"max |coef diff| {np.abs(coef - dense.coef_).max():.3g}, "
+          f"intercept diff {abs(model.intercept - dense.intercept_):.3g}")
+    predicted = model.predict_many(numeric[rows, 2], numeric[rows, 0], numeric[rows, 1],
+                                   model.city_index([cities[i] for i in rows]))
+    print(f"max |prediction diff| {np.abs(predicted - dense.predict(np.column_stack([numeric[rows], dummies]))).max():.3g}")
+
+
+if __name__ == '__main__':
+    main()
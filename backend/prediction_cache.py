@@ -0,0 +1,79 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Distinct (sqft, bed, bath, city) inputs kept per worker
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+
+
+class PredictionCache:
+    """LRU of prediction results for one model version, with single-flight misses.
+
+    Keys are the normalized inputs; results are bound to ``model_version``
+    and everything is dropped when ``reset`` installs a different version.
+    Concurrent misses for the same key share one in-flight computation
+    instead of each running it. Only used from the event loop thread.
+    """
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.model_version: Optional[str] = None
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+
+    def reset(self, model_version: Optional[str]):
+        """Forget every result; called whenever a model is (re)loaded"""
+        self.model_version = model_version
+        self._entries.clear()
+        self._in_flight.clear()
+        for name in self.counters:
+            self.counters[name] = 0
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached result for ``key``, awaiting ``compute()`` once on a miss"""
+        key = (self.model_version, key)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return self._entries[key]
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.counters['coalesced'] += 1
+            return await asyncio.shield(pending)
+
+        self.counters['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # Waiters see the same failure; nothing is cached
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if key[0] == self.model_version:
+                self._entries[key] = result
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.counters['evictions'] += 1
+            return result
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters['hits'] + self.counters['misses'] + self.counters['coalesced']
+        return {
+            **self.counters,
+            'hit_rate': round((lookups - self.counters['misses']) / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'model_version': self.model_version,
+        }
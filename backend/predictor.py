@@ -0,0 +1,289 @@
+import hashlib
+import json
+import math
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+CITY_PREFIX = 'citi_'
+
+# Lean model artifact written by train_linear_regression_retrained.py: plain
+# JSON, so serving never needs sklearn or unpickling
+ARTIFACT_FORMAT = 'linear-regression'
+ARTIFACT_VERSION = 1
+
+# Two-sided coverage of the prediction interval returned with each price
+INTERVAL_LEVEL = 0.9
+# Largest value accepted for each numeric feature: far above any listing
+# (12 beds, 36 baths, 17,667 sqft), far below where prices or intervals overflow
+FEATURE_LIMITS = {'sqft': 100000.0, 'bed': 50.0, 'bath': 50.0}
+
+
+class CompiledLinearModel:
+    """Linear regression compiled into numeric coefficients plus a city offset table.
+
+    The retrained model is ``intercept + sum(coef * numeric) + coef[citi_<city>]``,
+    so scoring a house never needs the dense one-hot row the sklearn estimator
+    was fitted on: a dictionary lookup and a few float ops are enough.
+    """
+
+    def __init__(self, feature_names: Sequence[str], coef: Sequence[float], intercept: float,
+                 intervals: Optional[Dict[str, Any]] = None):
+        feature_names = list(feature_names)
+        coef = np.asarray(coef, dtype=np.float64)
+        if len(coef) == len(feature_names) + 1:
+            # Already padded with the unknown-city slot, e.g. memory-mapped from a snapshot
+            padded = coef
+        elif len(coef) == len(feature_names):
+            padded = np.append(coef, 0.0)
+        else:
+            raise ValueError("feature_names and coef must have the same length")
+
+        self.feature_names: List[str] = feature_names
+        self.intercept = float(intercept)
+        self.metadata: Dict[str, Any] = {}
+        self.numeric_features = [f for f in feature_names if not f.startswith(CITY_PREFIX)]
+        if any(f.startswith(CITY_PREFIX) for f in feature_names[:len(self.numeric_features)]):
+            raise ValueError("City dummies must follow the numeric features, as pd.get_dummies orders them")
+        self.numeric_coef = {f: float(c) for f, c in zip(feature_names, padded) if not f.startswith(CITY_PREFIX)}
+        self.cities = [f[len(CITY_PREFIX):] for f in feature_names if f.startswith(CITY_PREFIX)]
+        self.city_offsets: Dict[str, float] = {
+            f[len(CITY_PREFIX):]: float(c) for f, c in zip(feature_names, padded) if f.startswith(CITY_PREFIX)
+        }
+        # City dummies as slots into a coefficient vector; the trailing slot is
+        # a zero offset used for cities the model has never seen. city_coef is a
+        # view, so a memory-mapped coefficient vector stays shared.
+        self.coef = padded
+        self.city_slots: Dict[str, int] = {city: i for i, city in enumerate(self.cities)}
+        self.city_coef = padded[len(self.numeric_features):]
+        self.unknown_city_slot = len(self.cities)
+        # Hot-path coefficients pulled out of the dict once
+        self._bed = self.numeric_coef.get('bed', 0.0)
+        self._bath = self.numeric_coef.get('bath', 0.0)
+        self._sqft = self.numeric_coef.get('sqft', 0.0)
+        # Content fingerprint; anything keyed on model output (caches, reload
+        # checks) uses it to tell two models apart
+        fingerprint = hashlib.sha256(json.dumps(feature_names).encode())
+        fingerprint.update(np.ascontiguousarray(padded, dtype=np.float64).tobytes())
+        fingerprint.update(repr(self.intercept).encode())
+        self.version = fingerprint.hexdigest()[:16]
+        self.intervals = intervals
+        if intervals is not None:
+            self._compile_intervals(intervals)
+
+    def _compile_intervals(self, intervals: Dict[str, Any]):
+        """Per-slot tables for predictive_sd, from the statistics fit_interval_stats wrote.
+
+        With one dummy per city the design's (X'X)^-1 is block structured:
+        the leverage of a house in city c is 1/n_c + d' W^-1 d, where d is
+        the house's numeric features minus city c's training mean and W is
+        the pooled within-city scatter of those features. So a request costs
+        one k x k quadratic form in the k numeric features, whatever the
+        number of cities.
+        """
+        if intervals['numeric_features'] != self.numeric_features:
+            raise ValueError("Interval statistics were computed for different numeric features")
+        counts = np.append(np.asarray(intervals['city_counts'], dtype=np.float64), 0.0)
+        if len(counts) != len(self.cities) + 1:
+            raise ValueError("Interval statistics must have one count per city")
+        seen = counts > 0
+        self.sigma2 = float(intervals['sigma2'])
+        self.dof = int(intervals['dof'])
+        self.within_inv = np.asarray(intervals['within_inv'], dtype=np.float64)
+        self._inv_count = np.divide(1.0, counts, out=np.zeros_like(counts), where=seen)
+        # Cities without training rows (and the unknown slot) are centred on
+        # the overall mean, and pay for not knowing their level: the spread
+        # of the trained city offsets around the zero offset they get
+        self._centres = np.tile(np.asarray(intervals['mean'], dtype=np.float64), (len(counts), 1))
+        self._centres[:-1][seen[:-1]] = np.asarray(intervals['city_means'], dtype=np.float64)[seen[:-1]]
+        offset_var = float(np.sum(counts * np.asarray(self.city_coef, dtype=np.float64) ** 2) / counts.sum())
+        self._extra_var = np.where(seen, 0.0, offset_var)
+        # Plain floats for the scalar path
+        self._within_rows = self.within_inv.tolist()
+        self._centre_rows = self._centres.tolist()
+        self._inv_count_list = self._inv_count.tolist()
+        self._extra_var_list = self._extra_var.tolist()
+
+    @classmethod
+    def from_estimator(cls, model: Any) -> 'CompiledLinearModel':
+        """Compile a fitted sklearn ``LinearRegression``"""
+        return cls(model.feature_names_in_.tolist(), model.coef_, model.intercept_)
+
+    def has_city(self, city: str) -> bool:
+        return city in self.city_offsets
+
+    def predict(self, sqft: float, bed: float, bath: float, city: str) -> float:
+        """Score a single house; unknown cities get no city offset, like the dense path"""
+        return (
+            self._bed * bed
+            + self._bath * bath
+            + self._sqft * sqft
+            + self.city_offsets.get(city, 0.0)
+            + self.intercept
+        )
+
+    def predict_grid(self, sqft: np.ndarray, bed: np.ndarray, bath: np.ndarray, city_idx: np.ndarray) -> np.ndarray:
+        """Prices of the Cartesian product of the axes, shaped (city, sqft, bed, bath).
+
+        One broadcast over the coefficients, summed in ``predict``'s order so
+        each point equals the single prediction exactly.
+        """
+        sqft = np.asarray(sqft, dtype=np.float64)[None, :, None, None]
+        bed = np.asarray(bed, dtype=np.float64)[None, None, :, None]
+        bath = np.asarray(bath, dtype=np.float64)[None, None, None, :]
+        city = np.asarray(self.city_coef[city_idx], dtype=np.float64)[:, None, None, None]
+        return self._bed * bed + self._bath * bath + self._sqft * sqft + city + self.intercept
+
+    def predictive_sd(self, sqft: float, bed: float, bath: float, city: str) -> Optional[float]:
+        """Standard deviation of the actual price around ``predict``, or None without interval statistics"""
+        if self.intervals is None:
+            return None
+        slot = self.city_slots.get(city, self.unknown_city_slot)
+        values = {'sqft': sqft, 'bed': bed, 'bath': bath}
+        d = [values[f] - m for f, m in zip(self.numeric_features, self._centre_rows[slot])]
+        leverage = self._inv_count_list[slot] + sum(
+            di * sum(w * dj for w, dj in zip(row, d)) for di, row in zip(d, self._within_rows)
+        )
+        return math.sqrt(self.sigma2 * (1.0 + leverage) + self._extra_var_list[slot])
+
+    def predictive_sd_many(self, sqft: np.ndarray, bed: np.ndarray, bath: np.ndarray,
+                           city_idx: np.ndarray) -> Optional[np.ndarray]:
+        """Vectorized ``predictive_sd``"""
+        if self.intervals is None:
+            return None
+        values = {'sqft': sqft, 'bed': bed, 'bath': bath}
+        z = np.column_stack([np.asarray(values[f], dtype=np.float64) for f in self.numeric_features])
+        d = z - self._centres[city_idx]
+        leverage = self._inv_count[city_idx] + np.einsum('ij,jk,ik->i', d, self.within_inv, d)
+        return np.sqrt(self.sigma2 * (1.0 + leverage) + self._extra_var[city_idx])
+
+    def city_index(self, cities: Sequence[str]) -> np.ndarray:
+        """Map city names to slots in ``city_coef``; unknown cities get ``unknown_city_slot``"""
+        slots = self.city_slots
+        unknown = self.unknown_city_slot
+        return np.fromiter((slots.get(c, unknown) for c in cities), dtype=np.intp, count=len(cities))
+
+    def predict_many(self, sqft: np.ndarray, bed: np.ndarray, bath: np.ndarray, city_idx: np.ndarray) -> np.ndarray:
+        """Vectorized ``predict``: one NumPy pass, city dummies gathered by index"""
+        return (
+            self._bed * np.asarray(bed, dtype=np.float64)
+            + self._bath * np.asarray(bath, dtype=np.float64)
+            + self._sqft * np.asarray(sqft, dtype=np.float64)
+            + self.city_coef[city_idx]
+            + self.intercept
+        )
+
+
+def fit_interval_stats(numeric: np.ndarray, cities: Sequence[str], residuals: np.ndarray,
+                       numeric_features: Sequence[str], city_names: Sequence[str]) -> Dict[str, Any]:
+    """Statistics for OLS prediction intervals of a model with one dummy per city.
+
+    ``numeric`` holds the training rows' numeric features, ``cities`` their
+    city and ``residuals`` the fitted model's training residuals. Stored
+    instead of the dense (X'X)^-1: the residual variance, per-city row
+    counts and feature means (ordered like ``city_names``), and the inverse
+    of the pooled within-city scatter matrix W.
+    """
+    numeric = np.asarray(numeric, dtype=np.float64)
+    residuals = np.asarray(residuals, dtype=np.float64)
+    slots = {city: i for i, city in enumerate(city_names)}
+    codes = np.array([slots[c] for c in cities], dtype=np.intp)
+    counts = np.bincount(codes, minlength=len(city_names))
+    sums = np.zeros((len(city_names), numeric.shape[1]))
+    np.add.at(sums, codes, numeric)
+    means = sums / np.maximum(counts, 1)[:, None]
+    centred = numeric - means[codes]
+    within = centred.T @ centred
+    # One level per city with rows, plus one slope per numeric feature
+    dof = len(residuals) - int(np.count_nonzero(counts)) - numeric.shape[1]
+    if dof <= 0:
+        raise ValueError("Too few training rows for prediction intervals")
+    return {
+        'numeric_features': list(numeric_features),
+        'sigma2': float(residuals @ residuals / dof),
+        'dof': dof,
+        'mean': numeric.mean(axis=0).tolist(),
+        'within_inv': np.linalg.inv(within).tolist(),
+        'city_counts': counts.tolist(),
+        'city_means': means.tolist(),
+    }
+
+
+@lru_cache(maxsize=None)
+def t_quantile(p: float, dof: int) -> float:
+    """Student t quantile from the normal one plus its Cornish-Fisher expansion in 1/dof.
+
+    Accurate to about 1e-4 from a few dozen degrees of freedom up, and
+    avoids importing scipy in the server.
+    """
+    from statistics import NormalDist
+
+    z = NormalDist().inv_cdf(p)
+    return (
+        z
+        + (z ** 3 + z) / (4 * dof)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3)
+    )
+
+
+def normal_cdf(x):
+    """Standard normal CDF for scalars or arrays (Abramowitz and Stegun 7.1.26 for arrays, error < 1.5e-7)"""
+    if isinstance(x, float):
+        return 0.5 * (1.0 + math.erf(x / math.sqrt(2)))
+    x = np.asarray(x, dtype=np.float64)
+    t = 1.0 / (1.0 + 0.3275911 * np.abs(x) / math.sqrt(2))
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x / 2)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def save_artifact(path: Path, feature_names: Sequence[str], coef: Sequence[float], intercept: float,
+                  metadata: Optional[Dict[str, Any]] = None, intervals: Optional[Dict[str, Any]] = None) -> None:
+    """Write the lean JSON model artifact; floats are written with full round-trip precision"""
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'version': ARTIFACT_VERSION,
+        'feature_names': list(feature_names),
+        'coef': [float(c) for c in coef],
+        'intercept': float(intercept),
+        'metadata': metadata or {},
+    }
+    if intervals is not None:
+        artifact['intervals'] = intervals
+    # Renamed into place, so a server reading the artifact never sees half of it
+    tmp_path = Path(path).with_name(Path(path).name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(artifact, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path: Path) -> CompiledLinearModel:
+    """Compile a lean JSON model artifact without importing sklearn"""
+    with open(path) as f:
+        artifact = json.load(f)
+    if artifact.get('format') != ARTIFACT_FORMAT or artifact.get('version') != ARTIFACT_VERSION:
+        raise ValueError(f"{path} is not a version {ARTIFACT_VERSION} {ARTIFACT_FORMAT} artifact")
+    # Optional: artifacts exported before intervals existed still load, without them
+    model = CompiledLinearModel(artifact['feature_names'], artifact['coef'], artifact['intercept'],
+                                artifact.get('intervals'))
+    model.metadata = artifact['metadata']
+    return model
+
+
+if __name__ == '__main__':
+    # Convert an existing joblib model into the lean artifact:
+    #   python predictor.py model.joblib model.json
+    import sys
+    import joblib
+
+    source, target = Path(sys.argv[1]), Path(sys.argv[2])
+    estimator = joblib.load(source)
+    save_artifact(target, estimator.feature_names_in_.tolist(), estimator.coef_, estimator.intercept_, {
+        'exported_from': source.name,
+        'estimator': type(estimator).__name__,
+    })
+    print(f"Wrote {target}")
@@ -0,0 +1,83 @@
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from predictor import FEATURE_LIMITS, CompiledLinearModel
+
+# Feature axes of a price grid, innermost last; cities are the outermost axis
+GRID_AXES = ('sqft', 'bed', 'bath')
+# Upper bound on points (cities x sqft x bed x bath) evaluated by one request
+MAX_GRID_POINTS = int(os.environ.get('MAX_GRID_POINTS', 250000))
+# Upper bound on the values of any single feature axis
+MAX_AXIS_VALUES = 1000
+# Largest price that still fits the int64 the rounded prices are sent as
+_MAX_GRID_PRICE = 2.0 ** 63
+
+
+class GridSizeError(ValueError):
+    """Raised when a grid has more points than MAX_GRID_POINTS"""
+
+
+def axis_values(values: Optional[Sequence[float]] = None, start: Optional[float] = None,
+                stop: Optional[float] = None, step: Optional[float] = None, name: str = 'axis') -> np.ndarray:
+    """Values of one grid axis: an explicit list, or start..stop inclusive in steps of ``step``.
+
+    Raises ValueError on an empty, non-positive or oversized axis, or on
+    values above the feature's FEATURE_LIMITS entry; the size of a range is
+    checked before it is materialized.
+    """
+    if values is not None:
+        if start is not None or stop is not None or step is not None:
+            raise ValueError(f"{name}: give either values or start/stop/step, not both")
+        axis = np.asarray(values, dtype=np.float64)
+        if axis.ndim != 1 or len(axis) == 0:
+            raise ValueError(f"{name}: values must be a non-empty list of numbers")
+        if len(axis) > MAX_AXIS_VALUES:
+            raise ValueError(f"{name}: at most {MAX_AXIS_VALUES} values")
+    else:
+        if start is None:
+            raise ValueError(f"{name}: give values or a start")
+        stop = start if stop is None else stop
+        step = 1.0 if step is None else step
+        if not all(math.isfinite(v) for v in (start, stop, step)) or step <= 0 or stop < start:
+            raise ValueError(f"{name}: needs start <= stop and a positive step")
+        # A small tolerance so a stop reached by floating point steps is included
+        count = math.floor((stop - start) / step + 1e-9) + 1
+        if count > MAX_AXIS_VALUES:
+            raise ValueError(f"{name}: at most {MAX_AXIS_VALUES} values, the range has {count}")
+        axis = start + step * np.arange(count)
+    if not np.all(np.isfinite(axis)) or np.any(axis <= 0):
+        raise ValueError(f"{name}: values must be positive numbers")
+    if name in FEATURE_LIMITS and axis.max() > FEATURE_LIMITS[name]:
+        raise ValueError(f"{name}: values must be at most {FEATURE_LIMITS[name]:g}")
+    return axis
+
+
+def grid_size(cities: int, axes: Dict[str, np.ndarray]) -> int:
+    return cities * math.prod(len(axes[name]) for name in GRID_AXES)
+
+
+def evaluate_grid(model: CompiledLinearModel, cities: List[str], axes: Dict[str, np.ndarray]) -> Dict[str, object]:
+    """Price of every (city, sqft, bed, bath) combination, as a flat row-major array plus its shape.
+
+    Prices are rounded to whole dollars, which keeps the JSON for a full
+    grid to about 7 bytes per point instead of one object per point.
+    Raises GridSizeError on too many points and ValueError when a price
+    is not finite or does not fit an int64.
+    """
+    size = grid_size(len(cities), axes)
+    if size > MAX_GRID_POINTS:
+        raise GridSizeError(f"Grid has {size} points; at most {MAX_GRID_POINTS} per request")
+    prices = np.rint(model.predict_grid(axes['sqft'], axes['bed'], axes['bath'], model.city_index(cities)))
+    # NaN fails the comparison too; casting such values to int64 would wrap silently
+    if not np.all(np.abs(prices) < _MAX_GRID_PRICE):
+        raise ValueError("Some grid prices are not finite or too large; narrow the axes")
+    return {
+        'axes': ['city', *GRID_AXES],
+        'shape': list(prices.shape),
+        'city': cities,
+        **{name: axes[name].tolist() for name in GRID_AXES},
+        'prices': prices.astype(np.int64).ravel().tolist(),
+    }
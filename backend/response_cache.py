@@ -0,0 +1,37 @@
+import hashlib
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Data only changes on reload, so clients may reuse a payload briefly and then revalidate
+CACHE_CONTROL = 'public, max-age=60, must-revalidate'
+
+
+class CachedPayload:
+    """A JSON response body serialized once, with a content hash used as its ETag"""
+
+    __slots__ = ('body', 'etag', 'headers')
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        # Extra response headers describing the payload, e.g. a total count
+        self.headers = headers or {}
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True when an If-None-Match header already names this payload"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*' or tag.removeprefix('W/') == self.etag:
+                return True
+        return False
+
+    def response(self, request: Request) -> Response:
+        """Serve the stored bytes, or an empty 304 if the client's copy is current"""
+        headers = {'ETag': self.etag, 'Cache-Control': CACHE_CONTROL, **self.headers}
+        if self.matches(request.headers.get('if-none-match')):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type='application/json', headers=headers)
@@ -1,31 +1,101 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File, Form, Header, Request, Query
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+import math
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from typing import BinaryIO, List, Optional, Dict, Any, Tuple, Union
 import uuid
+import time
+import secrets
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
 from datetime import datetime
-import pandas as pd
 import numpy as np
-import requests
 import base64
-from PIL import Image
-import io
 import json
-import joblib
+from predictor import (
+    FEATURE_LIMITS,
+    INTERVAL_LEVEL,
+    CompiledLinearModel,
+    load_artifact,
+    normal_cdf,
+    save_artifact,
+    t_quantile,
+)
+from dataset import CSV_PATH, SNAPSHOT_PATH, HouseDataset, load_house_dataset, load_snapshot_model
+from ingestion import ListingIngestor, append_listings_csv
+from online_training import NUMERIC_FEATURES, OnlineLeastSquares
+from response_cache import CachedPayload
+from image_processing import (
+    DEFAULT_OUTPUT_FORMAT,
+    DEFAULT_QUALITY,
+    OUTPUT_FORMATS,
+    SNIFF_BYTES,
+    ImagePool,
+    ImagePoolBusy,
+    sniff_image_format,
+)
+from image_cache import ProcessedImageCache
+from prediction_cache import PredictionCache
+from comparables import DEFAULT_COMPARABLES, MAX_COMPARABLES, ComparablesIndex
+from city_search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, CityIndex, normalize_city
+from serving_state import RELOAD_POLL_SECONDS, PinServingState, ServingState, source_signature
+from price_grid import GRID_AXES, GridSizeError, axis_values, evaluate_grid
+from upload_limits import MAX_IMAGE_UPLOAD_BYTES, ImageUploadGuard
+from aggregations import (
+    CITY_SORT_FIELDS,
+    MAX_HEXBIN_GRIDSIZE,
+    MAX_SCATTER_POINTS,
+    CityStatsTable,
+    hexbin,
+    histogram,
+    stratified_sample,
+)
+from bulk_scoring import (
+    BULK_MEDIA_TYPES,
+    BodyStreamingResponse,
+    BulkInputError,
+    format_from_content_type,
+    iter_lines,
+    read_csv_header,
+    score_stream,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Heavy optional dependencies are imported where they are used: PIL in
+# image_processing.py, motor in get_db, pandas only when parsing the CSV
+# (dataset.py) and sklearn only for the joblib model fallback.
+# startup_benchmark.py checks the import and readiness budget.
+startup_timings: Dict[str, float] = {}
+_module_started = time.perf_counter()
+
+@contextmanager
+def timed(component: str, timings: Optional[Dict[str, float]] = None):
+    """Record how long a startup (or reload) step took, in milliseconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (startup_timings if timings is None else timings)[component] = round((time.perf_counter() - started) * 1000, 1)
+
+# MongoDB connection, opened on first use
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = None
+
+def get_db():
+    """Return the Mongo database, creating the motor client the first time"""
+    global client
+    if client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+    return client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
 app = FastAPI(title="House Price Predictor API", version="1.0.0")
@@ -33,82 +103,370 @@ app = FastAPI(title="House Price Predictor API", version="1.0.0")
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Load house data on startup
-house_data = None
-city_stats = None
-house_stats = None
+class DataState:
+    """One version of the house data and everything derived from it.
+    
+    Never changed once built. Loads and listing ingestion build a new one
+    and publish it inside a new ServingState, so a request keeps reading
+    the version it started with. The indexes and serialized payloads are
+    built on first use, once per version.
+    """
+    
+    def __init__(self, dataset: HouseDataset, version: int):
+        self.dataset = dataset
+        self.house_data = dataset.house_data
+        self.city_stats = dataset.city_stats
+        self.house_stats = dataset.house_stats
+        self.correlations = dataset.correlations
+        self.version = version
+    
+    @cached_property
+    def city_table(self) -> CityStatsTable:
+        """city_stats with its sort orders precomputed, for paged /cities requests"""
+        return CityStatsTable(self.city_stats)
+    
+    @cached_property
+    def comparables_index(self) -> ComparablesIndex:
+        """Nearest-listing index for /comparables"""
+        return ComparablesIndex(self.house_data)
+    
+    @cached_property
+    def stats_payload(self) -> CachedPayload:
+        return CachedPayload(HouseStats(**self.house_stats).model_dump_json().encode())
+    
+    @cached_property
+    def cities_payload(self) -> CachedPayload:
+        return CachedPayload(city_stats_adapter.dump_json(build_city_stats_list(self)),
+                             headers={'X-Total-Count': str(len(self.city_stats))})
+    
+    @cached_property
+    def visualization_payload(self) -> CachedPayload:
+        return CachedPayload(json.dumps(build_visualization_data(self), separators=(',', ':')).encode())
+    
+    def warm(self, timings: Dict[str, float]):
+        """Build the indexes and payloads now instead of on the first requests that need them"""
+        with timed('comparables', timings):
+            self.comparables_index
+        with timed('response_cache', timings):
+            self.stats_payload, self.cities_payload, self.visualization_payload
+
+# The house data, price model and city index every new request is pinned to;
+# its data or model is None when loading failed
+serving_state = ServingState(None, None, CityIndex([]), 0)
+# Last data version handed out
+data_version = 0
+# Appends ingested listings to the published data; rebuilt after every load
+listing_ingestor: Optional[ListingIngestor] = None
+# Least-squares statistics behind /api/model/refit: built from the house
+# table on first use, then kept current by /api/listings
+online_trainer: Optional[OnlineLeastSquares] = None
+# Held while a reload builds the next state; the endpoints that change data
+# or the model refuse to run meanwhile, so none of their changes are lost
+reload_lock = asyncio.Lock()
+
+def pinned_state(request: Request) -> ServingState:
+    """The serving state the request arrived on (see PinServingState)"""
+    return request.scope.get('serving_state') or serving_state
+
+def build_city_index(data: Optional[DataState], model: Optional[CompiledLinearModel]) -> CityIndex:
+    """Index the model's cities and the dataset's cities with their listing counts"""
+    house_counts = {record['city']: record['house_count'] for record in data.city_stats} if data else {}
+    model_cities = model.cities if model is not None else []
+    return CityIndex([*model_cities, *house_counts], house_counts)
+
+def publish_state(data: Optional[DataState], model: Optional[CompiledLinearModel],
+                  city_index: Optional[CityIndex] = None) -> ServingState:
+    """Make ``data`` and ``model`` the versions every new request reads, in a single assignment.
+    
+    Caches keyed on the previous data or model are dropped first; requests
+    pinned to the previous state bypass the prediction cache from then on.
+    """
+    global serving_state
+    previous = serving_state
+    if city_index is None:
+        city_index = build_city_index(data, model)
+    if model is not previous.model:
+        prediction_cache.reset(model.version if model is not None else None)
+    if data is not previous.data:
+        cached_histogram.cache_clear()
+        cached_visualization_data.cache_clear()
+        cached_city_page.cache_clear()
+    model_city_index = previous.model_city_index if model is previous.model else None
+    serving_state = ServingState(data, model, city_index, previous.version + 1, model_city_index)
+    return serving_state
+
+def publish_data(dataset: Optional[HouseDataset], warm: bool = False) -> Optional[DataState]:
+    """Make ``dataset`` the version every new request reads, alongside the current model.
+    
+    With ``warm``, the indexes and payloads are built before the swap
+    instead of by the first requests that need them.
+    """
+    global data_version
+    previous = serving_state
+    data = DataState(dataset, data_version + 1) if dataset is not None else None
+    if data is not None and warm:
+        data.warm(startup_timings)
+    data_version += 1
+    city_index = None
+    if previous.data is not None and data is not None and previous.data.house_data.city_names == data.house_data.city_names:
+        # Same cities, e.g. listings ingested for known ones: only the counts changed
+        city_index = previous.city_index.with_house_counts({r['city']: r['house_count'] for r in data.city_stats})
+    publish_state(data, previous.model, city_index)
+    return data
 
 def load_house_data():
-    """Load and process house data from CSV"""
-    global house_data, city_stats, house_stats
+    """Load house data and its statistics from the snapshot or CSV"""
+    global listing_ingestor, online_trainer, loaded_signature
+    listing_ingestor = None
+    online_trainer = None
+    loaded_signature = source_signature(SOURCE_PATHS)
     try:
-        csv_path = ROOT_DIR.parent / "images" / "socal2.csv"
-        house_data = pd.read_csv(csv_path)
-        
-        # Calculate city statistics
-        city_stats = house_data.groupby('citi').agg({
-            'price': ['mean', 'count', 'min', 'max'],
-            'sqft': 'mean',
-            'bed': 'mean',
-            'bath': 'mean'
-        }).round(2)
-        
-        # Calculate overall statistics
-        house_stats = {
-            'total_houses': len(house_data),
-            'avg_price': house_data['price'].mean(),
-            'avg_sqft': house_data['sqft'].mean(),
-            'avg_bed': house_data['bed'].mean(),
-            'avg_bath': house_data['bath'].mean(),
-            'price_ranges': {
-                'low': {'min': 195000, 'max': 796666, 'count': 0},
-                'mid': {'min': 796667, 'max': 1398333, 'count': 0},
-                'high': {'min': 1398334, 'max': 2000000, 'count': 0}
-            },
-            'bed_distribution': {str(k): v for k, v in house_data['bed'].value_counts().to_dict().items()},
-            'bath_distribution': {str(k): v for k, v in house_data['bath'].value_counts().to_dict().items()}
-        }
-        
-        # Calculate price range counts
-        house_stats['price_ranges']['low']['count'] = len(house_data[house_data['price'] <= 796666])
-        house_stats['price_ranges']['mid']['count'] = len(house_data[(house_data['price'] > 796666) & (house_data['price'] <= 1398333)])
-        house_stats['price_ranges']['high']['count'] = len(house_data[house_data['price'] > 1398333])
-        
-        logging.info(f"Loaded {len(house_data)} house records")
-        
+        # A prebuilt snapshot (python dataset.py snapshot) skips pandas, CSV parsing and the groupby
+        with timed('data'):
+            dataset = load_house_dataset()
+        logging.info(f"Loaded {len(dataset.house_data)} house records")
+        publish_data(dataset, warm=True)
     except Exception as e:
         logging.error(f"Error loading house data: {e}")
-        house_data = pd.DataFrame()
-        city_stats = pd.DataFrame()
-        house_stats = {}
+        publish_data(None)
 
 # Load the retrained linear regression model
 MODEL_PATH = ROOT_DIR.parent / 'linear_regression_model_retrained.joblib'
+# Lean JSON export of the same model; serving from it never imports sklearn
+MODEL_ARTIFACT_PATH = ROOT_DIR.parent / 'linear_regression_model_retrained.json'
 MODEL_FEATURES = ['bed', 'bath', 'sqft']  # Will be extended with citi_*
-try:
-    linear_model = joblib.load(MODEL_PATH)
-    # Extract feature names from the model training script
-    # We'll infer city dummies from the model's coef_ and intercept
-    model_feature_names = linear_model.feature_names_in_.tolist()
-except Exception as e:
-    logging.error(f"Could not load retrained linear regression model: {e}")
-    linear_model = None
-    model_feature_names = []
+# Results of predict_price_from_data, bound to the loaded model's version
+prediction_cache = PredictionCache()
+# Files the data and model are loaded from, watched when RELOAD_POLL_SECONDS is set
+SOURCE_PATHS = (CSV_PATH, SNAPSHOT_PATH, MODEL_ARTIFACT_PATH)
+# source_signature of SOURCE_PATHS as last loaded, or as last written by this process
+loaded_signature = None
+
+def read_price_model() -> CompiledLinearModel:
+    """The price model from the snapshot, the JSON artifact or, failing both, the joblib pickle"""
+    # The snapshot's memory-mapped coefficients are shared by every worker
+    model = load_snapshot_model(model_path=MODEL_ARTIFACT_PATH)
+    if model is None and MODEL_ARTIFACT_PATH.exists():
+        try:
+            model = load_artifact(MODEL_ARTIFACT_PATH)
+        except Exception as e:
+            logging.warning(f"Could not load model artifact {MODEL_ARTIFACT_PATH.name}, falling back to joblib: {e}")
+    if model is None:
+        # Unpickling pulls in sklearn; only done when no lean artifact is available
+        import joblib
+        # Compile once so a prediction is a city lookup plus a few float ops
+        model = CompiledLinearModel.from_estimator(joblib.load(MODEL_PATH))
+    return model
+
+def load_price_model():
+    """Load the price model and drop every prediction cached for the previous one"""
+    try:
+        model = read_price_model()
+    except Exception as e:
+        logging.error(f"Could not load retrained linear regression model: {e}")
+        model = None
+    publish_model(model)
+
+def publish_model(model: Optional[CompiledLinearModel]):
+    """Make ``model`` the one new predictions use, alongside the current data.
+    
+    A prediction already running finishes with the model it started with.
+    """
+    publish_state(serving_state.data, model)
+
+def refit_price_model() -> Tuple[CompiledLinearModel, float]:
+    """Solve the online statistics, building them from the house table first if needed; returns (model, ms).
+    
+    Once listings were ingested the statistics already exist (see
+    ingest_listings), so the table is only read here while it still
+    matches the loaded files.
+    """
+    global online_trainer
+    data = serving_state.data
+    if online_trainer is None:
+        if data is None:
+            raise HTTPException(status_code=500, detail="House data not loaded")
+        online_trainer = OnlineLeastSquares.from_houses(data.house_data)
+    started = time.perf_counter()
+    try:
+        model = online_trainer.solve()
+    except (ValueError, np.linalg.LinAlgError) as e:
+        raise HTTPException(status_code=500, detail=f"Could not fit the model: {e}")
+    return model, (time.perf_counter() - started) * 1000
+
+def validate_serving_inputs(dataset: HouseDataset, model: CompiledLinearModel):
+    """Raise ValueError unless the data is non-empty and the model prices every listing in it finitely"""
+    houses = dataset.house_data
+    if len(houses) == 0 or not dataset.city_stats:
+        raise ValueError("The house data is empty")
+    if sorted(model.numeric_features) != sorted(NUMERIC_FEATURES):
+        raise ValueError(f"The model's numeric features are {model.numeric_features}, expected {list(NUMERIC_FEATURES)}")
+    features = dict(
+        sqft=np.asarray(houses['sqft'], dtype=np.float64),
+        bed=np.asarray(houses['bed'], dtype=np.float64),
+        bath=np.asarray(houses['bath'], dtype=np.float64),
+        city_idx=model.city_index(houses.city_names)[np.asarray(houses.city_codes, dtype=np.intp)]
+    )
+    if not np.all(np.isfinite(model.predict_many(**features))):
+        raise ValueError("The model predicts non-finite prices for some listings")
+    sds = model.predictive_sd_many(**features)
+    if sds is not None and not np.all(np.isfinite(sds)):
+        raise ValueError("The model's prediction intervals are not finite for some listings")
+
+def read_serving_inputs(version: int, timings: Dict[str, float]) -> Tuple[DataState, CompiledLinearModel]:
+    """Load, validate and warm the next data version and model; runs in a worker thread during a reload"""
+    with timed('data', timings):
+        dataset = load_house_dataset()
+    with timed('model', timings):
+        model = read_price_model()
+    with timed('validate', timings):
+        validate_serving_inputs(dataset, model)
+    data = DataState(dataset, version)
+    data.warm(timings)
+    return data, model
+
+async def reload_serving_state() -> Tuple[ServingState, Dict[str, float]]:
+    """Rebuild data and model from their files off the event loop, then swap both in at once.
+    
+    Raises whatever loading or validation raised; the current state keeps
+    serving in that case. Returns the new state and the build timings.
+    """
+    global data_version, listing_ingestor, online_trainer, loaded_signature
+    async with reload_lock:
+        signature = source_signature(SOURCE_PATHS)
+        timings: Dict[str, float] = {}
+        data, model = await asyncio.to_thread(read_serving_inputs, data_version + 1, timings)
+        # Both were built from the files, so neither has the other's pending changes to carry over
+        data_version = data.version
+        listing_ingestor = None
+        online_trainer = None
+        loaded_signature = signature
+        return publish_state(data, model), timings
+
+async def watch_sources():
+    """Reload whenever the CSV, snapshot or model artifact changes on disk; polls every RELOAD_POLL_SECONDS"""
+    global loaded_signature
+    while True:
+        await asyncio.sleep(RELOAD_POLL_SECONDS)
+        signature = source_signature(SOURCE_PATHS)
+        if signature == loaded_signature or reload_lock.locked():
+            continue
+        try:
+            state, timings = await reload_serving_state()
+            logging.info(f"Reloaded after a file change: snapshot {state.version}, model {state.model_version}, {timings}")
+        except Exception as e:
+            # Not retried until the files change again, e.g. when a partial write completes
+            loaded_signature = signature
+            logging.error(f"Reload after a file change failed, still serving snapshot {serving_state.version}: {e}")
+
+def check_no_reload():
+    """Refuse changes that a reload in progress would overwrite"""
+    if reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload is in progress; retry shortly")
+
+with timed('model'):
+    load_price_model()
+
+# Image preprocessing runs here rather than on the event loop; repeat uploads
+# of the same photo are answered from the processed-image cache
+image_pool = ImagePool(cache=ProcessedImageCache())
+
+# Upper bound on records scored by a single /api/predict/batch call
+MAX_BATCH_SIZE = 10000
+# Shared secret for the endpoints that change server data (X-Admin-Token);
+# they are disabled while it is unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+# Ingested listings are appended here, so the next start loads them too
+LISTINGS_CSV_PATH = CSV_PATH
 
 # Data Models
 class HousePredictionInput(BaseModel):
-    sqft: int = Field(..., gt=0, description="Square footage of the house")
-    bed: int = Field(..., gt=0, description="Number of bedrooms")
-    bath: float = Field(..., gt=0, description="Number of bathrooms")
+    sqft: int = Field(..., gt=0, le=FEATURE_LIMITS['sqft'], description="Square footage of the house")
+    bed: int = Field(..., gt=0, le=FEATURE_LIMITS['bed'], description="Number of bedrooms")
+    bath: float = Field(..., gt=0, le=FEATURE_LIMITS['bath'], description="Number of bathrooms")
     city: str = Field(..., description="City name")
 
+class GridAxis(BaseModel):
+    start: float
+    stop: Optional[float] = None
+    step: Optional[float] = None
+
+class PriceGridInput(BaseModel):
+    cities: Optional[List[str]] = Field(None, description="Cities to evaluate; every city the model knows when omitted")
+    sqft: Union[List[float], GridAxis]
+    bed: Union[List[float], GridAxis]
+    bath: Union[List[float], GridAxis]
+
+class ListingInput(BaseModel):
+    city: str = Field(..., min_length=1, description="City name; a new city is added to the statistics")
+    sqft: int = Field(..., gt=0)
+    bed: int = Field(..., gt=0)
+    bath: float = Field(..., gt=0)
+    price: int = Field(..., gt=0)
+    street: Optional[str] = None
+
+    @field_validator('city')
+    @classmethod
+    def city_must_have_a_name(cls, city: str) -> str:
+        city = city.strip()
+        if not normalize_city(city):
+            raise ValueError("city must contain letters or digits")
+        return city
+
+class IngestResponse(BaseModel):
+    ingested: int
+    total_houses: int
+    new_cities: List[str]
+    data_version: int
+    model_version: Optional[str] = None
+
+class RefitResponse(BaseModel):
+    model_version: str
+    previous_version: Optional[str]
+    train_rows: int
+    cities: int
+    residual_sd: float
+    solve_ms: float
+    saved: bool
+
+class ReloadResponse(BaseModel):
+    snapshot_version: int
+    data_version: int
+    model_version: str
+    previous_snapshot_version: int
+    total_houses: int
+    build_ms: Dict[str, float]
+
+class PriceInterval(BaseModel):
+    low: float
+    high: float
+    level: float
+
 class PredictionResponse(BaseModel):
     predicted_price: float
     price_range: str
     confidence: float
+    price_interval: Optional[PriceInterval] = None
     factors: Dict[str, Any]
     image_prediction: Optional[Dict[str, Any]] = None
 
+class HistogramResponse(BaseModel):
+    column: str
+    edges: List[float]
+    counts: List[int]
+    total: int
+    filters: Dict[str, Any]
+
+class BatchPredictionItem(BaseModel):
+    index: int
+    prediction: Optional[PredictionResponse] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+    succeeded: int
+    failed: int
+
 class HouseStats(BaseModel):
     total_houses: int
     avg_price: float
@@ -129,77 +487,242 @@ class CityStats(BaseModel):
     avg_bed: float
     avg_bath: float
 
+city_stats_adapter = TypeAdapter(List[CityStats])
+
+class CityMatch(BaseModel):
+    city: str
+    house_count: int
+    match: str
+
+class CitySearchResponse(BaseModel):
+    query: str
+    results: List[CityMatch]
+
+class Comparable(BaseModel):
+    row: int
+    city: str
+    sqft: float
+    bed: float
+    bath: float
+    price: float
+    distance: float
+    same_city: bool
+
+class ComparablesResponse(BaseModel):
+    city: str
+    k: int
+    comparables: List[Comparable]
+
+# Upper bounds of the Low and Mid price ranges
+LOW_PRICE_MAX = 796666
+MID_PRICE_MAX = 1398333
+PRICE_RANGE_BOUNDS = {
+    'Low': (-np.inf, LOW_PRICE_MAX),
+    'Mid': (LOW_PRICE_MAX, MID_PRICE_MAX),
+    'High': (MID_PRICE_MAX, np.inf),
+}
+# Reported when the model artifact carries no interval statistics
+DEFAULT_CONFIDENCE = 0.8
+
 # Helper functions
+def check_admin_token(token: Optional[str]):
+    """Reject requests to admin endpoints without the configured ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if token is None or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Admin-Token")
+
 def get_price_range(price: float) -> str:
     """Determine price range category"""
-    if price <= 796666:
+    if price <= LOW_PRICE_MAX:
         return "Low"
-    elif price <= 1398333:
+    elif price <= MID_PRICE_MAX:
         return "Mid"
     else:
         return "High"
 
-def predict_price_from_data(sqft: int, bed: int, bath: float, city: str) -> Dict[str, Any]:
+def range_confidence(predicted_price, sd):
+    """Probability that the actual price falls in the predicted price range; scalars or arrays"""
+    if isinstance(predicted_price, float):
+        low, high = PRICE_RANGE_BOUNDS[get_price_range(predicted_price)]
+    else:
+        predicted_price = np.asarray(predicted_price, dtype=np.float64)
+        bucket = np.searchsorted([LOW_PRICE_MAX, MID_PRICE_MAX], predicted_price)
+        low = np.array([-np.inf, LOW_PRICE_MAX, MID_PRICE_MAX])[bucket]
+        high = np.array([LOW_PRICE_MAX, MID_PRICE_MAX, np.inf])[bucket]
+    # Thousands of residual degrees of freedom: the t and normal CDFs agree to ~1e-4
+    return normal_cdf((high - predicted_price) / sd) - normal_cdf((low - predicted_price) / sd)
+
+def predict_price_from_data(state: ServingState, sqft: int, bed: int, bath: float, city: str) -> Dict[str, Any]:
     """Predict house price using the retrained linear regression model"""
-    if linear_model is None or not model_feature_names:
+    model = state.model
+    if model is None:
         raise HTTPException(status_code=500, detail="Linear regression model not loaded")
+    city = resolve_city(state.model_city_index, city)
+    
+    predicted_price = model.predict(sqft=sqft, bed=bed, bath=bath, city=city)
+    sd = model.predictive_sd(sqft=sqft, bed=bed, bath=bath, city=city)
+    prediction = build_prediction(model, predicted_price, city, sd)
+    if not is_finite_prediction(prediction):
+        raise HTTPException(status_code=422, detail="Inputs are too far outside the data to price")
+    return prediction
+
+def resolve_city(city_index: CityIndex, city: str) -> str:
+    """Canonical spelling of a city in ``city_index``, whatever its case, punctuation or state suffix.
     
-    # Prepare input as a DataFrame with the same columns as the model
-    input_dict = {'bed': [bed], 'bath': [bath], 'sqft': [sqft]}
-    # Add all city dummies as 0, set the correct one to 1
-    for feature in model_feature_names:
-        if feature.startswith('citi_'):
-            input_dict[feature] = [1 if feature == f'citi_{city}' else 0]
-    # Fill missing city dummies with 0 (in case of unknown city)
-    for feature in model_feature_names:
-        if feature.startswith('citi_') and feature not in input_dict:
-            input_dict[feature] = [0]
-    import pandas as pd
-    X_input = pd.DataFrame(input_dict)
-    # Ensure columns are in the same order as model
-    X_input = X_input[model_feature_names]
-    predicted_price = linear_model.predict(X_input)[0]
-    # Defensive check
-    if not isinstance(predicted_price, (int, float)) or pd.isna(predicted_price) or np.isnan(predicted_price):
-        logging.warning(f"predicted_price is not a valid number: {predicted_price}. Setting to 0.")
-        predicted_price = 0.0
+    Predictions resolve against the model's cities only (model_city_index):
+    a city that is in the data but has no offset in the model is rejected
+    rather than priced as if it had an average location.
+    """
+    resolved = city_index.resolve(city)
+    if resolved is None:
+        suggestions = city_index.suggest(city)
+        hint = f" Did you mean: {'; '.join(suggestions)}?" if suggestions else ""
+        raise HTTPException(status_code=400, detail=f"Unknown city: {city}.{hint}")
+    return resolved
+
+async def cached_prediction(state: ServingState, sqft: int, bed: int, bath: float, city: str) -> Dict[str, Any]:
+    """predict_price_from_data through the prediction cache; callers must not mutate the result"""
+    if state.model_version != prediction_cache.model_version:
+        # Pinned to a model that has since been replaced: its results are not cached
+        return predict_price_from_data(state, sqft, bed, bath, city)
+    async def compute():
+        return predict_price_from_data(state, sqft, bed, bath, city)
+    return await prediction_cache.get((int(sqft), int(bed), float(bath), normalize_city(city)), compute)
+
+def build_prediction(model: CompiledLinearModel, predicted_price: float, city: str, sd: Optional[float] = None,
+                     confidence: Optional[float] = None) -> Dict[str, Any]:
+    """Shape an output of ``model`` the way PredictionResponse expects it.
+
+    ``sd`` is the predictive standard deviation from the model, if it has
+    interval statistics; ``confidence`` may be passed in when it was
+    already computed for a whole batch.
+    """
     factors = {
         'model': 'Linear regression model',
         'city_feature': f'citi_{city}'
     }
-    return {
+    prediction = {
         'predicted_price': float(predicted_price),
         'price_range': get_price_range(predicted_price),
-        'confidence': 0.8,  # Could be improved with model metrics
+        'confidence': DEFAULT_CONFIDENCE,
+        'price_interval': None,
         'factors': factors
     }
+    if sd is not None:
+        half_width = t_quantile(0.5 + INTERVAL_LEVEL / 2, model.dof) * sd
+        if confidence is None:
+            confidence = range_confidence(float(predicted_price), sd)
+        prediction['confidence'] = round(confidence, 4)
+        prediction['price_interval'] = {
+            # Prices are positive even where the normal error model is not
+            'low': max(float(predicted_price) - half_width, 0.0),
+            'high': float(predicted_price) + half_width,
+            'level': INTERVAL_LEVEL,
+        }
+    return prediction
 
-async def predict_from_image(image_data: bytes) -> Dict[str, Any]:
+def is_finite_prediction(prediction: Dict[str, Any]) -> bool:
+    """False when extreme inputs overflowed the price, its interval or its confidence (not valid JSON)"""
+    interval = prediction['price_interval'] or {'low': 0.0, 'high': 0.0}
+    return all(math.isfinite(value) for value in (
+        prediction['predicted_price'], prediction['confidence'], interval['low'], interval['high']
+    ))
+
+def predict_batch_from_data(state: ServingState, records: List[Any]) -> List[BatchPredictionItem]:
+    """Validate records individually and score the valid ones in one vectorized pass"""
+    model = state.model
+    if model is None:
+        raise HTTPException(status_code=500, detail="Linear regression model not loaded")
+    
+    results = [BatchPredictionItem(index=i) for i in range(len(records))]
+    valid = []
+    for i, record in enumerate(records):
+        try:
+            house = HousePredictionInput.model_validate(record)
+        except ValidationError as e:
+            results[i].error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            continue
+        resolved = state.model_city_index.resolve(house.city)
+        if resolved is None:
+            results[i].error = f"Unknown city: {house.city}"
+            continue
+        house.city = resolved
+        valid.append((i, house))
+    
+    if valid:
+        houses = [house for _, house in valid]
+        features = dict(
+            sqft=np.array([h.sqft for h in houses]),
+            bed=np.array([h.bed for h in houses]),
+            bath=np.array([h.bath for h in houses]),
+            city_idx=model.city_index([h.city for h in houses])
+        )
+        prices = model.predict_many(**features)
+        sds = model.predictive_sd_many(**features)
+        # Overflowing rows fail on their own instead of failing the whole response
+        invalid = ~np.isfinite(prices)
+        if sds is None:
+            sds = confidences = [None] * len(houses)
+        else:
+            with np.errstate(invalid='ignore', over='ignore'):
+                confidences = range_confidence(prices, sds)
+            invalid |= ~np.isfinite(sds) | ~np.isfinite(confidences)
+            confidences, sds = confidences.tolist(), sds.tolist()
+        for (i, house), price, sd, confidence, bad in zip(valid, prices.tolist(), sds, confidences, invalid.tolist()):
+            prediction = None if bad else build_prediction(model, price, house.city, sd, confidence)
+            if prediction is None or not is_finite_prediction(prediction):
+                results[i].error = "Model produced an invalid prediction"
+                continue
+            results[i].prediction = PredictionResponse(**prediction)
+    
+    return results
+
+def check_image_options(output_format: str, quality: int) -> str:
+    """Validate the re-encoding options of an image upload; returns the normalized format"""
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output_format must be one of {list(OUTPUT_FORMATS)}")
+    if not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="quality must be between 1 and 100")
+    return output_format
+
+async def read_image_upload(image: UploadFile) -> BinaryIO:
+    """Check an upload is a supported image within the size cap; returns its spooled file.
+    
+    The file is handed to the decoder as is, so the upload is never copied
+    into memory as one bytes object.
+    """
+    if sniff_image_format(await image.read(SNIFF_BYTES)) is None:
+        raise HTTPException(status_code=415, detail="Uploaded file is not a supported image")
+    await image.seek(0)
+    if image.size is not None and image.size > MAX_IMAGE_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload larger than {MAX_IMAGE_UPLOAD_BYTES} bytes")
+    return image.file
+
+async def predict_from_image(image_data: Union[bytes, BinaryIO], output_format: str = DEFAULT_OUTPUT_FORMAT,
+                             quality: int = DEFAULT_QUALITY) -> Dict[str, Any]:
     """Predict house price from image using Teachable Machine model"""
     try:
-        # Convert image to base64
-        image = Image.open(io.BytesIO(image_data))
-        # Resize image to match model input requirements (typically 224x224)
-        image = image.resize((224, 224))
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Convert to base64 for frontend processing
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
+        # Decode, resize to 224x224 and re-encode on the image pool so a large
+        # upload never blocks the event loop
+        encoded, mime_type = await image_pool.preprocess(image_data, output_format, quality)
+        img_base64 = base64.b64encode(encoded).decode()
         
         # Since we can't directly call TensorFlow.js from Python,
         # we'll return the image data for frontend processing
         return {
             'status': 'ready_for_prediction',
             'image_base64': img_base64,
+            'image_mime_type': mime_type,
             'model_url': 'https://teachablemachine.withgoogle.com/models/KjXP4uvx0/',
             'message': 'Image processed and ready for ML prediction'
         }
         
+    except ImagePoolBusy as e:
+        logging.warning(f"Rejecting image upload: {e}")
+        raise HTTPException(status_code=503, detail="Image processing is busy, retry shortly",
+                            headers={'Retry-After': '1'})
     except Exception as e:
         logging.error(f"Error processing image: {e}")
         return {
@@ -207,44 +730,211 @@ async def predict_from_image(image_data: bytes) -> Dict[str, Any]:
             'message': f'Error processing image: {str(e)}'
         }
 
+def build_city_stats_list(state: DataState) -> List[CityStats]:
+    """City statistics sorted by average price, most expensive first"""
+    records, _ = state.city_table.select('avg_price', 'desc')
+    return [CityStats(**record) for record in records]
+
+@lru_cache(maxsize=256)
+def cached_city_page(state: DataState, sort: str, order: str, offset: int, limit: Optional[int],
+                     min_count: Optional[int], max_count: Optional[int],
+                     min_avg_price: Optional[float], max_avg_price: Optional[float]) -> CachedPayload:
+    """One filtered, sorted page of city statistics; cleared whenever new data is published"""
+    records, total = state.city_table.select(
+        sort, order, offset=offset, limit=limit, min_count=min_count, max_count=max_count,
+        min_avg_price=min_avg_price, max_avg_price=max_avg_price
+    )
+    return CachedPayload(city_stats_adapter.dump_json([CityStats(**record) for record in records]),
+                         headers={'X-Total-Count': str(total)})
+
+def build_visualization_data(state: DataState) -> Dict[str, Any]:
+    """Raw columns and correlations used by the charts"""
+    house_data = state.house_data
+    price = house_data['price'].tolist()
+    sqft = house_data['sqft'].tolist()
+    return {
+        'histogram_data': {
+            'price': price,
+            'sqft': sqft
+        },
+        'scatter_data': {
+            'sqft_vs_price': {
+                'x': sqft,
+                'y': price
+            },
+            'bed_vs_price': {
+                'x': house_data['bed'].tolist(),
+                'y': price
+            },
+            'bath_vs_price': {
+                'x': house_data['bath'].tolist(),
+                'y': price
+            }
+        },
+        'correlation_matrix': state.correlations
+    }
+
+@lru_cache(maxsize=256)
+def cached_histogram(state: DataState, column: str, bins: Optional[int], edges: Optional[tuple], city: Optional[str],
+                     bed: Optional[float], bath: Optional[float],
+                     min_price: Optional[float], max_price: Optional[float]) -> CachedPayload:
+    """Histogram payloads keyed by bin configuration and filters; cleared whenever new data is published"""
+    result = histogram(
+        state.house_data, column, bins=bins, edges=edges,
+        city=city, bed=bed, bath=bath, min_price=min_price, max_price=max_price
+    )
+    return CachedPayload(json.dumps(result, separators=(',', ':')).encode())
+
+@lru_cache(maxsize=64)
+def cached_visualization_data(state: DataState, mode: str, max_points: Optional[int], gridsize: int) -> CachedPayload:
+    """Size-bounded variant of /visualization-data; cleared whenever new data is published.
+    
+    Scatter pairs are either density-preserving samples of at most
+    ``max_points`` points or hexbin cells, and the histograms are binned
+    counts rather than raw columns.
+    """
+    house_data = state.house_data
+    price = house_data.numeric['price']
+    scatter_data = {}
+    for feature in ('sqft', 'bed', 'bath'):
+        x = house_data.numeric[feature]
+        if mode == 'hexbin':
+            scatter_data[f'{feature}_vs_price'] = hexbin(x, price, gridsize)
+        else:
+            keep = stratified_sample(x, price, max_points)
+            scatter_data[f'{feature}_vs_price'] = {'x': x[keep].tolist(), 'y': price[keep].tolist()}
+    
+    result = {
+        'mode': mode,
+        'total_points': house_data.size,
+        'histogram_data': {
+            'price': histogram(house_data, 'price'),
+            'sqft': histogram(house_data, 'sqft')
+        },
+        'scatter_data': scatter_data,
+        'correlation_matrix': state.correlations
+    }
+    return CachedPayload(json.dumps(result, separators=(',', ':')).encode())
+
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "House Price Predictor API", "version": "1.0.0"}
 
+@api_router.get("/health")
+async def health(state: ServingState = Depends(pinned_state)):
+    """Readiness, the serving versions, how long each startup component took and cache counters"""
+    return {
+        'status': 'ok' if state.model is not None and state.data is not None else 'degraded',
+        'model_loaded': state.model is not None,
+        'data_loaded': state.data is not None,
+        'snapshot_version': state.version,
+        'data_version': state.data_version,
+        'model_version': state.model_version,
+        'startup_ms': startup_timings,
+        'image_cache': image_pool.cache.stats(),
+        'prediction_cache': prediction_cache.stats()
+    }
+
 @api_router.get("/stats", response_model=HouseStats)
-async def get_house_stats():
+async def get_house_stats(request: Request, state: ServingState = Depends(pinned_state)):
     """Get overall house statistics"""
-    if house_stats is None:
+    data = state.data
+    if data is None:
         raise HTTPException(status_code=500, detail="House statistics not available")
-    return house_stats
+    return data.stats_payload.response(request)
 
 @api_router.get("/cities", response_model=List[CityStats])
-async def get_city_stats():
-    """Get statistics by city"""
-    if city_stats is None:
+async def get_city_stats(
+    request: Request,
+    sort: str = Query('avg_price', description=f"One of {', '.join(CITY_SORT_FIELDS)}"),
+    order: str = Query('desc', description="asc or desc"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    min_count: Optional[int] = Query(None, ge=0, description="Only cities with at least this many houses"),
+    max_count: Optional[int] = Query(None, ge=0),
+    min_avg_price: Optional[float] = Query(None, ge=0),
+    max_avg_price: Optional[float] = Query(None, ge=0),
+    state: ServingState = Depends(pinned_state)
+):
+    """Get statistics by city, optionally filtered, re-sorted and paged.
+    
+    X-Total-Count holds the number of cities matching the filters, so the
+    top or bottom N can be fetched as two small pages.
+    """
+    data = state.data
+    if data is None:
         raise HTTPException(status_code=500, detail="City statistics not available")
+    filters = (min_count, max_count, min_avg_price, max_avg_price)
+    if (sort, order, offset, limit) == ('avg_price', 'desc', 0, None) and all(f is None for f in filters):
+        return data.cities_payload.response(request)
+    try:
+        payload = cached_city_page(data, sort, order, offset, limit, *filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return payload.response(request)
+
+@api_router.get("/cities/search", response_model=CitySearchResponse)
+async def search_cities(
+    q: str = Query('', description="Start of a city name, in any case, with or without ', CA'"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    state: ServingState = Depends(pinned_state)
+):
+    """Autocomplete city names: name prefix, then word prefix, then close spellings"""
+    return {'query': q, 'results': state.city_index.search(q, limit)}
+
+@api_router.get("/comparables", response_model=ComparablesResponse)
+async def get_comparables(
+    city: str = Query(..., description="City name, in any case, with or without ', CA'"),
+    sqft: float = Query(..., gt=0),
+    bed: float = Query(..., gt=0),
+    bath: float = Query(..., gt=0),
+    k: int = Query(DEFAULT_COMPARABLES, ge=1, le=MAX_COMPARABLES),
+    state: ServingState = Depends(pinned_state)
+):
+    """The k most similar real listings: same city first, closest in scaled sqft, bed and bath"""
+    data = state.data
+    if data is None:
+        raise HTTPException(status_code=500, detail="House data not loaded")
+    city = resolve_city(state.city_index, city)
+    return {'city': city, 'k': k, 'comparables': data.comparables_index.query(city, sqft, bed, bath, k)}
+
+@api_router.get("/aggregate/histogram", response_model=HistogramResponse)
+async def get_histogram(
+    request: Request,
+    column: str = Query('price', description="One of price, sqft, bed, bath"),
+    bins: Optional[int] = Query(None, description="Number of equal-width bins"),
+    edges: Optional[str] = Query(None, description="Comma-separated bin edges, instead of bins"),
+    city: Optional[str] = None,
+    bed: Optional[float] = None,
+    bath: Optional[float] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    state: ServingState = Depends(pinned_state)
+):
+    """Histogram counts for one column, binned server-side instead of shipping raw columns"""
+    data = state.data
+    if data is None:
+        raise HTTPException(status_code=500, detail="House data not loaded")
     
-    result = []
-    for city, stats in city_stats.iterrows():
-        result.append(CityStats(
-            city=city,
-            avg_price=stats[('price', 'mean')],
-            house_count=stats[('price', 'count')],
-            min_price=stats[('price', 'min')],
-            max_price=stats[('price', 'max')],
-            avg_sqft=stats[('sqft', 'mean')],
-            avg_bed=stats[('bed', 'mean')],
-            avg_bath=stats[('bath', 'mean')]
-        ))
-    
-    return sorted(result, key=lambda x: x.avg_price, reverse=True)
+    try:
+        edge_values = tuple(float(edge) for edge in edges.split(',')) if edges else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="edges must be comma-separated numbers")
+    if city is not None:
+        city = resolve_city(state.city_index, city)
+    try:
+        payload = cached_histogram(data, column, bins, edge_values, city, bed, bath, min_price, max_price)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return payload.response(request)
 
 @api_router.post("/predict", response_model=PredictionResponse)
-async def predict_house_price(input_data: HousePredictionInput):
+async def predict_house_price(input_data: HousePredictionInput, state: ServingState = Depends(pinned_state)):
     """Predict house price based on input parameters"""
     try:
-        prediction = predict_price_from_data(
+        prediction = await cached_prediction(
+            state,
             sqft=input_data.sqft,
             bed=input_data.bed,
             bath=input_data.bath,
@@ -253,26 +943,224 @@ async def predict_house_price(input_data: HousePredictionInput):
         
         return PredictionResponse(**prediction)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error in price prediction: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+@api_router.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_house_prices_batch(records: List[Dict[str, Any]], state: ServingState = Depends(pinned_state)):
+    """Predict prices for many houses at once; each record succeeds or fails on its own"""
+    if len(records) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: at most {MAX_BATCH_SIZE} records per request")
+    
+    results = predict_batch_from_data(state, records)
+    failed = sum(1 for item in results if item.error is not None)
+    return BatchPredictionResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+@api_router.post("/listings", response_model=IngestResponse)
+async def ingest_listings(
+    listings: List[ListingInput],
+    refit: bool = Query(False, description="Also re-solve and publish the price model"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Append new listings and publish statistics that include them, without a restart.
+    
+    Per-city and overall statistics are updated from the new listings
+    alone and swapped in as one new data version; requests already running
+    finish on the previous one. The listings are also appended to the CSV
+    and folded into the online model statistics.
+    """
+    global listing_ingestor, online_trainer, loaded_signature
+    check_admin_token(x_admin_token)
+    check_no_reload()
+    if not listings:
+        raise HTTPException(status_code=400, detail="No listings given")
+    if len(listings) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: at most {MAX_BATCH_SIZE} listings per request")
+    # The latest state, not the pinned one: listings are appended to the newest data
+    state = serving_state
+    if state.data is None:
+        raise HTTPException(status_code=500, detail="House data not loaded")
+    
+    records = []
+    for listing in listings:
+        record = listing.model_dump()
+        # Known cities keep their canonical spelling, whatever the input's case or suffix
+        record['city'] = state.city_index.resolve(listing.city) or listing.city
+        records.append(record)
+    new_cities = sorted({r['city'] for r in records} - set(state.data.house_data.city_lookup))
+    
+    if listing_ingestor is None:
+        listing_ingestor = ListingIngestor(state.data.dataset)
+    if online_trainer is None:
+        # Built before the first listing is added, so its outlier bounds always
+        # come from the table as loaded and every ingested listing is held to them
+        online_trainer = OnlineLeastSquares.from_houses(state.data.house_data)
+    try:
+        # Written first: if it fails, nothing was published either
+        append_listings_csv(LISTINGS_CSV_PATH, records)
+    except OSError as e:
+        logging.error(f"Could not append listings to {LISTINGS_CSV_PATH}: {e}")
+        raise HTTPException(status_code=500, detail="Could not store the listings")
+    # Our own write: not a change for the file watcher to reload
+    loaded_signature = source_signature(SOURCE_PATHS)
+    online_trainer.add([r['city'] for r in records], [[r[f] for f in NUMERIC_FEATURES] for r in records],
+                       [r['price'] for r in records])
+    published = publish_data(listing_ingestor.append(records))
+    logging.info(f"Ingested {len(records)} listings ({len(new_cities)} new cities), data version {published.version}")
+    model_version = None
+    if refit:
+        model, _ = refit_price_model()
+        publish_model(model)
+        model_version = model.version
+    return IngestResponse(ingested=len(records), total_houses=len(published.house_data),
+                          new_cities=new_cities, data_version=published.version, model_version=model_version)
+
+@api_router.post("/model/refit", response_model=RefitResponse)
+async def refit_model(
+    save: bool = Query(False, description="Also overwrite the model artifact, so a restart keeps this model"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Re-solve the price model from the online least-squares statistics and publish it without a restart.
+    
+    The statistics cover the house table as loaded, outliers removed as in
+    the training script, plus each listing ingested since that falls within
+    the same outlier bounds.
+    """
+    global loaded_signature
+    check_admin_token(x_admin_token)
+    check_no_reload()
+    previous = serving_state.model
+    model, solve_ms = refit_price_model()
+    if save:
+        try:
+            save_artifact(MODEL_ARTIFACT_PATH, model.feature_names, model.coef[:-1], model.intercept,
+                          model.metadata, model.intervals)
+        except OSError as e:
+            logging.error(f"Could not save the model artifact: {e}")
+            raise HTTPException(status_code=500, detail="Could not save the model artifact")
+        loaded_signature = source_signature(SOURCE_PATHS)
+    publish_model(model)
+    logging.info(f"Published model {model.version} fitted on {online_trainer.rows} rows in {solve_ms:.1f} ms")
+    return RefitResponse(
+        model_version=model.version,
+        previous_version=previous.version if previous is not None else None,
+        train_rows=online_trainer.rows,
+        cities=len(model.cities),
+        residual_sd=model.sigma2 ** 0.5,
+        solve_ms=round(solve_ms, 3),
+        saved=save
+    )
+
+@api_router.post("/reload", response_model=ReloadResponse)
+async def reload_data_and_model(x_admin_token: Optional[str] = Header(None)):
+    """Reload the house data and price model from disk without a restart.
+    
+    Both are loaded, validated and warmed in a worker thread while the
+    current snapshot keeps serving, then published together in one swap;
+    requests already running finish on the previous snapshot. If loading
+    or validation fails, nothing changes.
+    """
+    check_admin_token(x_admin_token)
+    if reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    previous = serving_state
+    try:
+        state, timings = await reload_serving_state()
+    except Exception as e:
+        logging.error(f"Reload failed, still serving snapshot {previous.version}: {e}")
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving snapshot {previous.version}: {e}")
+    logging.info(f"Reloaded: snapshot {state.version}, data {state.data_version}, model {state.model_version}, {timings}")
+    return ReloadResponse(
+        snapshot_version=state.version,
+        data_version=state.data_version,
+        model_version=state.model_version,
+        previous_snapshot_version=previous.version,
+        total_houses=len(state.data.house_data),
+        build_ms=timings
+    )
+
+@api_router.post("/predict/grid")
+async def predict_price_grid(grid: PriceGridInput, state: ServingState = Depends(pinned_state)):
+    """Prices over the Cartesian product of cities and sqft, bed and bath values, in one vectorized pass.
+    
+    Each feature takes a list of values or a {start, stop, step} range. The
+    response holds the axes and a flat, row-major ``prices`` array of the
+    given ``shape`` (city, sqft, bed, bath), rounded to whole dollars.
+    """
+    model = state.model
+    if model is None:
+        raise HTTPException(status_code=500, detail="Linear regression model not loaded")
+    
+    try:
+        axes = {}
+        for name in GRID_AXES:
+            spec = getattr(grid, name)
+            axes[name] = axis_values(spec, name=name) if isinstance(spec, list) else axis_values(**spec.model_dump(), name=name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cities = model.cities if grid.cities is None else [resolve_city(state.model_city_index, city) for city in grid.cities]
+    if not cities:
+        raise HTTPException(status_code=400, detail="cities must not be empty")
+    try:
+        result = evaluate_grid(model, cities, axes)
+    except GridSizeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Serialized directly: validating a response model point by point would cost more than the grid
+    return Response(json.dumps(result, separators=(',', ':')), media_type='application/json')
+
+@api_router.post("/predict/stream")
+async def predict_house_prices_stream(request: Request, format: Optional[str] = None,
+                                      state: ServingState = Depends(pinned_state)):
+    """Score a raw CSV or NDJSON upload chunk by chunk, streaming predictions back as they are computed.
+    
+    The body is read incrementally (not as multipart), so memory stays flat
+    regardless of file size and the first results arrive before the upload ends.
+    """
+    if state.model is None:
+        raise HTTPException(status_code=500, detail="Linear regression model not loaded")
+    
+    fmt = format or format_from_content_type(request.headers.get('content-type', ''))
+    if fmt not in BULK_MEDIA_TYPES:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson")
+    
+    lines = iter_lines(request.stream())
+    columns = None
+    if fmt == 'csv':
+        try:
+            columns = await read_csv_header(lines)
+        except BulkInputError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return BodyStreamingResponse(
+        score_stream(state.model, lines, fmt, columns, get_price_range, resolve_city=state.model_city_index.resolve),
+        media_type=BULK_MEDIA_TYPES[fmt]
+    )
+
 @api_router.post("/predict-with-image")
 async def predict_with_image(
-    sqft: int = Form(...),
-    bed: int = Form(...),
-    bath: float = Form(...),
+    sqft: int = Form(..., gt=0, le=FEATURE_LIMITS['sqft']),
+    bed: int = Form(..., gt=0, le=FEATURE_LIMITS['bed']),
+    bath: float = Form(..., gt=0, le=FEATURE_LIMITS['bath']),
     city: str = Form(...),
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    output_format: str = Form(DEFAULT_OUTPUT_FORMAT),
+    quality: int = Form(DEFAULT_QUALITY),
+    state: ServingState = Depends(pinned_state)
 ):
     """Predict house price using both data and image"""
+    output_format = check_image_options(output_format, quality)
     try:
         # Get data-based prediction
-        data_prediction = predict_price_from_data(sqft, bed, bath, city)
+        data_prediction = await cached_prediction(state, sqft, bed, bath, city)
         
         # Process image
-        image_data = await image.read()
-        image_prediction = await predict_from_image(image_data)
+        image_file = await read_image_upload(image)
+        image_prediction = await predict_from_image(image_file, output_format, quality)
         
         # Combine predictions (for now, just return both)
         return JSONResponse({
@@ -286,70 +1174,78 @@ async def predict_with_image(
             }
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error in combined prediction: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
 @api_router.post("/image-predict")
-async def predict_from_image_only(image: UploadFile = File(...)):
+async def predict_from_image_only(image: UploadFile = File(...),
+                                  output_format: str = Form(DEFAULT_OUTPUT_FORMAT),
+                                  quality: int = Form(DEFAULT_QUALITY)):
     """Process image for ML prediction"""
+    output_format = check_image_options(output_format, quality)
     try:
-        image_data = await image.read()
-        result = await predict_from_image(image_data)
+        image_file = await read_image_upload(image)
+        result = await predict_from_image(image_file, output_format, quality)
         return JSONResponse(result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error in image prediction: {e}")
         raise HTTPException(status_code=500, detail=f"Image prediction error: {str(e)}")
 
 @api_router.get("/visualization-data")
-async def get_visualization_data():
+async def get_visualization_data(
+    request: Request,
+    mode: str = Query('points', description="'points' for raw or sampled points, 'hexbin' for binned counts"),
+    max_points: Optional[int] = Query(None, ge=1, le=MAX_SCATTER_POINTS, description="Downsample each scatter plot to at most this many points"),
+    gridsize: int = Query(30, ge=1, le=MAX_HEXBIN_GRIDSIZE, description="Hexagons across the x axis in hexbin mode"),
+    state: ServingState = Depends(pinned_state)
+):
     """Get data for charts and visualizations"""
-    if house_data is None or len(house_data) == 0:
+    data = state.data
+    if data is None:
         raise HTTPException(status_code=500, detail="House data not loaded")
+    if mode not in ('points', 'hexbin'):
+        raise HTTPException(status_code=400, detail="mode must be 'points' or 'hexbin'")
     
-    return {
-        'histogram_data': {
-            'price': house_data['price'].tolist(),
-            'sqft': house_data['sqft'].tolist()
-        },
-        'scatter_data': {
-            'sqft_vs_price': {
-                'x': house_data['sqft'].tolist(),
-                'y': house_data['price'].tolist()
-            },
-            'bed_vs_price': {
-                'x': house_data['bed'].tolist(),
-                'y': house_data['price'].tolist()
-            },
-            'bath_vs_price': {
-                'x': house_data['bath'].tolist(),
-                'y': house_data['price'].tolist()
-            }
-        },
-        'correlation_matrix': {
-            'price_sqft': house_data[['price', 'sqft']].corr().iloc[0, 1],
-            'price_bed': house_data[['price', 'bed']].corr().iloc[0, 1],
-            'price_bath': house_data[['price', 'bath']].corr().iloc[0, 1]
-        }
-    }
+    if mode == 'points' and max_points is None:
+        return data.visualization_payload.response(request)
+    return cached_visualization_data(data, mode, max_points, gridsize).response(request)
 
 # Initialize data on startup
 @app.on_event("startup")
 async def startup_event():
+    global source_watcher
     load_house_data()
+    startup_timings['ready'] = round((time.perf_counter() - _module_started) * 1000, 1)
+    if RELOAD_POLL_SECONDS > 0:
+        source_watcher = asyncio.create_task(watch_sources())
+
+# Polls SOURCE_PATHS for changes when RELOAD_POLL_SECONDS is set
+source_watcher: Optional[asyncio.Task] = None
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Caps image uploads and refuses non-images while the body is still arriving
+app.add_middleware(ImageUploadGuard, paths=['/api/image-predict', '/api/predict-with-image'])
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Snapshot-Version", "X-Data-Version", "X-Model-Version"],
 )
 
+# Outermost, so every response, HTTP errors included, names the snapshot that served it
+app.add_middleware(PinServingState, current=lambda: serving_state)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -359,7 +1255,17 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    if client is not None:
+        client.close()
+
+@app.on_event("shutdown")
+async def shutdown_image_pool():
+    image_pool.shutdown()
+
+@app.on_event("shutdown")
+async def stop_source_watcher():
+    if source_watcher is not None:
+        source_watcher.cancel()
 
 if __name__ == "__main__":
     import uvicorn
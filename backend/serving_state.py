@@ -0,0 +1,89 @@
+import os
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+from city_search import CityIndex
+from predictor import CompiledLinearModel
+
+# Seconds between checks of the data and model files for changes; 0 disables the watcher
+RELOAD_POLL_SECONDS = float(os.environ.get('RELOAD_POLL_SECONDS', 0))
+
+
+class ServingState:
+    """Everything a request reads: one data version, one price model and the city indexes over them.
+
+    ``city_index`` covers the model's and the dataset's cities, for search
+    and listings; ``model_city_index`` only the cities the model has an
+    offset for, which is what a prediction may be asked about.
+
+    Never changed once built. Loads, reloads, ingestion and refits build a
+    new one and publish it by rebinding a single reference; each request is
+    pinned to the state it arrived on (PinServingState), so it finishes on
+    that version whatever is published meanwhile.
+    """
+
+    __slots__ = ('data', 'model', 'city_index', 'model_city_index', 'version')
+
+    def __init__(self, data: Any, model: Optional[CompiledLinearModel], city_index: CityIndex, version: int,
+                 model_city_index: Optional[CityIndex] = None):
+        self.data = data
+        self.model = model
+        self.city_index = city_index
+        if model_city_index is None:
+            model_city_index = CityIndex(model.cities if model is not None else [])
+        self.model_city_index = model_city_index
+        self.version = version
+
+    @property
+    def data_version(self) -> Optional[int]:
+        return self.data.version if self.data is not None else None
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.model.version if self.model is not None else None
+
+
+class PinServingState:
+    """ASGI middleware that pins each HTTP request to the serving state current when it arrived.
+
+    The state is stored in the scope for handlers to read, and its versions
+    are added to the response as X-Snapshot-Version, X-Data-Version and
+    X-Model-Version, so a client can tell which snapshot answered.
+    """
+
+    def __init__(self, app, current: Callable[[], ServingState]):
+        self.app = app
+        self.current = current
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        state = self.current()
+        scope['serving_state'] = state
+        version_headers = [
+            (b'x-snapshot-version', str(state.version).encode()),
+            (b'x-data-version', str(state.data_version or '').encode()),
+            (b'x-model-version', (state.model_version or '').encode()),
+        ]
+
+        async def send_with_versions(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = [*message.get('headers', []), *version_headers]
+            await send(message)
+
+        await self.app(scope, receive, send_with_versions)
+
+
+def source_signature(paths: Sequence[Path]) -> Tuple[Optional[Tuple[int, int]], ...]:
+    """(mtime_ns, size) of each file, None for a missing one; changes whenever a file is rewritten"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
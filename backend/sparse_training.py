@@ -0,0 +1,279 @@
+"""Chunked, sparse training pipeline for the retrained price model.
+
+    python sparse_training.py bench [--scales 1 10 100]
+
+writes synthetic copies of socal2.csv scaled up by each factor, then fits
+each copy with this pipeline and with the dense pandas one it replaces.
+Every fit runs in a fresh process, and the benchmark reports its runtime
+and peak memory.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from online_training import NUMERIC_FEATURES, iqr_bounds
+from predictor import CITY_PREFIX, fit_interval_stats
+
+# Listings the retrained model is fitted on
+TRAINING_CSV_PATH = Path(__file__).parent.parent / 'socal2.csv'
+# Columns the model uses; the CSV's street, image_id and n_citi are never parsed
+TRAINING_COLUMNS = ('citi', 'bed', 'bath', 'sqft', 'price')
+# CSV rows parsed per chunk
+CHUNK_ROWS = int(os.environ.get('TRAIN_CHUNK_ROWS', 200000))
+# lsqr stopping tolerances (atol and btol). With the columns scaled to unit
+# spread, the coefficients match a dense fit to well under a cent
+LSQR_TOL = 1e-12
+
+
+class ListingColumns(NamedTuple):
+    """The training columns of a listings CSV; cities are codes into ``city_names``"""
+    city_codes: np.ndarray
+    city_names: List[str]
+    columns: Dict[str, np.ndarray]
+
+
+class TrainedModel(NamedTuple):
+    model: Any
+    feature_names: List[str]
+    train_rows: int
+    test_rows: int
+    r2_train: float
+    r2_test: float
+    intervals: Dict[str, Any]
+
+
+def read_listing_columns(csv_path: Path, chunksize: int = CHUNK_ROWS) -> ListingColumns:
+    """Parse the training columns chunk by chunk into compact arrays.
+
+    Cities are coded as they are first seen, so no string column is held
+    for the whole file. Peak memory is the arrays plus one chunk.
+    """
+    import pandas as pd
+
+    city_lookup: Dict[str, int] = {}
+    codes = []
+    parts: Dict[str, list] = {col: [] for col in TRAINING_COLUMNS[1:]}
+    for chunk in pd.read_csv(csv_path, usecols=list(TRAINING_COLUMNS), chunksize=chunksize):
+        chunk_codes, uniques = pd.factorize(chunk['citi'])
+        if (chunk_codes < 0).any():
+            raise ValueError(f"{csv_path} has listings without a city")
+        mapping = np.array([city_lookup.setdefault(city, len(city_lookup)) for city in uniques], dtype=np.int32)
+        codes.append(mapping[chunk_codes])
+        for col, values in parts.items():
+            values.append(chunk[col].to_numpy())
+    return ListingColumns(
+        np.concatenate(codes),
+        list(city_lookup),
+        {col: np.concatenate(values) for col, values in parts.items()}
+    )
+
+
+def sparse_design(codes: np.ndarray, numeric: np.ndarray, city_names: List[str]) -> Tuple[Any, List[str]]:
+    """The design matrix [bed, bath, sqft | one-hot city] as CSR, and its city columns.
+
+    Like pd.get_dummies, there is one column per city that occurs, sorted
+    by name. Each row stores k + 1 values, whatever the number of cities.
+    """
+    import scipy.sparse as sp
+
+    order = sorted(np.unique(codes).tolist(), key=city_names.__getitem__)
+    column = np.full(len(city_names), -1, dtype=np.int32)
+    column[order] = np.arange(len(order), dtype=np.int32)
+    n, k = numeric.shape
+    indices = np.empty((n, k + 1), dtype=np.int32)
+    indices[:, :k] = np.arange(k, dtype=np.int32)
+    indices[:, k] = k + column[codes]
+    data = np.empty((n, k + 1))
+    data[:, :k] = numeric
+    data[:, k] = 1.0
+    indptr = np.arange(0, n * (k + 1) + 1, k + 1, dtype=np.int64)
+    design = sp.csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(n, k + len(order)))
+    return design, [city_names[code] for code in order]
+
+
+def fit_sparse(design, price: np.ndarray, numeric_count: int = len(NUMERIC_FEATURES)):
+    """LinearRegression coefficients for a sparse design, solved with scipy's lsqr.
+
+    This is what LinearRegression does for sparse input, called directly
+    because its ``tol`` only exists from scikit-learn 1.7 on. The design
+    is centred implicitly, through a LinearOperator, so it stays sparse.
+    lsqr converges slowly on columns of very different spread: sqft in the
+    thousands next to dummies of cities with 5 or 500 listings. So every
+    column is scaled to unit standard deviation for the fit and the
+    coefficients are scaled back afterwards. The dummies plus intercept
+    are rank deficient, and the scaled fit picks another solution with the
+    same predictions. Shifting the city offsets to sum to zero restores
+    the minimum-norm one that the dense fit returns.
+    """
+    import scipy.sparse as sp
+    from scipy.sparse.linalg import LinearOperator, lsqr
+    from sklearn.linear_model import LinearRegression
+
+    mean = np.asarray(design.mean(axis=0)).ravel()
+    std = np.sqrt(np.maximum(np.asarray(design.multiply(design).mean(axis=0)).ravel() - mean ** 2, 0.0))
+    std[std == 0] = 1.0
+    scaled = (design @ sp.diags(1.0 / std)).tocsr()
+    scaled_mean = mean / std
+    centred = LinearOperator(
+        scaled.shape,
+        matvec=lambda v: scaled @ v - scaled_mean @ v,
+        rmatvec=lambda u: scaled.T @ u - scaled_mean * u.sum(),
+        dtype=np.float64,
+    )
+    price_mean = float(np.mean(price))
+    coef = lsqr(centred, price - price_mean, atol=LSQR_TOL, btol=LSQR_TOL)[0] / std
+    # Cities without rows here (e.g. only in the test split) keep a zero offset, as in the dense fit
+    seen = numeric_count + np.flatnonzero(design[:, numeric_count:].getnnz(axis=0))
+    coef[seen] -= coef[seen].mean()
+
+    # A plain LinearRegression carrying the solution, so it predicts and pickles like a fitted one
+    model = LinearRegression()
+    model.coef_ = coef
+    model.intercept_ = price_mean - mean @ coef
+    model.n_features_in_ = design.shape[1]
+    return model
+
+
+def train_price_model(csv_path: Path = TRAINING_CSV_PATH, test_size: float = 0.2,
+                      random_state: int = 42) -> TrainedModel:
+    """The training script's model, fitted without a dense frame or dense one-hot matrix.
+
+    Outliers are removed by the same sequential 1.5 IQR rule, using exact
+    quantiles over the compact columns. The 80/20 split uses the same
+    seed, so the rows match the dense pipeline's.
+    """
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import train_test_split
+
+    listings = read_listing_columns(csv_path)
+    keep, _ = iqr_bounds(listings.columns)
+    codes = listings.city_codes[keep]
+    numeric = np.column_stack([np.asarray(listings.columns[f][keep], dtype=np.float64) for f in NUMERIC_FEATURES])
+    price = np.asarray(listings.columns['price'][keep], dtype=np.float64)
+    design, cities = sparse_design(codes, numeric, listings.city_names)
+
+    train, test = train_test_split(np.arange(len(price)), test_size=test_size, random_state=random_state)
+    model = fit_sparse(design[train], price[train])
+    train_pred = model.predict(design[train])
+    r2_train = r2_score(price[train], train_pred)
+    r2_test = r2_score(price[test], model.predict(design[test]))
+    intervals = fit_interval_stats(numeric[train], [listings.city_names[c] for c in codes[train].tolist()],
+                                   price[train] - train_pred, list(NUMERIC_FEATURES), cities)
+
+    feature_names = [*NUMERIC_FEATURES, *(CITY_PREFIX + city for city in cities)]
+    # Set after predicting, as fitting on a DataFrame would have; the backend's
+    # joblib fallback (CompiledLinearModel.from_estimator) reads the names from it
+    model.feature_names_in_ = np.asarray(feature_names, dtype=object)
+    return TrainedModel(model, feature_names, len(train), len(test), float(r2_train), float(r2_test), intervals)
+
+
+def train_dense(csv_path: Path, test_size: float = 0.2, random_state: int = 42) -> Tuple[Any, float]:
+    """The dense pipeline this module replaces, kept for the benchmark; returns the model and test R^2"""
+    import pandas as pd
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(csv_path)
+    for col in ('price', 'sqft', 'bed', 'bath'):
+        q1, q3 = df[col].quantile(0.25), df[col].quantile(0.75)
+        df = df[(df[col] >= q1 - 1.5 * (q3 - q1)) & (df[col] <= q3 + 1.5 * (q3 - q1))]
+    df = pd.get_dummies(df.drop(columns=['street', 'image_id', 'n_citi']), columns=['citi'])
+    X, y = df.drop(columns=['price']), df['price']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    model = LinearRegression().fit(X_train, y_train)
+    return model, float(r2_score(y_test, model.predict(X_test)))
+
+
+def write_synthetic_csv(source: Path, path: Path, scale: int, seed: int = 0):
+    """``scale`` jittered copies of ``source``: same cities, sqft and price perturbed by a few percent"""
+    import pandas as pd
+
+    df = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    for copy in range(scale):
+        part = df.copy()
+        part['image_id'] += copy * len(df)
+        if copy:
+            part['sqft'] = np.rint(part['sqft'] * rng.normal(1, 0.02, len(df))).astype(np.int64)
+            part['price'] = np.rint(part['price'] * rng.normal(1, 0.05, len(df))).astype(np.int64)
+        part.to_csv(path, mode='w' if copy == 0 else 'a', header=copy == 0, index=False)
+
+
+def _max_rss_mb() -> float:
+    import resource
+
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _fit_once(csv_path: Path, pipeline: str) -> Dict[str, Any]:
+    """One fit in this process, with its runtime and this process's peak RSS"""
+    import importlib
+
+    # Imported up front, so the baseline includes every library
+    for module in ('pandas', 'scipy.sparse', 'sklearn.linear_model'):
+        importlib.import_module(module)
+    baseline = _max_rss_mb()
+    started = time.perf_counter()
+    if pipeline == 'sparse':
+        r2_test = train_price_model(csv_path).r2_test
+    else:
+        r2_test = train_dense(csv_path)[1]
+    return {
+        'seconds': round(time.perf_counter() - started, 2),
+        'peak_rss_mb': round(_max_rss_mb(), 1),
+        'peak_over_baseline_mb': round(_max_rss_mb() - baseline, 1),
+        'r2_test': round(r2_test, 4),
+    }
+
+
+def main():
+    import argparse
+    import json
+    import subprocess
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Sparse vs dense training pipeline")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help="Runtime and peak memory on synthetic scaled-up copies of socal2.csv")
+    bench.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    bench.add_argument('--dense-max-scale', type=int, default=10,
+                       help="Largest scale the dense pipeline is run at; its one-hot matrix grows with rows x cities")
+    fit = sub.add_parser('fit', help="One fit, reported as JSON (used by bench)")
+    fit.add_argument('--csv', type=Path, default=TRAINING_CSV_PATH)
+    fit.add_argument('--pipeline', choices=['sparse', 'dense'], default='sparse')
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        print(json.dumps(_fit_once(args.csv, args.pipeline)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in args.scales:
+            csv_path = TRAINING_CSV_PATH
+            if scale > 1:
+                csv_path = Path(workdir) / f'socal2_x{scale}.csv'
+                write_synthetic_csv(TRAINING_CSV_PATH, csv_path, scale)
+            size_mb = csv_path.stat().st_size / 1e6
+            for pipeline in ('sparse', 'dense'):
+                if pipeline == 'dense' and scale > args.dense_max_scale:
+                    print(f"x{scale:<4} {pipeline:>6}: skipped (--dense-max-scale {args.dense_max_scale})")
+                    continue
+                result = subprocess.run([sys.executable, __file__, 'fit', '--csv', str(csv_path), '--pipeline', pipeline],
+                                        capture_output=True, text=True, cwd=Path(__file__).parent)
+                if result.returncode != 0:
+                    print(f"x{scale:<4} {pipeline:>6}: failed ({result.stderr.strip().splitlines()[-1:]})")
+                    continue
+                report = json.loads(result.stdout.strip().splitlines()[-1])
+                print(f"x{scale:<4} {pipeline:>6}: {size_mb:.0f} MB CSV, {report['seconds']:.2f} s, "
+                      f"peak RSS {report['peak_rss_mb']:.0f} MB (+{report['peak_over_baseline_mb']:.0f} MB over "
+                      f"imports), test R^2 {report['r2_test']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Measure server cold start and fail when it exceeds the startup budget.
+
+    python startup_benchmark.py            # report and check the budget
+    python startup_benchmark.py --json     # machine-readable report
+
+Every measurement runs in a fresh interpreter so module caching from one
+step cannot hide the cost of the next.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+BACKEND_DIR = Path(__file__).parent
+
+# Milliseconds; generous enough for a cold CI box, tight enough to catch a
+# heavy dependency creeping back onto the import path
+STARTUP_BUDGET_MS = {
+    'import': 1500.0,
+    'ready': 2500.0,
+}
+# Must not be loaded by the time the server is ready to take requests
+DEFERRED_MODULES = ('pandas', 'sklearn', 'joblib', 'PIL', 'motor', 'requests')
+# Third-party imports timed on their own, to show where import time goes
+COMPONENTS = ('numpy', 'pydantic', 'fastapi', 'pandas', 'PIL.Image', 'motor.motor_asyncio', 'requests', 'sklearn')
+
+_IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000)
+"""
+
+_READY_PROBE = """
+import json, sys, time, warnings
+warnings.simplefilter('ignore')
+started = time.perf_counter()
+import server
+imported = (time.perf_counter() - started) * 1000
+from starlette.testclient import TestClient
+with TestClient(server.app) as client:
+    ready = (time.perf_counter() - started) * 1000
+    health = client.get('/api/health').json()
+print(json.dumps({{
+    'import': imported,
+    'ready': ready,
+    'components': health['startup_ms'],
+    'loaded': [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+def _run(code: str) -> str:
+    env = dict(os.environ, PYTHONWARNINGS='ignore')
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def measure_import(module: str) -> float:
+    """Cold import time of one module, in milliseconds"""
+    return round(float(_run(_IMPORT_PROBE.format(module=module))), 1)
+
+
+def measure_startup(runs: int = 3) -> Dict[str, Any]:
+    """Best-of-``runs`` cold import and time to ready for server.py"""
+    samples = [json.loads(_run(_READY_PROBE.format(deferred=DEFERRED_MODULES))) for _ in range(runs)]
+    best = min(samples, key=lambda sample: sample['ready'])
+    return {
+        'import': round(min(sample['import'] for sample in samples), 1),
+        'ready': round(best['ready'], 1),
+        'server_components': best['components'],
+        'deferred_modules_loaded': sorted({name for sample in samples for name in sample['loaded']}),
+    }
+
+
+def build_report(runs: int = 3) -> Dict[str, Any]:
+    report = measure_startup(runs)
+    report['dependency_imports'] = {}
+    for module in COMPONENTS:
+        try:
+            report['dependency_imports'][module] = measure_import(module)
+        except subprocess.CalledProcessError:
+            report['dependency_imports'][module] = None
+    report['budget'] = STARTUP_BUDGET_MS
+    report['violations'] = [
+        f"{key} took {report[key]} ms (budget {limit} ms)"
+        for key, limit in STARTUP_BUDGET_MS.items() if report[key] > limit
+    ] + [f"{name} imported during startup" for name in report['deferred_modules_loaded']]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server cold start budget check")
+    parser.add_argument('--runs', type=int, default=3, help="Cold starts to take the best of")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = build_report(args.runs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import server:  {report['import']:.1f} ms (budget {STARTUP_BUDGET_MS['import']:.0f})")
+        print(f"ready to serve: {report['ready']:.1f} ms (budget {STARTUP_BUDGET_MS['ready']:.0f})")
+        for component, ms in report['server_components'].items():
+            print(f"  {component:<15} {ms:.1f} ms")
+        print("Cold import of each dependency:")
+        for module, ms in report['dependency_imports'].items():
+            print(f"  {module:<20} {'not installed' if ms is None else f'{ms:.1f} ms'}")
+        for violation in report['violations']:
+            print(f"OVER BUDGET: {violation}")
+    sys.exit(1 if report['violations'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import os
+import re
+from typing import Collection, Optional
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from image_processing import SNIFF_BYTES, sniff_image_format
+
+# Largest image file accepted by the upload endpoints
+MAX_IMAGE_UPLOAD_BYTES = int(os.environ.get('MAX_IMAGE_UPLOAD_BYTES', 10 * 1024 * 1024))
+# Allowance for multipart boundaries and the small form fields sent alongside the image
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# How much of the body to inspect for the image part before leaving the check to the handler
+SNIFF_WINDOW_BYTES = 64 * 1024
+
+
+class UploadRejected(HTTPException):
+    """Raised from inside the request body stream; FastAPI passes HTTPExceptions through form parsing"""
+
+
+def sniff_multipart_image(head: bytes, boundary: bytes, field: str) -> Optional[bool]:
+    """Whether the file part named ``field`` starts like an image.
+
+    ``head`` is the beginning of a multipart body. Returns None while the
+    part's headers or first bytes have not arrived yet.
+    """
+    marker = b'--' + boundary
+    field_pattern = re.compile(rb'(?:^|;)\s*name="' + re.escape(field.encode()) + rb'"', re.IGNORECASE)
+    start = 0
+    while True:
+        part = head.find(marker, start)
+        if part < 0:
+            return None
+        headers_end = head.find(b'\r\n\r\n', part)
+        if headers_end < 0:
+            return None
+        data = headers_end + 4
+        headers = head[part:headers_end]
+        if b'filename=' in headers and any(field_pattern.search(line.split(b':', 1)[-1])
+                                           for line in headers.split(b'\r\n')):
+            if len(head) - data < SNIFF_BYTES:
+                return None
+            return sniff_image_format(head[data:data + SNIFF_BYTES]) is not None
+        start = data
+
+
+class ImageUploadGuard:
+    """ASGI middleware that bounds image uploads while their bodies are still arriving.
+
+    A declared Content-Length over the cap is answered with 413 before any
+    of the body is read. Otherwise the body is counted as the form parser
+    pulls it, failing with 413 once it passes the cap, and the image part's
+    first bytes are sniffed so a non-image is refused with 415 without
+    reading (and spooling) the rest.
+    """
+
+    def __init__(self, app, paths: Collection[str], field: str = 'image',
+                 max_bytes: int = MAX_IMAGE_UPLOAD_BYTES):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.field = field
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        limit = self.max_bytes + MULTIPART_OVERHEAD_BYTES
+        declared = headers.get('content-length', '')
+        if declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({'detail': f"Upload larger than {self.max_bytes} bytes"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        match = re.search(r'boundary="?([^";]+)"?', headers.get('content-type', ''))
+        boundary = match.group(1).encode() if match else None
+        received = 0
+        head = bytearray()
+        sniffing = boundary is not None
+
+        async def guarded_receive():
+            nonlocal received, sniffing
+            message = await receive()
+            if message['type'] == 'http.request':
+                body = message.get('body', b'')
+                received += len(body)
+                if received > limit:
+                    raise UploadRejected(status_code=413, detail=f"Upload larger than {self.max_bytes} bytes")
+                if sniffing:
+                    head.extend(body)
+                    verdict = sniff_multipart_image(bytes(head), boundary, self.field)
+                    if verdict is False:
+                        raise UploadRejected(status_code=415, detail="Uploaded file is not a supported image")
+                    if verdict is True or len(head) > SNIFF_WINDOW_BYTES:
+                        sniffing = False
+                        head.clear()
+            return message
+
+        await self.app(scope, guarded_receive, send)
@@ -40,6 +40,10 @@ def test_health_check():
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Health check passed: {data}")
+            if 'X-Snapshot-Version' not in response.headers:
+                print("❌ Response does not report the serving snapshot version")
+                return False
+            print(f"   Served by snapshot {response.headers['X-Snapshot-Version']}, model {response.headers.get('X-Model-Version')}")
             return True
         else:
             print(f"❌ Health check failed with status {response.status_code}: {response.text}")
@@ -147,6 +151,9 @@ def test_price_prediction():
             print(f"   💰 Predicted price: ${data['predicted_price']:,.2f}")
             print(f"   📊 Price range: {data['price_range']}")
             print(f"   🎯 Confidence: {data['confidence']:.2%}")
+            if data.get('price_interval'):
+                interval = data['price_interval']
+                print(f"   📏 {interval['level']:.0%} interval: ${interval['low']:,.0f} - ${interval['high']:,.0f}")
             print(f"   🔍 Factors: {data['factors']}")
             
             # Validate prediction is reasonable
@@ -161,6 +168,192 @@ def test_price_prediction():
         print(f"❌ Price prediction error: {e}")
         return False
 
+def test_batch_prediction():
+    """Test POST /api/predict/batch - score several houses with per-item errors"""
+    print("\n🔍 Testing Batch Prediction (POST /api/predict/batch)")
+    
+    test_data = [
+        {"sqft": 1500, "bed": 3, "bath": 2, "city": "San Diego, CA"},
+        {"sqft": 2200, "bed": 4, "bath": 3, "city": "Pasadena, CA"},
+        {"sqft": 1500, "bed": 3, "bath": 2, "city": "Not A Real City, CA"},
+        {"sqft": -10, "bed": 3, "bath": 2, "city": "San Diego, CA"}
+    ]
+    
+    try:
+        response = requests.post(f"{API_BASE}/predict/batch", json=test_data, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            results = data.get('results', [])
+            if len(results) != len(test_data):
+                print(f"❌ Expected {len(test_data)} results, got {len(results)}")
+                return False
+            
+            if results[0]['prediction'] is None or results[1]['prediction'] is None:
+                print(f"❌ Valid records were not scored: {results[:2]}")
+                return False
+            
+            if results[2]['error'] is None or results[3]['error'] is None:
+                print(f"❌ Invalid records did not report errors: {results[2:]}")
+                return False
+            
+            print(f"✅ Batch prediction successful:")
+            print(f"   ✔️  Succeeded: {data['succeeded']}, failed: {data['failed']}")
+            print(f"   💰 First prediction: ${results[0]['prediction']['predicted_price']:,.2f}")
+            print(f"   ⚠️  Errors: {[item['error'] for item in results[2:]]}")
+            return True
+        else:
+            print(f"❌ Batch prediction failed with status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ Batch prediction error: {e}")
+        return False
+
+def test_stream_prediction():
+    """Test POST /api/predict/stream - score a CSV upload as a stream"""
+    print("\n🔍 Testing Streaming Prediction (POST /api/predict/stream)")
+    
+    csv_body = (
+        'citi,bed,bath,sqft\n'
+        '"San Diego, CA",3,2,1500\n'
+        '"Pasadena, CA",4,3,2200\n'
+        '"Not A Real City, CA",3,2,1500\n'
+    )
+    
+    try:
+        response = requests.post(
+            f"{API_BASE}/predict/stream",
+            data=csv_body.encode(),
+            headers={"Content-Type": "text/csv"},
+            stream=True,
+            timeout=10
+        )
+        if response.status_code == 200:
+            lines = [line for line in response.iter_lines(decode_unicode=True) if line]
+            if len(lines) != 4 or not lines[0].startswith('row,'):
+                print(f"❌ Unexpected streamed output: {lines}")
+                return False
+            
+            if 'Unknown city' not in lines[3]:
+                print(f"❌ Unknown city was not reported: {lines[3]}")
+                return False
+            
+            print(f"✅ Streaming prediction successful:")
+            for line in lines:
+                print(f"   📄 {line}")
+            return True
+        else:
+            print(f"❌ Streaming prediction failed with status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ Streaming prediction error: {e}")
+        return False
+
+def test_histogram_aggregate():
+    """Test GET /api/aggregate/histogram - server-side binned counts"""
+    print("\n🔍 Testing Histogram Aggregate (GET /api/aggregate/histogram)")
+    try:
+        response = requests.get(
+            f"{API_BASE}/aggregate/histogram",
+            params={"column": "price", "bins": 20},
+            timeout=10
+        )
+        if response.status_code == 200:
+            data = response.json()
+            if len(data['counts']) != 20 or len(data['edges']) != 21:
+                print(f"❌ Expected 20 bins, got {len(data['counts'])} counts and {len(data['edges'])} edges")
+                return False
+            
+            if sum(data['counts']) != data['total']:
+                print(f"❌ Counts sum to {sum(data['counts'])}, expected {data['total']}")
+                return False
+            
+            print(f"✅ Histogram aggregate retrieved successfully:")
+            print(f"   📊 {data['total']} houses in {len(data['counts'])} bins ({len(response.content)} bytes)")
+            print(f"   🏷️  ETag: {response.headers.get('ETag')}")
+            return True
+        else:
+            print(f"❌ Histogram aggregate failed with status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ Histogram aggregate error: {e}")
+        return False
+
+def test_city_search():
+    """Test GET /api/cities/search - city autocomplete"""
+    print("\n🔍 Testing City Search (GET /api/cities/search)")
+    try:
+        response = requests.get(f"{API_BASE}/cities/search", params={"q": "san", "limit": 5}, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            cities = [match['city'] for match in data['results']]
+            if not cities or not all(city.lower().startswith('san') for city in cities):
+                print(f"❌ Expected cities starting with 'san', got {cities}")
+                return False
+            
+            print(f"✅ City search returned {len(cities)} matches:")
+            print(f"   🏙️  {', '.join(cities)}")
+            return True
+        else:
+            print(f"❌ City search failed with status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ City search error: {e}")
+        return False
+
+def test_comparables():
+    """Test GET /api/comparables - nearest real listings"""
+    print("\n🔍 Testing Comparables (GET /api/comparables)")
+    try:
+        params = {"city": "Irvine, CA", "sqft": 1800, "bed": 3, "bath": 2, "k": 5}
+        response = requests.get(f"{API_BASE}/comparables", params=params, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            distances = [match['distance'] for match in data['comparables']]
+            if len(distances) != 5 or distances != sorted(distances):
+                print(f"❌ Expected 5 comparables nearest first, got distances {distances}")
+                return False
+            
+            print(f"✅ Comparables retrieved successfully:")
+            for match in data['comparables']:
+                print(f"   🏠 {match['city']}: {match['sqft']:.0f} sqft, {match['bed']:.0f} bed, "
+                      f"{match['bath']} bath - ${match['price']:,.0f}")
+            return True
+        else:
+            print(f"❌ Comparables failed with status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ Comparables error: {e}")
+        return False
+
+def test_price_grid():
+    """Test POST /api/predict/grid - price surface over a feature grid"""
+    print("\n🔍 Testing Price Grid (POST /api/predict/grid)")
+    try:
+        payload = {
+            "cities": ["Irvine, CA", "San Diego, CA"],
+            "sqft": {"start": 1000, "stop": 3000, "step": 500},
+            "bed": [2, 3, 4],
+            "bath": [2]
+        }
+        response = requests.post(f"{API_BASE}/predict/grid", json=payload, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            if data['shape'] != [2, 5, 3, 1] or len(data['prices']) != 30:
+                print(f"❌ Expected a 2x5x3x1 grid, got shape {data['shape']} with {len(data['prices'])} prices")
+                return False
+            
+            print(f"✅ Price grid computed successfully:")
+            for i, city in enumerate(data['city']):
+                row = data['prices'][i * 15:(i + 1) * 15:3]
+                print(f"   🏙️ {city}, 2 bed: " + ", ".join(f"${price:,}" for price in row))
+            return True
+        else:
+            print(f"❌ Price grid failed with status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        print(f"❌ Price grid error: {e}")
+        return False
+
 def test_visualization_data():
     """Test GET /api/visualization-data - get data for charts"""
     print("\n🔍 Testing Visualization Data (GET /api/visualization-data)")
@@ -224,6 +417,12 @@ def run_all_tests():
         ("House Statistics", test_house_stats),
         ("City Statistics", test_city_stats),
         ("Price Prediction", test_price_prediction),
+        ("Batch Prediction", test_batch_prediction),
+        ("Streaming Prediction", test_stream_prediction),
+        ("Histogram Aggregate", test_histogram_aggregate),
+        ("City Search", test_city_search),
+        ("Comparables", test_comparables),
+        ("Price Grid", test_price_grid),
         ("Visualization Data", test_visualization_data)
     ]
     
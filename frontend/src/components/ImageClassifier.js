@@ -539,6 +539,13 @@ const ImageClassifier = () => {
                   <p className="text-sm text-blue-600">
                     Range: {combinedPrediction.data_prediction.price_range || 'N/A'}
                   </p>
+                  {combinedPrediction.data_prediction.price_interval && (
+                    <p className="text-sm text-blue-600">
+                      {Math.round(combinedPrediction.data_prediction.price_interval.level * 100)}% interval:{' '}
+                      {formatPrice(combinedPrediction.data_prediction.price_interval.low)} -{' '}
+                      {formatPrice(combinedPrediction.data_prediction.price_interval.high)}
+                    </p>
+                  )}
                 </div>
                 
                 <div className="bg-gray-50 p-4 rounded-lg">
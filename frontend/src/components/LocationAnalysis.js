@@ -6,7 +6,9 @@ const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
 const LocationAnalysis = () => {
-  const [cities, setCities] = useState([]);
+  const [topCities, setTopCities] = useState([]);
+  const [bottomCities, setBottomCities] = useState([]);
+  const [cityCount, setCityCount] = useState(0);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [topCitiesOpen, setTopCitiesOpen] = useState(false);
@@ -18,8 +20,15 @@ const LocationAnalysis = () => {
 
   const fetchCities = async () => {
     try {
-      const response = await axios.get(`${API}/cities`);
-      setCities(response.data);
+      // Only the two ranked pages shown here; X-Total-Count gives the number of cities
+      const top = await axios.get(`${API}/cities`, { params: { limit: 150 } });
+      const total = parseInt(top.headers['x-total-count'], 10) || top.data.length;
+      const bottom = await axios.get(`${API}/cities`, {
+        params: { offset: Math.max(total - 150, 0), limit: 150 }
+      });
+      setTopCities(top.data);
+      setBottomCities(bottom.data);
+      setCityCount(total);
     } catch (error) {
       console.error('Error fetching cities:', error);
       setError('Failed to load city data');
@@ -41,8 +50,10 @@ const LocationAnalysis = () => {
     return new Intl.NumberFormat('en-US').format(num);
   };
 
-  const getTop150Cities = () => cities.slice(0, 150);
-  const getBottom150Cities = () => cities.slice(-150);
+  const getTop150Cities = () => topCities;
+  const getBottom150Cities = () => bottomCities;
+  const mostExpensive = topCities[0];
+  const leastExpensive = bottomCities[bottomCities.length - 1];
 
   if (loading) {
     return (
@@ -104,23 +115,23 @@ const LocationAnalysis = () => {
               <MapPin size={20} className="text-blue-600" />
               <p className="text-sm text-gray-600">Total Cities</p>
             </div>
-            <p className="text-2xl font-bold text-gray-900">{cities.length}</p>
+            <p className="text-2xl font-bold text-gray-900">{cityCount}</p>
           </div>
           <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-200">
             <div className="flex items-center space-x-2 mb-2">
               <TrendingUp size={20} className="text-green-600" />
               <p className="text-sm text-gray-600">Highest Average</p>
             </div>
-            <p className="text-2xl font-bold text-gray-900">{formatPrice(cities[0]?.avg_price || 0)}</p>
-            <p className="text-sm text-gray-500">{cities[0]?.city || 'N/A'}</p>
+            <p className="text-2xl font-bold text-gray-900">{formatPrice(mostExpensive?.avg_price || 0)}</p>
+            <p className="text-sm text-gray-500">{mostExpensive?.city || 'N/A'}</p>
           </div>
           <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-200">
             <div className="flex items-center space-x-2 mb-2">
               <TrendingDown size={20} className="text-red-600" />
               <p className="text-sm text-gray-600">Lowest Average</p>
             </div>
-            <p className="text-2xl font-bold text-gray-900">{formatPrice(cities[cities.length - 1]?.avg_price || 0)}</p>
-            <p className="text-sm text-gray-500">{cities[cities.length - 1]?.city || 'N/A'}</p>
+            <p className="text-2xl font-bold text-gray-900">{formatPrice(leastExpensive?.avg_price || 0)}</p>
+            <p className="text-sm text-gray-500">{leastExpensive?.city || 'N/A'}</p>
           </div>
           <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-200">
             <div className="flex items-center space-x-2 mb-2">
@@ -128,7 +139,7 @@ const LocationAnalysis = () => {
               <p className="text-sm text-gray-600">Price Range</p>
             </div>
             <p className="text-2xl font-bold text-gray-900">
-              {cities.length > 0 ? (cities[0].avg_price / cities[cities.length - 1].avg_price).toFixed(1) : '0'}x
+              {mostExpensive && leastExpensive ? (mostExpensive.avg_price / leastExpensive.avg_price).toFixed(1) : '0'}x
             </p>
             <p className="text-sm text-gray-500">Variation</p>
           </div>
@@ -263,7 +274,7 @@ const LocationAnalysis = () => {
                     {getBottom150Cities().slice(0, 10).map((city, index) => (
                       <tr key={city.city} className="border-b border-gray-100 hover:bg-gray-50">
                         <td className="py-3 px-4">
-                          <span className="text-sm font-medium text-gray-900">#{cities.length - 150 + index + 1}</span>
+                          <span className="text-sm font-medium text-gray-900">#{cityCount - bottomCities.length + index + 1}</span>
                         </td>
                         <td className="py-3 px-4 font-medium text-gray-900">{city.city}</td>
                         <td className="py-3 px-4 font-bold text-blue-600">{formatPrice(city.avg_price)}</td>
@@ -311,7 +322,7 @@ const LocationAnalysis = () => {
             <h3 className="font-semibold text-blue-900 mb-2">Key Takeaway</h3>
             <p className="text-blue-800">
               Location has a huge influence on house prices in Southern California. 
-              The most expensive cities can cost up to {cities.length > 0 ? (cities[0].avg_price / cities[cities.length - 1].avg_price).toFixed(1) : '0'}x more than the most affordable ones, 
+              The most expensive cities can cost up to {mostExpensive && leastExpensive ? (mostExpensive.avg_price / leastExpensive.avg_price).toFixed(1) : '0'}x more than the most affordable ones, 
               highlighting the importance of location in the Southern California real estate market.
             </p>
           </div>
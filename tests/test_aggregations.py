@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from aggregations import CityStatsTable, HouseColumns, hexbin, histogram, stratified_sample
+
+
+def test_stratified_sample_is_bounded_and_deterministic():
+    rng = np.random.default_rng(0)
+    x = rng.lognormal(7, 0.5, 100_000)
+    y = x * 300 + rng.normal(0, 1e5, 100_000)
+
+    keep = stratified_sample(x, y, 1000)
+    assert len(keep) <= 1000
+    assert len(np.unique(keep)) == len(keep)
+    np.testing.assert_array_equal(keep, stratified_sample(x, y, 1000))
+
+
+def test_stratified_sample_keeps_outliers():
+    x = np.concatenate([np.zeros(10_000), [1.0]])
+    y = np.concatenate([np.zeros(10_000), [1.0]])
+    assert 10_000 in stratified_sample(x, y, 100)
+
+
+def test_hexbin_accounts_for_every_point():
+    rng = np.random.default_rng(1)
+    x, y = rng.random(5000), rng.random(5000)
+    cells = hexbin(x, y, gridsize=10)
+    assert sum(cells['count']) == 5000
+    assert len(cells['x']) == len(cells['y']) == len(cells['count']) == len(cells['mean_price'])
+    assert min(cells['mean_price']) >= 0 and max(cells['mean_price']) <= 1
+
+
+def test_city_stats_table_pages_precomputed_orders():
+    records = [
+        {'city': c, 'avg_price': p, 'house_count': n, 'min_price': p, 'max_price': p,
+         'avg_sqft': 1.0, 'avg_bed': 1.0, 'avg_bath': 1.0}
+        for c, p, n in [('A', 300.0, 5), ('B', 100.0, 50), ('C', 300.0, 20), ('D', 200.0, 1)]
+    ]
+    table = CityStatsTable(records)
+
+    def names(result):
+        return [record['city'] for record in result[0]]
+
+    # Same order as sorted(..., reverse=True): ties keep record order
+    assert names(table.select()) == ['A', 'C', 'D', 'B']
+    assert names(table.select('house_count', 'asc', offset=1, limit=2)) == ['A', 'C']
+    page, total = table.select(min_count=2, max_avg_price=250)
+    assert [r['city'] for r in page] == ['B'] and total == 1
+    with pytest.raises(ValueError):
+        table.select('price')
+
+
+def house_columns():
+    numeric = {
+        'price': np.array([100.0, 200.0, 300.0, 400.0, 500.0]),
+        'sqft': np.array([1000.0, 1500.0, 2000.0, 2500.0, 3000.0]),
+        'bed': np.array([2.0, 3.0, 3.0, 4.0, 3.0]),
+        'bath': np.array([1.0, 2.0, 2.0, 3.0, 2.5]),
+    }
+    return HouseColumns(np.array([0, 0, 1, 1, 1]), ['A', 'B'], numeric)
+
+
+def test_histogram_bins_filtered_rows():
+    columns = house_columns()
+    result = histogram(columns, 'price', bins=2, city='B', bed=3.0)
+    assert result['total'] == 2 and sum(result['counts']) == 2
+    assert result['edges'] == [300.0, 400.0, 500.0]
+    assert result['filters'] == {'city': 'B', 'bed': 3.0}
+
+    result = histogram(columns, 'sqft', edges=[0, 2000, 5000], min_price=150, max_price=450)
+    # The last bin includes its right edge, as in np.histogram
+    assert result['counts'] == [1, 2] and result['total'] == 3
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'column': 'street'},
+    {'bins': 0},
+    {'bins': 10, 'edges': [0, 1]},
+    {'edges': [1]},
+    {'edges': [1, 3, 2]},
+    {'edges': [1, float('nan'), 3]},
+    {'edges': [0, float('inf')]},
+    {'min_price': float('nan')},
+    {'bed': float('inf')},
+])
+def test_histogram_rejects_invalid_arguments(kwargs):
+    kwargs = {'column': 'price', **kwargs}
+    with pytest.raises(ValueError):
+        histogram(house_columns(), **kwargs)
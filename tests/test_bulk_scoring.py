@@ -0,0 +1,114 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from bulk_scoring import (
+    BulkInputError,
+    iter_lines,
+    parse_csv_lines,
+    parse_ndjson_lines,
+    read_csv_header,
+    score_rows,
+    score_stream,
+)
+from predictor import CompiledLinearModel
+
+MODEL = CompiledLinearModel(['bed', 'bath', 'sqft', 'citi_Irvine, CA', 'citi_Pasadena, CA'],
+                            [10000.0, 5000.0, 200.0, 50000.0, -50000.0], 100000.0)
+
+
+def price_range(price):
+    return 'Low' if price < 500000 else 'High'
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def stream(body, fmt, chunk_rows=2, resolve_city=None):
+    async def run():
+        lines = iter_lines(chunks(*body))
+        columns = await read_csv_header(lines) if fmt == 'csv' else None
+        output = await collect(score_stream(MODEL, lines, fmt, columns, price_range, chunk_rows, resolve_city))
+        return b''.join(output).decode()
+    return asyncio.run(run())
+
+
+def test_iter_lines_splits_across_chunks():
+    lines = asyncio.run(collect(iter_lines(chunks(b'a,b\r\nc', b'd\n', 'é'.encode()[:1], 'é'.encode()[1:]))))
+    assert lines == ['a,b', 'cd', 'é']
+
+
+def test_iter_lines_rejects_invalid_utf8():
+    with pytest.raises(BulkInputError, match='UTF-8'):
+        asyncio.run(collect(iter_lines(chunks(b'ok\n', b'\xff\xfe\n'))))
+    # A multi-byte character cut off by the end of the body
+    with pytest.raises(BulkInputError, match='UTF-8'):
+        asyncio.run(collect(iter_lines(chunks('é'.encode()[:1]))))
+
+
+def test_parse_csv_lines():
+    columns = {'citi': 0, 'bed': 1, 'bath': 2, 'sqft': 3}
+    rows = parse_csv_lines(['"Irvine, CA",3,2,1500', 'Irvine,x,2,1500', 'Irvine,3', ',3,2,1500', 'Irvine,0,2,1500'],
+                           columns)
+    assert rows[0] == ('Irvine, CA', 3.0, 2.0, 1500.0, None)
+    assert [row[4] for row in rows[1:]] == [
+        "bed, bath and sqft must be numbers",
+        "expected at least 4 fields",
+        "citi is required",
+        "bed, bath and sqft must be greater than 0",
+    ]
+
+
+@pytest.mark.parametrize('record, error', [
+    ({'citi': 123, 'bed': 3, 'bath': 2, 'sqft': 1500}, "citi must be a string"),
+    ({'citi': ['Irvine, CA'], 'bed': 3, 'bath': 2, 'sqft': 1500}, "citi must be a string"),
+    ({'citi': 'Irvine, CA', 'bed': 3, 'bath': 2, 'sqft': 'inf'}, "bed, bath and sqft must be finite numbers"),
+    ({'citi': 'Irvine, CA', 'bed': 'nan', 'bath': 2, 'sqft': 1500}, "bed, bath and sqft must be finite numbers"),
+    ({'citi': 'Irvine, CA', 'bed': 3, 'bath': None, 'sqft': 1500}, "bed, bath and sqft must be numbers"),
+])
+def test_parse_ndjson_rejects_bad_fields(record, error):
+    [row] = parse_ndjson_lines([json.dumps(record)])
+    assert row[4] == error
+    assert row[0] is None or isinstance(row[0], str)
+
+
+def test_parse_ndjson_lines():
+    rows = parse_ndjson_lines(['{"city": "Irvine, CA", "bed": 3, "bath": 2.5, "sqft": 1500}', '{"citi"', '[1, 2]'])
+    assert rows[0] == ('Irvine, CA', 3.0, 2.5, 1500.0, None)
+    assert [row[4] for row in rows[1:]] == ["invalid JSON", "expected a JSON object"]
+
+
+def test_score_rows_flags_unknown_cities_and_overflow():
+    rows = [('Irvine, CA', 3.0, 2.0, 1500.0, None), ('Nowhere, CA', 3.0, 2.0, 1500.0, None),
+            ('Irvine, CA', 3.0, 2.0, 1e308, None)]
+    prices, errors = score_rows(MODEL, rows)
+    assert prices[0] == pytest.approx(100000 + 30000 + 10000 + 300000 + 50000)
+    assert errors == [None, "Unknown city: Nowhere, CA", "Model produced an invalid prediction"]
+
+
+def test_ndjson_stream_reports_errors_per_row():
+    body = [b'{"citi": "irvine", "bed": 3, "bath": 2, "sqft": 1500}\n{"citi": 123, "bed": 3, "bath": 2, "sqft": 1',
+            b'500}\n\n{"citi": "Pasadena, CA", "bed": 3, "bath": 2, "sqft": "inf"}\n']
+    resolve = {'irvine': 'Irvine, CA'}.get
+    records = [json.loads(line) for line in stream(body, 'ndjson', resolve_city=resolve).splitlines()]
+    assert [r['row'] for r in records] == [0, 1, 2]
+    assert records[0]['predicted_price'] == 490000 and records[0]['price_range'] == 'Low'
+    assert records[1]['error'] == "citi must be a string" and records[1]['citi'] is None
+    assert records[2]['error'] == "bed, bath and sqft must be finite numbers"
+    assert records[2]['sqft'] is None and records[2]['predicted_price'] is None
+
+
+def test_csv_stream_reports_invalid_utf8_in_band():
+    body = [b'citi,bed,bath,sqft\n"Irvine, CA",3,2,1500\n', b'"Pasadena, CA",3,2,1500\n', b'\xff\n']
+    rows = list(csv.DictReader(io.StringIO(stream(body, 'csv', chunk_rows=1))))
+    assert [row['predicted_price'] for row in rows[:2]] == ['490000.0', '390000.0']
+    assert rows[2]['row'] == '2' and 'UTF-8' in rows[2]['error']
@@ -0,0 +1,27 @@
+from city_search import CityIndex, normalize_city
+
+CITIES = ['San Diego, CA', 'Santa Ana, CA', 'Irvine, CA', 'Arvin, CA', 'Mt Baldy, CA', 'Pasadena, CA']
+COUNTS = {'San Diego, CA': 500, 'Santa Ana, CA': 200, 'Irvine, CA': 300}
+
+
+def test_normalize_city():
+    assert normalize_city('  IRVINE,  ca ') == normalize_city('Irvine, CA') == 'irvine'
+    assert normalize_city('Mount Baldy') == normalize_city('Mt. Baldy, California') == 'mount baldy'
+    assert normalize_city('CA') == 'ca'
+
+
+def test_resolve_and_suggest():
+    index = CityIndex(CITIES, COUNTS)
+    assert index.resolve('irvine') == 'Irvine, CA'
+    assert index.resolve('mount baldy ca') == 'Mt Baldy, CA'
+    assert index.resolve('Irvin') is None
+    assert index.suggest('Irvin')[0] == 'Irvine, CA'
+
+
+def test_search_ranks_prefix_then_word_then_fuzzy():
+    index = CityIndex(CITIES, COUNTS)
+    assert [(r['city'], r['match']) for r in index.search('san')] == [
+        ('San Diego, CA', 'prefix'), ('Santa Ana, CA', 'prefix')]
+    assert [r['city'] for r in index.search('diego')] == ['San Diego, CA']
+    assert [(r['city'], r['match']) for r in index.search('pasadna')] == [('Pasadena, CA', 'fuzzy')]
+    assert [r['city'] for r in index.search('', limit=2)] == ['San Diego, CA', 'Irvine, CA']
@@ -0,0 +1,29 @@
+import numpy as np
+
+from comparables import ComparablesIndex, brute_force
+from dataset import load_house_dataset
+
+
+def test_index_matches_brute_force():
+    houses = load_house_dataset().house_data
+    index = ComparablesIndex(houses)
+    rng = np.random.default_rng(0)
+    for i in rng.integers(0, len(houses), 300).tolist():
+        city = houses.city_names[houses.city_codes[i]] if i % 5 else None
+        query = (city, float(houses['sqft'][i]) * rng.uniform(0.5, 1.5),
+                 float(houses['bed'][i]), float(houses['bath'][i]))
+        k = int(rng.integers(1, 60))
+        found = index.query(*query, k=k)
+        rows, dist = brute_force(houses, index.scale, *query, k=k)
+        assert [match['row'] for match in found] == rows.tolist()
+        assert np.allclose([match['distance'] for match in found], dist, atol=1e-6)
+
+
+def test_small_city_is_filled_from_other_cities():
+    houses = load_house_dataset().house_data
+    counts = np.bincount(houses.city_codes, minlength=len(houses.city_names))
+    city = houses.city_names[int(np.flatnonzero(counts == counts[counts > 0].min())[0])]
+    found = ComparablesIndex(houses).query(city, 1500, 3, 2, k=counts[counts > 0].min() + 3)
+    flags = [match['same_city'] for match in found]
+    assert flags == sorted(flags, reverse=True) and flags.count(False) == 3
+    assert all(match['city'] == city for match in found if match['same_city'])
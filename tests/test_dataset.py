@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pandas as pd
+
+from dataset import compact_house_frame, frame_memory, load_house_dataset, load_snapshot, write_snapshot
+
+CSV_PATH = Path(__file__).parent.parent / 'images' / 'socal2.csv'
+
+
+def test_compact_frame_keeps_statistics_identical():
+    full = pd.read_csv(CSV_PATH)
+    compact = compact_house_frame(full)
+    assert frame_memory(compact) * 4 < frame_memory(full)
+
+    aggregations = {'price': ['mean', 'count', 'min', 'max'], 'sqft': 'mean', 'bed': 'mean', 'bath': 'mean'}
+    expected = full.groupby('citi').agg(aggregations).round(2)
+    actual = compact.groupby('citi', observed=True).agg(aggregations).round(2)
+    assert expected.to_numpy().tolist() == actual.to_numpy().tolist()
+    assert list(expected.index) == list(actual.index)
+
+    for col in ['price', 'sqft', 'bed', 'bath']:
+        assert full[col].mean() == compact[col].mean()
+        assert {str(k): v for k, v in full[col].value_counts().items()} == \
+            {str(k): v for k, v in compact[col].value_counts().items()}
+
+
+def test_snapshot_round_trip_and_stale_fallback(tmp_path):
+    csv_path = tmp_path / 'socal2.csv'
+    csv_path.write_bytes(CSV_PATH.read_bytes())
+    snapshot_path = write_snapshot(csv_path, tmp_path / 'socal2.snapshot')
+
+    from_csv = load_house_dataset(csv_path, tmp_path / 'missing.snapshot')
+    from_snapshot = load_snapshot(snapshot_path, csv_path)
+    assert from_csv.source == 'csv' and from_snapshot.source == 'snapshot'
+    assert from_snapshot.house_data.city_names == from_csv.house_data.city_names
+    assert from_snapshot.house_data.city_codes.tolist() == from_csv.house_data.city_codes.tolist()
+    for col, values in from_csv.house_data.numeric.items():
+        assert from_snapshot.house_data[col].dtype == values.dtype
+        assert from_snapshot.house_data[col].tolist() == values.tolist()
+    assert from_snapshot.city_stats == from_csv.city_stats
+    assert from_snapshot.house_stats == from_csv.house_stats
+    assert from_snapshot.correlations == from_csv.correlations
+
+    with open(csv_path, 'a') as f:
+        f.write('99999,1 Main St,"Irvine, CA",0,3,2,1500,900000\n')
+    assert load_snapshot(snapshot_path, csv_path) is None
+    assert load_house_dataset(csv_path, snapshot_path).source == 'csv'
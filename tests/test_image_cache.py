@@ -0,0 +1,40 @@
+import io
+
+from PIL import Image
+
+from image_cache import ProcessedImageCache
+from image_processing import preprocess_cached
+
+
+def jpeg_bytes(color=(10, 20, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    cache = ProcessedImageCache(max_bytes=25, disk_dir=None)
+    cache.put('a', (b'x' * 10, 'image/jpeg'))
+    cache.put('b', (b'x' * 10, 'image/jpeg'))
+    assert cache.get('a') is not None
+    cache.put('c', (b'x' * 10, 'image/jpeg'))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['bytes']) == (3, 1, 1, 20)
+
+
+def test_key_covers_content_and_parameters(tmp_path):
+    cache = ProcessedImageCache(disk_dir=str(tmp_path))
+    first = preprocess_cached(cache, jpeg_bytes(), 'jpeg', 80)
+    assert preprocess_cached(cache, io.BytesIO(jpeg_bytes()), 'jpeg', 80) == first
+    assert cache.counters['hits'] == 1
+
+    preprocess_cached(cache, jpeg_bytes(), 'jpeg', 60)
+    preprocess_cached(cache, jpeg_bytes((200, 0, 0)), 'jpeg', 80)
+    assert cache.counters['misses'] == 3
+
+    # A fresh process with the same directory is served from the disk tier
+    restarted = ProcessedImageCache(disk_dir=str(tmp_path))
+    assert preprocess_cached(restarted, jpeg_bytes(), 'jpeg', 80) == first
+    assert restarted.counters['disk_hits'] == 1
@@ -0,0 +1,37 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from image_processing import IMAGE_SIZE, ImagePool, ImagePoolBusy, preprocess_image
+
+
+def jpeg_bytes(size=(1600, 1200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (120, 80, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('output_format, encoder', [('jpeg', 'JPEG'), ('webp', 'WEBP'), ('png', 'PNG')])
+def test_preprocess_resizes_and_reencodes(output_format, encoder):
+    encoded, mime_type = preprocess_image(jpeg_bytes(), output_format, quality=70)
+    image = Image.open(io.BytesIO(encoded))
+    assert image.format == encoder and mime_type == f'image/{output_format}'
+    assert image.size == IMAGE_SIZE and image.mode == 'RGB'
+
+
+def test_pool_rejects_uploads_beyond_capacity():
+    async def scenario():
+        pool = ImagePool(workers=1, max_queued=1)
+        try:
+            pool.in_flight = pool.capacity
+            with pytest.raises(ImagePoolBusy):
+                await pool.preprocess(jpeg_bytes())
+            pool.in_flight = 0
+            encoded, _ = await pool.preprocess(jpeg_bytes())
+            assert pool.in_flight == 0 and encoded
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
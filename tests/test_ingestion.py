@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from dataset import dataset_from_frame, read_house_csv
+from ingestion import ListingIngestor, append_listings_csv
+
+CSV_PATH = Path(__file__).parent.parent / 'images' / 'socal2.csv'
+
+
+def listings_from_frame(frame):
+    return [
+        {'city': row.citi, 'bed': row.bed, 'bath': row.bath, 'sqft': row.sqft, 'price': row.price}
+        for row in frame.itertuples()
+    ]
+
+
+def test_incremental_statistics_match_full_recompute():
+    houses, _ = read_house_csv(CSV_PATH)
+    # Hold out whole cities too, so ingestion has to add cities it has never seen
+    held_out_cities = set(houses['citi'].cat.categories[-3:])
+    initial = houses.iloc[:12000][~houses.iloc[:12000]['citi'].isin(held_out_cities)]
+    rest = houses.drop(initial.index)
+    initial = initial.copy()
+    initial['citi'] = initial['citi'].cat.remove_unused_categories()
+
+    ingestor = ListingIngestor(dataset_from_frame(initial))
+    listings = listings_from_frame(rest)
+    for start in range(0, len(listings), 700):
+        dataset = ingestor.append(listings[start:start + 700])
+
+    expected = dataset_from_frame(houses)
+    assert len(dataset.house_data) == len(houses)
+    assert dataset.house_stats.keys() == expected.house_stats.keys()
+    for key in ('total_houses', 'price_ranges', 'bed_distribution', 'bath_distribution'):
+        assert dataset.house_stats[key] == expected.house_stats[key]
+    for key in ('avg_price', 'avg_sqft', 'avg_bed', 'avg_bath'):
+        assert dataset.house_stats[key] == pytest.approx(expected.house_stats[key], rel=1e-12)
+    for key, value in expected.correlations.items():
+        assert dataset.correlations[key] == pytest.approx(value, rel=1e-10)
+
+    actual = {record['city']: record for record in dataset.city_stats}
+    assert actual.keys() == {record['city'] for record in expected.city_stats}
+    for record in expected.city_stats:
+        got = actual[record['city']]
+        for field in ('house_count', 'min_price', 'max_price'):
+            assert got[field] == record[field]
+        # Both round to cents, but summation order can put a mean on either side of a half cent
+        for field in ('avg_price', 'avg_sqft', 'avg_bed', 'avg_bath'):
+            assert got[field] == pytest.approx(record[field], abs=0.0101)
+
+
+def test_published_datasets_never_change():
+    houses, _ = read_house_csv(CSV_PATH)
+    ingestor = ListingIngestor(dataset_from_frame(houses.iloc[:100]))
+    first = ingestor.append([{'city': 'Atlantis, CA', 'bed': 3, 'bath': 2.0, 'sqft': 1500, 'price': 500000}])
+    prices = first.house_data['price'].copy()
+    stats = dict(first.house_stats)
+
+    # Enough rows to outgrow the column buffers, plus a fractional sqft
+    second = ingestor.append(listings_from_frame(houses.iloc[100:5000])
+                             + [{'city': 'Atlantis, CA', 'bed': 3, 'bath': 2.0, 'sqft': 1500.5, 'price': 700000}])
+    assert np.array_equal(first.house_data['price'], prices)
+    assert first.house_stats == stats
+    assert len(first.house_data) == 101 and len(second.house_data) == 5002
+    assert second.house_data['sqft'][-1] == 1500.5
+    with pytest.raises(ValueError):
+        first.house_data['price'][0] = 1
+
+    atlantis = next(record for record in second.city_stats if record['city'] == 'Atlantis, CA')
+    assert atlantis['house_count'] == 2 and atlantis['max_price'] == 700000
+    assert second.house_data.city_names[second.house_data.city_codes[-1]] == 'Atlantis, CA'
+
+
+def test_appended_listings_load_from_csv(tmp_path):
+    csv_path = tmp_path / 'socal2.csv'
+    csv_path.write_bytes(CSV_PATH.read_bytes())
+    append_listings_csv(csv_path, [
+        {'city': 'Atlantis, CA', 'bed': 3, 'bath': 2.5, 'sqft': 1500, 'price': 500000, 'street': '1 Main St, Unit 2'},
+        {'city': 'Irvine, CA', 'bed': 4, 'bath': 3.0, 'sqft': 2400, 'price': 1200000},
+    ])
+    houses, _ = read_house_csv(csv_path)
+    tail = houses.tail(2)
+    assert tail['citi'].tolist() == ['Atlantis, CA', 'Irvine, CA']
+    assert tail['bath'].tolist() == [2.5, 3.0]
+    assert tail['price'].tolist() == [500000, 1200000]
@@ -0,0 +1,63 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model_comparison import Candidate, compare_models, fit_candidate
+
+
+def synthetic_listings(n, cities=15, seed=0):
+    rng = np.random.default_rng(seed)
+    # Uneven city sizes, like the real listings
+    codes = np.minimum(rng.geometric(0.15, n) - 1, cities - 1)
+    numeric = np.column_stack([rng.integers(1, 6, n), rng.integers(1, 5, n), rng.uniform(600, 4000, n)]).astype(float)
+    price = 250 * numeric[:, 2] + 20000 * numeric[:, 0] + 40000 * codes + rng.normal(0, 50000, n)
+    # Names out of code order, so offsets must follow pd.get_dummies' sorted order
+    names = [f'City {(7 * c) % cities:02d}, CA' for c in range(cities)]
+    return codes, numeric, price, names
+
+
+def dense_design(codes, numeric, names):
+    dummies = pd.get_dummies(pd.Series([names[c] for c in codes]), dtype=float)
+    return np.column_stack([numeric, dummies.to_numpy()]), dummies.columns.tolist()
+
+
+@pytest.mark.parametrize('candidate', [Candidate('ols'), Candidate('ridge_5', 5.0, 5.0)])
+def test_fits_match_sklearn(candidate):
+    from sklearn.linear_model import LinearRegression, Ridge
+
+    codes, numeric, price, names = synthetic_listings(2000)
+    model = fit_candidate(candidate, codes, numeric, price, names)
+    X, cities = dense_design(codes, numeric, names)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        reference = (Ridge(alpha=candidate.slope_penalty) if candidate.slope_penalty else LinearRegression()).fit(X, price)
+
+    assert model.cities == cities
+    assert np.asarray(model.coef[:-1]) == pytest.approx(reference.coef_, rel=1e-7, abs=1e-4)
+    assert model.intercept == pytest.approx(reference.intercept_, rel=1e-9)
+
+
+def test_city_shrinkage_pulls_small_cities_most():
+    codes, numeric, price, names = synthetic_listings(3000)
+    ols = fit_candidate(Candidate('ols'), codes, numeric, price, names)
+    shrunk = fit_candidate(Candidate('shrink', city_penalty=50.0), codes, numeric, price, names)
+    counts = np.bincount(codes)
+    ratio = {names[c]: abs(shrunk.city_offsets[names[c]]) / abs(ols.city_offsets[names[c]]) for c in range(len(names))}
+    assert ratio[names[counts.argmin()]] < ratio[names[counts.argmax()]]
+
+
+def test_pool_and_in_process_reports_agree():
+    codes, numeric, price, names = synthetic_listings(1500)
+    candidates = [Candidate('ols'), Candidate('shrink', city_penalty=10.0), Candidate('no_city', cities=False)]
+    pooled = compare_models(codes, numeric, price, names, candidates, folds=3, workers=2)
+    serial = compare_models(codes, numeric, price, names, candidates, folds=3, workers=0)
+
+    assert [c['name'] for c in pooled['candidates']] == ['ols', 'shrink', 'no_city']
+    for a, b in zip(pooled['candidates'], serial['candidates']):
+        assert a['r2_mean'] == pytest.approx(b['r2_mean'], rel=1e-12)
+        assert len(a['folds']) == 3 and a['single_us'] > 0 and a['batch_us_per_row'] > 0
+    by_name = {c['name']: c for c in pooled['candidates']}
+    assert by_name['ols']['r2_mean'] > by_name['no_city']['r2_mean']
+    assert pooled['best_r2'] in by_name
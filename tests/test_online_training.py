@@ -0,0 +1,76 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from online_training import NUMERIC_FEATURES, OUTLIER_COLUMNS, OnlineLeastSquares, iqr_bounds
+from predictor import fit_interval_stats
+
+
+def synthetic_listings(n, cities=12, seed=0):
+    rng = np.random.default_rng(seed)
+    city = rng.integers(0, cities, n)
+    sqft = rng.uniform(600, 4000, n)
+    bed = rng.integers(1, 6, n).astype(np.float64)
+    bath = rng.integers(1, 5, n).astype(np.float64)
+    price = 250 * sqft + 20000 * bed + 15000 * bath + 50000 * city + rng.normal(0, 40000, n)
+    names = [f'City {c:02d}, CA' for c in city]
+    return names, np.column_stack([bed, bath, sqft]), price
+
+
+def dense_fit(names, numeric, price):
+    from sklearn.linear_model import LinearRegression
+
+    dummies = pd.get_dummies(pd.Series(names), dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = LinearRegression().fit(np.column_stack([numeric, dummies.to_numpy()]), price)
+    return model, dummies.columns.tolist()
+
+
+def test_batches_match_a_dense_refit():
+    names, numeric, price = synthetic_listings(3000)
+    online = OnlineLeastSquares(numeric[:100].mean(axis=0), price[:100].mean())
+    for start in range(0, len(price), 250):
+        online.add(names[start:start + 250], numeric[start:start + 250], price[start:start + 250])
+    model = online.solve()
+
+    dense, cities = dense_fit(names, numeric, price)
+    assert model.cities == cities
+    assert np.asarray(model.coef[:-1]) == pytest.approx(dense.coef_, rel=1e-9, abs=1e-5)
+    assert model.intercept == pytest.approx(dense.intercept_, rel=1e-9)
+    city_idx = model.city_index(names)
+    predicted = model.predict_many(numeric[:, 2], numeric[:, 0], numeric[:, 1], city_idx)
+    assert predicted == pytest.approx(dense.predict(np.column_stack([numeric, np.eye(len(cities))[city_idx]])), rel=1e-9)
+
+    stats = fit_interval_stats(numeric, names, price - predicted, list(NUMERIC_FEATURES), cities)
+    assert model.sigma2 == pytest.approx(stats['sigma2'], rel=1e-9)
+    assert model.dof == stats['dof']
+    assert model.within_inv == pytest.approx(np.asarray(stats['within_inv']), rel=1e-9)
+    assert model.intervals['city_counts'] == stats['city_counts']
+
+
+def test_bounds_filter_later_rows():
+    names, numeric, price = synthetic_listings(500)
+    online = OnlineLeastSquares(numeric.mean(axis=0), price.mean(), {'price': (0, 2e6), 'sqft': (500, 5000)})
+    assert online.add(names[:2], [[3, 2, 1500], [3, 2, 9000]], [500000, 800000]) == 1
+    assert online.add(names[:1], [[3, 2, 1500]], [5e6]) == 0
+    assert online.rows == 1
+
+
+def test_iqr_bounds_match_sequential_filter():
+    names, numeric, price = synthetic_listings(2000, seed=1)
+    price[:20] *= 10
+    numeric[20:30, 2] *= 5
+    frame = pd.DataFrame({'price': price, 'bed': numeric[:, 0], 'bath': numeric[:, 1], 'sqft': numeric[:, 2]})
+
+    expected = frame
+    for col in OUTLIER_COLUMNS:
+        q1, q3 = expected[col].quantile(0.25), expected[col].quantile(0.75)
+        iqr = q3 - q1
+        expected = expected[(expected[col] >= q1 - 1.5 * iqr) & (expected[col] <= q3 + 1.5 * iqr)]
+
+    keep, bounds = iqr_bounds({col: frame[col].to_numpy() for col in OUTLIER_COLUMNS})
+    assert np.flatnonzero(keep).tolist() == expected.index.tolist()
+    assert set(bounds) == set(OUTLIER_COLUMNS)
@@ -0,0 +1,59 @@
+import asyncio
+
+from prediction_cache import PredictionCache
+
+
+def test_concurrent_misses_share_one_computation():
+    async def scenario():
+        cache = PredictionCache()
+        cache.reset('v1')
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'predicted_price': 1.0}
+
+        results = await asyncio.gather(*(cache.get(('a',), compute) for _ in range(5)))
+        assert len(calls) == 1 and all(result is results[0] for result in results)
+        assert await cache.get(('a',), compute) is results[0]
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats['misses'], stats['coalesced'], stats['hits']) == (1, 4, 1)
+
+
+def test_failures_are_shared_but_not_cached():
+    async def scenario():
+        cache = PredictionCache()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(cache.get('k', fail), cache.get('k', fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        async def succeed():
+            return 2.0
+
+        assert await cache.get('k', succeed) == 2.0
+
+    asyncio.run(scenario())
+
+
+def test_reset_and_lru_bound():
+    async def scenario():
+        cache = PredictionCache(max_entries=2)
+        cache.reset('v1')
+        for key in ('a', 'b', 'a', 'c'):
+            await cache.get(key, lambda key=key: asyncio.sleep(0, result=key))
+        assert cache.stats()['entries'] == 2 and cache.counters['evictions'] == 1
+
+        cache.reset('v2')
+        stats = cache.stats()
+        assert (stats['entries'], stats['hits'], stats['model_version']) == (0, 0, 'v2')
+        await cache.get('a', lambda: asyncio.sleep(0, result='new'))
+        assert cache.counters['misses'] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+import warnings
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from predictor import CompiledLinearModel, fit_interval_stats, load_artifact, normal_cdf, t_quantile
+
+ROOT_DIR = Path(__file__).parent.parent
+
+MODEL_PATH = ROOT_DIR / 'linear_regression_model_retrained.joblib'
+CSV_PATH = ROOT_DIR / 'images' / 'socal2.csv'
+
+
+@pytest.fixture(scope='module')
+def linear_model():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return joblib.load(MODEL_PATH)
+
+
+def sklearn_predict(model, sqft, bed, bath, city):
+    """The original per-request dense path from server.py"""
+    names = model.feature_names_in_.tolist()
+    input_dict = {'bed': [bed], 'bath': [bath], 'sqft': [sqft]}
+    for feature in names:
+        if feature.startswith('citi_'):
+            input_dict[feature] = [1 if feature == f'citi_{city}' else 0]
+    return model.predict(pd.DataFrame(input_dict)[names])[0]
+
+
+def test_parity_with_sklearn_for_every_city(linear_model):
+    compiled = CompiledLinearModel.from_estimator(linear_model)
+    houses = pd.read_csv(CSV_PATH)
+    rng = np.random.default_rng(42)
+    cities = sorted(houses['citi'].unique()) + ['Not A Real City, CA']
+    for city in cities:
+        sqft, bed = rng.integers(400, 6000), rng.integers(1, 7)
+        bath = float(rng.choice([1, 1.5, 2, 2.5, 3, 4]))
+        expected = sklearn_predict(linear_model, sqft, bed, bath, city)
+        # sklearn reduces a 403-wide dense dot through BLAS, whose summation
+        # order is kernel dependent; the compiled model may differ by an ulp.
+        assert compiled.predict(sqft, bed, bath, city) == pytest.approx(expected, rel=1e-12, abs=1e-6)
+
+
+def test_unknown_city_has_no_offset(linear_model):
+    compiled = CompiledLinearModel.from_estimator(linear_model)
+    assert not compiled.has_city('Atlantis, CA')
+    base = compiled.intercept + compiled.numeric_coef['sqft'] * 1000
+    assert compiled.predict(1000, 0, 0, 'Atlantis, CA') == pytest.approx(base)
+
+
+def test_predict_many_matches_single_predictions(linear_model):
+    compiled = CompiledLinearModel.from_estimator(linear_model)
+    houses = pd.read_csv(CSV_PATH).head(500)
+    cities = houses['citi'].tolist()
+    batch = compiled.predict_many(
+        sqft=houses['sqft'].to_numpy(),
+        bed=houses['bed'].to_numpy(),
+        bath=houses['bath'].to_numpy(),
+        city_idx=compiled.city_index(cities)
+    )
+    single = [compiled.predict(s, b, ba, c) for s, b, ba, c in zip(houses['sqft'], houses['bed'], houses['bath'], cities)]
+    np.testing.assert_array_equal(batch, np.array(single))
+
+
+def test_artifact_matches_joblib_model(linear_model):
+    from_joblib = CompiledLinearModel.from_estimator(linear_model)
+    from_artifact = load_artifact(ROOT_DIR / 'linear_regression_model_retrained.json')
+    assert from_artifact.feature_names == from_joblib.feature_names
+    assert from_artifact.intercept == from_joblib.intercept
+    np.testing.assert_array_equal(from_artifact.coef, from_joblib.coef)
+
+
+def test_interval_leverage_matches_dense_pseudo_inverse():
+    rng = np.random.default_rng(7)
+    cities = ['A', 'B', 'C', 'D', 'Untrained']
+    n = 200
+    codes = rng.integers(0, 4, n)
+    numeric = np.column_stack([rng.integers(1, 6, n), rng.integers(1, 4, n) + 0.5 * rng.integers(0, 2, n),
+                               rng.uniform(500, 4000, n)])
+    price = numeric @ [20000.0, 15000.0, 300.0] + np.array([1e5, 3e5, 2e5, 5e5])[codes] + rng.normal(0, 5e4, n)
+
+    # The training script's dense design: numeric features, every city dummy, an intercept
+    dummies = np.eye(len(cities))[codes]
+    design = np.column_stack([np.ones(n), numeric, dummies])
+    beta = np.linalg.lstsq(design, price, rcond=None)[0]
+    residuals = price - design @ beta
+    stats = fit_interval_stats(numeric, [cities[c] for c in codes], residuals, ['bed', 'bath', 'sqft'], cities)
+    model = CompiledLinearModel(['bed', 'bath', 'sqft'] + [f'citi_{c}' for c in cities], beta[1:], beta[0], stats)
+
+    rank = np.linalg.matrix_rank(design)
+    sigma2 = residuals @ residuals / (n - rank)
+    assert stats['dof'] == n - rank
+    assert model.sigma2 == pytest.approx(sigma2)
+
+    gram_pinv = np.linalg.pinv(design.T @ design)
+    queries = [(1800.0, 3, 2.0, 'A'), (3900.0, 5, 3.5, 'C'), (650.0, 1, 1.0, 'D')]
+    for sqft, bed, bath, city in queries:
+        x = np.concatenate(([1.0, bed, bath, sqft], np.eye(len(cities))[cities.index(city)]))
+        expected = np.sqrt(sigma2 * (1 + x @ gram_pinv @ x))
+        assert model.predictive_sd(sqft, bed, bath, city) == pytest.approx(expected, rel=1e-9)
+
+    # Cities without training rows are wider than any trained city at the same house
+    assert model.predictive_sd(1800.0, 3, 2.0, 'Untrained') > model.predictive_sd(1800.0, 3, 2.0, 'A')
+    assert model.predictive_sd(1800.0, 3, 2.0, 'Nowhere') == model.predictive_sd(1800.0, 3, 2.0, 'Untrained')
+
+    sqft, bed, bath, city = map(np.array, zip(*queries, (1800.0, 3, 2.0, 'Nowhere')))
+    batch = model.predictive_sd_many(sqft, bed, bath, model.city_index(city.tolist()))
+    single = [model.predictive_sd(*q) for q in zip(sqft.tolist(), bed.tolist(), bath.tolist(), city.tolist())]
+    np.testing.assert_allclose(batch, single, rtol=1e-12)
+
+
+def test_t_quantile_and_normal_cdf():
+    # Tabulated Student t quantiles
+    assert t_quantile(0.95, 10) == pytest.approx(1.812461, abs=1e-3)
+    assert t_quantile(0.975, 30) == pytest.approx(2.042272, abs=1e-4)
+    assert t_quantile(0.95, 10000) == pytest.approx(1.645, abs=1e-3)
+    np.testing.assert_allclose(normal_cdf([-1.959964, 0.0, 1.644854]), [0.025, 0.5, 0.95], atol=1e-6)
+
+
+def test_artifact_intervals(linear_model):
+    model = load_artifact(ROOT_DIR / 'linear_regression_model_retrained.json')
+    assert model.intervals is not None
+    sd = model.predictive_sd(1800, 3, 2.0, 'San Diego, CA')
+    # Residual spread of the retrained model is on the order of $100k
+    assert 0.9 * model.sigma2 ** 0.5 < sd < 1.1 * model.sigma2 ** 0.5
+    assert CompiledLinearModel.from_estimator(linear_model).predictive_sd(1800, 3, 2.0, 'San Diego, CA') is None
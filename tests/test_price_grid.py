@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import price_grid
+from predictor import load_artifact
+from price_grid import axis_values, evaluate_grid
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+@pytest.fixture(scope='module')
+def model():
+    return load_artifact(ROOT_DIR / 'linear_regression_model_retrained.json')
+
+
+def test_axis_values():
+    np.testing.assert_array_equal(axis_values(start=1000, stop=2000, step=250), [1000, 1250, 1500, 1750, 2000])
+    np.testing.assert_allclose(axis_values(start=1, stop=2, step=0.1), np.linspace(1, 2, 11))
+    np.testing.assert_array_equal(axis_values(start=3), [3])
+    np.testing.assert_array_equal(axis_values([1, 2.5]), [1, 2.5])
+    for bad in [dict(values=[]), dict(values=[0, 1]), dict(start=2, stop=1), dict(start=1, stop=2, step=0),
+                dict(start=1, stop=1e9), dict(values=[1], start=1)]:
+        with pytest.raises(ValueError):
+            axis_values(**bad)
+
+
+def test_axis_values_are_capped_per_feature():
+    assert axis_values([1e6], name='axis')[0] == 1e6
+    for name, bad in [('sqft', dict(values=[1500, 1e300])), ('bed', dict(start=40, stop=60)),
+                      ('bath', dict(values=[51]))]:
+        with pytest.raises(ValueError, match=f'{name}: values must be at most'):
+            axis_values(**bad, name=name)
+
+
+def test_grid_matches_single_predictions(model):
+    cities = ['Irvine, CA', 'San Diego, CA', 'Not A Real City, CA']
+    axes = {'sqft': axis_values(start=800, stop=2000, step=400), 'bed': axis_values([1, 3]),
+            'bath': axis_values([1, 1.5, 2])}
+    result = evaluate_grid(model, cities, axes)
+    assert result['shape'] == [3, 4, 2, 3]
+    prices = np.array(result['prices']).reshape(result['shape'])
+    for c, city in enumerate(cities):
+        for s, sqft in enumerate(axes['sqft']):
+            for b, bed in enumerate(axes['bed']):
+                for h, bath in enumerate(axes['bath']):
+                    assert prices[c, s, b, h] == round(model.predict(sqft, bed, bath, city))
+
+
+def test_grid_size_is_bounded(model, monkeypatch):
+    monkeypatch.setattr(price_grid, 'MAX_GRID_POINTS', 100)
+    axes = {'sqft': axis_values(start=500, stop=5000, step=100), 'bed': axis_values([1, 2, 3]), 'bath': axis_values([1])}
+    with pytest.raises(price_grid.GridSizeError, match='at most 100'):
+        evaluate_grid(model, ['Irvine, CA'], axes)
+
+
+def test_grid_refuses_prices_that_do_not_fit_int64(model):
+    # Built directly, bypassing axis_values' caps
+    axes = {'sqft': np.array([1500.0, 1e300]), 'bed': np.array([3.0]), 'bath': np.array([2.0])}
+    with pytest.raises(ValueError, match='not finite or too large'):
+        evaluate_grid(model, ['Irvine, CA'], axes)
@@ -0,0 +1,305 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import dataset_from_frame, read_house_csv
+from predictor import CompiledLinearModel, load_artifact, save_artifact
+
+# The Mongo client is opened on first use only, and no test here uses it
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_database')
+
+
+@pytest.fixture(scope='module')
+def server():
+    import server
+
+    server.load_house_data()
+    yield server
+    # Later modules see the files' data and model again, whatever a test published
+    server.load_house_data()
+    server.load_price_model()
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def restore_state(server):
+    """Reload the files' data and model after a test that publishes its own"""
+    yield
+    server.load_house_data()
+    server.load_price_model()
+
+
+@pytest.fixture
+def admin(server, restore_state, monkeypatch, tmp_path):
+    """Enable the admin endpoints and send their writes to tmp copies of the files"""
+    listings_csv = tmp_path / 'socal2.csv'
+    shutil.copyfile(server.CSV_PATH, listings_csv)
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', 'test-token')
+    monkeypatch.setattr(server, 'LISTINGS_CSV_PATH', listings_csv)
+    model_artifact = tmp_path / 'model.json'
+    shutil.copyfile(server.MODEL_ARTIFACT_PATH, model_artifact)
+    monkeypatch.setattr(server, 'MODEL_ARTIFACT_PATH', model_artifact)
+    return {'X-Admin-Token': 'test-token'}
+
+
+def test_prediction_rejects_city_without_model_offset(server, client):
+    # In the listings, but the training script dropped all of them as price outliers
+    city = 'Rancho Santa Fe, CA'
+    state = server.serving_state
+    assert state.city_index.resolve(city) == city and not state.model.has_city(city)
+    house = {'sqft': 2300, 'bed': 3, 'bath': 3, 'city': city}
+
+    response = client.post('/api/predict', json=house)
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith(f"Unknown city: {city}. Did you mean:")
+    assert client.post('/api/predict/batch', json=[house]).json()['results'][0]['error'] == f"Unknown city: {city}"
+    grid = {'cities': [city], 'sqft': [2300], 'bed': [3], 'bath': [3]}
+    assert client.post('/api/predict/grid', json=grid).status_code == 400
+
+    # Still a dataset city for search and comparables
+    assert client.get('/api/cities/search', params={'q': 'rancho santa f'}).json()['results'][0]['city'] == city
+    comparables = client.get('/api/comparables', params={'city': 'rancho santa fe', 'sqft': 2300, 'bed': 3, 'bath': 3})
+    assert comparables.status_code == 200 and comparables.json()['city'] == city
+    assert client.post('/api/predict', json={**house, 'city': 'rancho bernardo'}).status_code == 200
+
+
+def test_stream_rejects_bad_input_without_failing_the_response(client):
+    assert client.post('/api/predict/stream?format=csv', content=b'citi,bed,\xff\n').status_code == 400
+    body = b'{"citi": 123, "bed": 3, "bath": 2, "sqft": 1500}\n{"citi": "irvine", "bed": 3, "bath": 2, "sqft": "inf"}\n'
+    response = client.post('/api/predict/stream', content=body, headers={'Content-Type': 'application/x-ndjson'})
+    assert response.status_code == 200
+    assert [json.loads(line)['error'] for line in response.text.splitlines()] == [
+        "citi must be a string", "bed, bath and sqft must be finite numbers"
+    ]
+
+
+def test_histogram_endpoint(client):
+    response = client.get('/api/aggregate/histogram', params={'column': 'sqft', 'bins': 5, 'city': 'san diego'})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['filters'] == {'city': 'San Diego, CA'} and body['total'] == sum(body['counts']) > 0
+
+    for params in ({'edges': '1,nan,3'}, {'edges': '1,x'}, {'min_price': 'nan'}, {'bins': 0},
+                   {'city': 'Atlantis'}):
+        assert client.get('/api/aggregate/histogram', params=params).status_code == 400, params
+    assert 'Did you mean' in client.get('/api/aggregate/histogram', params={'city': 'san diegp'}).json()['detail']
+
+
+def test_cached_payloads_revalidate_with_etags(server, client, restore_state, tmp_path):
+    first = client.get('/api/stats')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'public, max-age=60, must-revalidate'
+    assert etag.startswith('"') and len(etag) == 34
+
+    for if_none_match in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+        cached = client.get('/api/stats', headers={'If-None-Match': if_none_match})
+        assert cached.status_code == 304 and cached.content == b'' and cached.headers['ETag'] == etag
+    assert client.get('/api/stats', headers={'If-None-Match': '"other"'}).status_code == 200
+    cities = client.get('/api/cities')
+    assert cities.headers['X-Total-Count'] == str(len(cities.json()))
+    assert client.get('/api/cities', headers={'If-None-Match': cities.headers['ETag']}).status_code == 304
+
+    # A model publish leaves the data payloads alone but drops the cached predictions
+    house = {'sqft': 1500, 'bed': 3, 'bath': 2, 'city': 'Irvine, CA'}
+    price = client.post('/api/predict', json=house).json()['predicted_price']
+    model = server.serving_state.model
+    server.publish_model(CompiledLinearModel(model.feature_names, model.coef, model.intercept + 1000))
+    response = client.post('/api/predict', json=house)
+    assert response.json()['predicted_price'] == pytest.approx(price + 1000)
+    assert response.headers['X-Model-Version'] == server.serving_state.model_version != model.version
+    assert client.get('/api/stats', headers={'If-None-Match': etag}).status_code == 304
+
+    # A data publish changes the payloads, so old ETags no longer match
+    client.get('/api/aggregate/histogram', params={'column': 'sqft'})
+    assert server.cached_histogram.cache_info().currsize > 0
+    csv_path = tmp_path / 'subset.csv'
+    pd.read_csv(server.CSV_PATH).iloc[:2000].to_csv(csv_path, index=False)
+    server.publish_data(dataset_from_frame(read_house_csv(csv_path)[0]))
+    assert server.cached_histogram.cache_info().currsize == 0
+    refreshed = client.get('/api/stats', headers={'If-None-Match': etag})
+    assert refreshed.status_code == 200 and refreshed.headers['ETag'] != etag
+    assert refreshed.json()['total_houses'] == 2000
+
+
+def test_listings_require_the_admin_token(server, client, monkeypatch):
+    listing = {'city': 'Irvine, CA', 'sqft': 1500, 'bed': 3, 'bath': 2, 'price': 900000}
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', None)
+    assert client.post('/api/listings', json=[listing], headers={'X-Admin-Token': 'x'}).status_code == 403
+    monkeypatch.setattr(server, 'ADMIN_TOKEN', 'test-token')
+    assert client.post('/api/listings', json=[listing]).status_code == 401
+    assert client.post('/api/listings', json=[listing], headers={'X-Admin-Token': 'x'}).status_code == 401
+
+
+def test_listings_are_published_as_a_new_data_version(server, client, admin):
+    csv_lines = server.LISTINGS_CSV_PATH.read_text().count('\n')
+    before = server.serving_state
+    stats = client.get('/api/stats')
+    client.get('/api/aggregate/histogram', params={'column': 'price', 'city': 'irvine'})
+
+    # One invalid row rejects the whole batch, and nothing is published or written
+    rejected = client.post('/api/listings', headers=admin, json=[
+        {'city': 'Irvine, CA', 'sqft': 1500, 'bed': 3, 'bath': 2, 'price': 900000},
+        {'city': 'Irvine, CA', 'sqft': 1500, 'bed': 0, 'bath': 2, 'price': 900000},
+    ])
+    assert rejected.status_code == 422 and rejected.json()['detail'][0]['loc'][1] == 1
+    assert client.post('/api/listings', headers=admin, json=[]).status_code == 400
+    assert server.serving_state is before
+    assert server.LISTINGS_CSV_PATH.read_text().count('\n') == csv_lines
+
+    response = client.post('/api/listings', headers=admin, json=[
+        {'city': 'irvine', 'sqft': 1500, 'bed': 3, 'bath': 2, 'price': 900000},
+        {'city': 'Testville, CA', 'sqft': 1200, 'bed': 2, 'bath': 1, 'price': 400000, 'street': '1 Main St'},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    total = before.data.house_stats['total_houses'] + 2
+    assert body == {'ingested': 2, 'total_houses': total, 'new_cities': ['Testville, CA'],
+                    'data_version': before.data_version + 1, 'model_version': None}
+    assert server.LISTINGS_CSV_PATH.read_text().count('\n') == csv_lines + 2
+    assert server.cached_histogram.cache_info().currsize == 0
+
+    refreshed = client.get('/api/stats', headers={'If-None-Match': stats.headers['ETag']})
+    assert refreshed.status_code == 200 and refreshed.json()['total_houses'] == total
+    assert refreshed.headers['X-Data-Version'] == str(before.data_version + 1)
+    counts = {c['city']: c['house_count'] for c in client.get('/api/cities').json()}
+    previous_counts = {c['city']: c['house_count'] for c in before.data.city_stats}
+    assert counts['Testville, CA'] == 1 and counts['Irvine, CA'] == previous_counts['Irvine, CA'] + 1
+    assert client.get('/api/cities/search', params={'q': 'testv'}).json()['results'][0]['city'] == 'Testville, CA'
+    # Listed, but the model has no offset for it until a refit
+    assert client.post('/api/predict', json={'sqft': 1200, 'bed': 2, 'bath': 1, 'city': 'Testville, CA'}).status_code == 400
+
+
+@pytest.mark.parametrize('city', ['   ', '!!!', ' - '])
+def test_listings_reject_blank_city_names(server, client, admin, city):
+    csv_lines = server.LISTINGS_CSV_PATH.read_text().count('\n')
+    before = server.serving_state
+    response = client.post('/api/listings', headers=admin, json=[
+        {'city': city, 'sqft': 1500, 'bed': 3, 'bath': 2, 'price': 900000}])
+    assert response.status_code == 422 and response.json()['detail'][0]['loc'][-1] == 'city'
+    assert server.serving_state is before
+    assert server.LISTINGS_CSV_PATH.read_text().count('\n') == csv_lines
+
+
+def test_refit_publishes_and_saves_the_online_model(server, client, admin):
+    assert client.post('/api/model/refit').status_code == 401
+    previous = server.serving_state.model_version
+    response = client.post('/api/model/refit', headers=admin)
+    assert response.status_code == 200
+    body = response.json()
+    assert body['previous_version'] == previous and body['model_version'] != previous and not body['saved']
+    assert body['train_rows'] == server.online_trainer.rows and body['cities'] > 0 and body['residual_sd'] > 0
+    predicted = client.post('/api/predict', json={'sqft': 1500, 'bed': 3, 'bath': 2, 'city': 'Irvine, CA'})
+    assert predicted.headers['X-Model-Version'] == body['model_version']
+    assert load_artifact(server.MODEL_ARTIFACT_PATH).version == previous
+
+    saved = client.post('/api/model/refit', params={'save': True}, headers=admin).json()
+    assert saved['saved'] and load_artifact(server.MODEL_ARTIFACT_PATH).version == saved['model_version']
+
+
+def test_refit_does_not_depend_on_when_listings_arrived(server, client, admin):
+    listings = [
+        {'city': 'Irvine, CA', 'sqft': 1500, 'bed': 3, 'bath': 2, 'price': 900000},
+        {'city': 'Irvine, CA', 'sqft': 1800, 'bed': 3, 'bath': 2, 'price': 950000},
+        # Far outside the loaded table's IQR bounds, so never learned from
+        {'city': 'Irvine, CA', 'sqft': 1500, 'bed': 3, 'bath': 2, 'price': 90000000},
+    ]
+    # Statistics built by the refit, then the listings arrive
+    client.post('/api/model/refit', headers=admin)
+    client.post('/api/listings', headers=admin, json=listings)
+    refit_after = client.post('/api/model/refit', headers=admin).json()
+
+    # Listings first, with no statistics built yet
+    server.load_house_data()
+    assert server.online_trainer is None
+    client.post('/api/listings', headers=admin, json=listings)
+    refit_before = client.post('/api/model/refit', headers=admin).json()
+
+    assert refit_before['model_version'] == refit_after['model_version']
+    assert refit_before['train_rows'] == refit_after['train_rows']
+
+
+def test_reload_serves_the_rewritten_artifact(server, client, admin):
+    house = {'sqft': 1500, 'bed': 3, 'bath': 2, 'city': 'Irvine, CA'}
+    before = client.post('/api/predict', json=house)
+    old = load_artifact(server.MODEL_ARTIFACT_PATH)
+    save_artifact(server.MODEL_ARTIFACT_PATH, old.feature_names, old.coef[:-1], old.intercept + 5000,
+                  old.metadata, old.intervals)
+    # Not picked up until the reload: the prediction cache still answers for the loaded model
+    assert client.post('/api/predict', json=house).json() == before.json()
+
+    assert client.post('/api/reload').status_code == 401
+    response = client.post('/api/reload', headers=admin)
+    assert response.status_code == 200
+    body = response.json()
+    new_version = load_artifact(server.MODEL_ARTIFACT_PATH).version
+    assert body['model_version'] == new_version != old.version
+    assert body['previous_snapshot_version'] == int(before.headers['X-Snapshot-Version'])
+    assert body['snapshot_version'] > body['previous_snapshot_version']
+    assert body['total_houses'] == len(server.serving_state.data.house_data)
+    assert {'data', 'model', 'validate'} <= set(body['build_ms'])
+
+    after = client.post('/api/predict', json=house)
+    assert after.json()['predicted_price'] == pytest.approx(before.json()['predicted_price'] + 5000)
+    assert after.headers['X-Model-Version'] == new_version
+    assert after.headers['X-Snapshot-Version'] == str(body['snapshot_version'])
+    assert after.headers['X-Data-Version'] == str(body['data_version'])
+
+
+def test_failed_reload_keeps_serving(server, client, admin):
+    before = server.serving_state
+    server.MODEL_ARTIFACT_PATH.write_text('{"format": "linear-regression", "version": 1, "feature_names": ["bed"], '
+                                          '"coef": [1.0], "intercept": 0.0, "metadata": {}}')
+    response = client.post('/api/reload', headers=admin)
+    assert response.status_code == 500 and 'still serving snapshot' in response.json()['detail']
+    assert server.serving_state is before
+
+
+def test_predict_rejects_inputs_that_overflow(server, client, monkeypatch):
+    house = {'sqft': 1500, 'bed': 3, 'bath': 2, 'city': 'Irvine, CA'}
+    for field, value in (('bath', 1e200), ('sqft', 10 ** 7), ('bed', 51)):
+        response = client.post('/api/predict', json={**house, field: value})
+        assert response.status_code == 422 and response.json()['detail'][0]['loc'][-1] == field
+
+    # Within the bounds, a model whose interval overflows is refused rather than serialized as Infinity
+    model = server.serving_state.model
+    monkeypatch.setattr(model, 'sigma2', float('inf'))
+    response = client.post('/api/predict', json={**house, 'sqft': 1499})
+    assert response.status_code == 422 and response.json()['detail'] == "Inputs are too far outside the data to price"
+
+
+def test_batch_fails_overflowing_items_on_their_own(server, client, restore_state):
+    # A city offset that overflows every price in that city
+    model = server.serving_state.model
+    coef = np.array(model.coef[:-1])
+    coef[model.feature_names.index('citi_Pasadena, CA')] = np.inf
+    server.publish_model(CompiledLinearModel(model.feature_names, coef, model.intercept, model.intervals))
+
+    house = {'sqft': 1500, 'bed': 3, 'bath': 2, 'city': 'Irvine, CA'}
+    response = client.post('/api/predict/batch', json=[house, {**house, 'city': 'Pasadena, CA'},
+                                                       {**house, 'bath': 1e200}, {**house, 'sqft': 2000}])
+    assert response.status_code == 200
+    body = response.json()
+    assert body['succeeded'] == 2 and body['failed'] == 2
+    results = body['results']
+    assert results[1]['error'] == "Model produced an invalid prediction" and results[1]['prediction'] is None
+    assert results[2]['error'].startswith('bath:')
+    assert results[3]['prediction']['predicted_price'] > results[0]['prediction']['predicted_price']
+
+
+def test_grid_rejects_values_beyond_the_feature_limits(client):
+    grid = {'cities': ['Irvine, CA'], 'sqft': [1e300], 'bed': [3], 'bath': [2]}
+    response = client.post('/api/predict/grid', json=grid)
+    assert response.status_code == 400 and response.json()['detail'].startswith('sqft: values must be at most')
+    response = client.post('/api/predict/grid', json={**grid, 'sqft': {'start': 1000, 'stop': 2000, 'step': 500}})
+    assert response.status_code == 200 and response.json()['shape'] == [1, 3, 1, 1]
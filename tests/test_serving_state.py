@@ -0,0 +1,50 @@
+import os
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from city_search import CityIndex
+from serving_state import PinServingState, ServingState, source_signature
+
+
+class Data:
+    def __init__(self, version):
+        self.version = version
+
+
+def test_requests_finish_on_the_state_they_arrived_on():
+    current = {'state': ServingState(Data(1), None, CityIndex([]), 1)}
+
+    async def handler(request: Request):
+        pinned = request.scope['serving_state']
+        # A reload publishing while the request is running
+        current['state'] = ServingState(Data(pinned.data.version + 1), None, CityIndex([]), pinned.version + 1)
+        body = await request.body()
+        return JSONResponse({'data_version': request.scope['serving_state'].data_version, 'size': len(body)})
+
+    app = Starlette(routes=[Route('/', handler, methods=['POST'])])
+    app.add_middleware(PinServingState, current=lambda: current['state'])
+    with TestClient(app) as client:
+        first = client.post('/', content=b'x' * 1000)
+        second = client.post('/')
+
+    assert first.json() == {'data_version': 1, 'size': 1000}
+    assert first.headers['x-snapshot-version'] == '1' and first.headers['x-data-version'] == '1'
+    assert first.headers['x-model-version'] == ''
+    assert second.json()['data_version'] == 2 and second.headers['x-snapshot-version'] == '2'
+
+
+def test_source_signature_tracks_rewrites(tmp_path):
+    path = tmp_path / 'houses.csv'
+    missing = tmp_path / 'missing.json'
+    path.write_text('a,b\n')
+    before = source_signature([path, missing])
+    assert before[1] is None
+    assert source_signature([path, missing]) == before
+
+    path.write_text('a,b\n1,2\n')
+    os.utime(path, ns=(before[0][0] + 1, before[0][0] + 1))
+    assert source_signature([path, missing]) != before
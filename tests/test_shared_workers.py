@@ -0,0 +1,102 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from dataset import write_snapshot
+
+BACKEND_DIR = Path(__file__).parent.parent / 'backend'
+
+pytestmark = pytest.mark.skipif(not Path('/proc/self/smaps').exists(), reason="needs Linux /proc smaps")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def worker_pids(parent_pid):
+    pids = []
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            status = (entry / 'status').read_text()
+            cmdline = (entry / 'cmdline').read_bytes()
+        except OSError:
+            continue
+        if f"PPid:\t{parent_pid}\n" in status and b'resource_tracker' not in cmdline:
+            pids.append(int(entry.name))
+    return pids
+
+
+def memory_kb(pid, path_prefix):
+    """Total (Rss, Pss) of a process, plus (Rss, Pss) of its mappings under ``path_prefix``"""
+    totals = {'Rss': 0, 'Pss': 0}
+    mapped = {'Rss': 0, 'Pss': 0}
+    in_prefix = False
+    for line in Path(f'/proc/{pid}/smaps').read_text().splitlines():
+        fields = line.split()
+        if not fields[0].endswith(':'):
+            # Mapping header: address perms offset dev inode [path]
+            in_prefix = len(fields) >= 6 and fields[5].startswith(path_prefix)
+        elif fields[0][:-1] in totals:
+            totals[fields[0][:-1]] += int(fields[1])
+            if in_prefix:
+                mapped[fields[0][:-1]] += int(fields[1])
+    return totals, mapped
+
+
+def measure_workers(workers, snapshot_path):
+    """Start uvicorn with ``workers`` processes and return per-worker memory once all have loaded"""
+    port = free_port()
+    env = dict(os.environ, HOUSE_SNAPSHOT_PATH=str(snapshot_path))
+    proc = subprocess.Popen(
+        [sys.executable, '-W', 'ignore', '-m', 'uvicorn', 'server:app', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            # uvicorn only forks workers when asked for more than one
+            pids = worker_pids(proc.pid) if workers > 1 else [proc.pid]
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/api/stats', timeout=1).read()
+                samples = [memory_kb(pid, str(snapshot_path)) for pid in pids]
+                if len(pids) == workers and all(mapped['Rss'] > 0 for _, mapped in samples):
+                    return samples
+            except OSError:
+                pass
+            time.sleep(0.25)
+        raise AssertionError(f"{workers} workers did not all load the snapshot in time")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def test_workers_share_snapshot_pages(tmp_path):
+    snapshot_path = write_snapshot(snapshot_path=tmp_path / 'socal2.snapshot')
+
+    report = {}
+    for workers in (1, 3):
+        samples = measure_workers(workers, snapshot_path)
+        report[workers] = {
+            'total_rss_kb': sum(totals['Rss'] for totals, _ in samples),
+            'total_pss_kb': sum(totals['Pss'] for totals, _ in samples),
+            'snapshot_rss_kb': sum(mapped['Rss'] for _, mapped in samples),
+            'snapshot_pss_kb': sum(mapped['Pss'] for _, mapped in samples),
+        }
+        print(f"\n{workers} worker(s): {report[workers]}")
+
+    single, multi = report[1], report[3]
+    # Each worker maps the snapshot, but the pages exist once: proportional
+    # usage across three workers stays close to a single worker's copy
+    assert multi['snapshot_rss_kb'] >= 2 * single['snapshot_rss_kb']
+    assert multi['snapshot_pss_kb'] <= 1.5 * single['snapshot_pss_kb']
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sparse_training import read_listing_columns, sparse_design, train_dense, train_price_model, write_synthetic_csv
+
+CSV_PATH = Path(__file__).parent.parent / 'socal2.csv'
+
+
+@pytest.fixture(scope='module')
+def sample_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('training') / 'sample.csv'
+    pd.read_csv(CSV_PATH).iloc[:3000].to_csv(path, index=False)
+    return path
+
+
+def test_chunked_read_matches_read_csv(sample_csv):
+    listings = read_listing_columns(sample_csv, chunksize=700)
+    df = pd.read_csv(sample_csv)
+    assert [listings.city_names[c] for c in listings.city_codes] == df['citi'].tolist()
+    for col in ('bed', 'bath', 'sqft', 'price'):
+        assert np.array_equal(listings.columns[col], df[col].to_numpy())
+
+
+def test_sparse_design_matches_get_dummies(sample_csv):
+    listings = read_listing_columns(sample_csv)
+    numeric = np.column_stack([listings.columns[c].astype(float) for c in ('bed', 'bath', 'sqft')])
+    design, cities = sparse_design(listings.city_codes, numeric, listings.city_names)
+    dense = pd.get_dummies(pd.read_csv(sample_csv)[['citi', 'bed', 'bath', 'sqft']], columns=['citi'], dtype=float)
+    assert ['citi_' + city for city in cities] == dense.columns[3:].tolist()
+    assert np.array_equal(design.toarray(), dense.to_numpy())
+
+
+def test_sparse_fit_matches_dense_pipeline(sample_csv, tmp_path):
+    # Jittered copies, so the fit sees repeated cities with different prices
+    scaled = tmp_path / 'x3.csv'
+    write_synthetic_csv(sample_csv, scaled, 3)
+    for path in (sample_csv, scaled):
+        trained = train_price_model(path)
+        dense, r2_test = train_dense(path)
+        assert trained.feature_names == dense.feature_names_in_.tolist()
+        assert trained.model.coef_ == pytest.approx(dense.coef_, abs=1e-3)
+        assert trained.model.intercept_ == pytest.approx(dense.intercept_, abs=1e-3)
+        assert trained.r2_test == pytest.approx(r2_test, abs=1e-9)
+
+    # In the small sample some cities are only in the test split; like the dense fit, they get no offset
+    trained = train_price_model(sample_csv)
+    unseen = np.flatnonzero(np.asarray(trained.intervals['city_counts']) == 0)
+    assert len(unseen) > 0
+    assert np.all(trained.model.coef_[3 + unseen] == 0)
@@ -0,0 +1,11 @@
+from dataset import write_snapshot
+from startup_benchmark import measure_startup
+
+
+def test_server_starts_without_deferred_dependencies(tmp_path, monkeypatch):
+    # Without a snapshot the server parses the CSV with pandas; build one rather than rely on a local copy
+    snapshot_path = write_snapshot(snapshot_path=tmp_path / 'socal2.snapshot')
+    monkeypatch.setenv('HOUSE_SNAPSHOT_PATH', str(snapshot_path))
+    report = measure_startup(runs=1)
+    assert report['deferred_modules_loaded'] == []
+    assert {'model', 'data', 'response_cache', 'ready'} <= set(report['server_components'])
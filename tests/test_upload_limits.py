@@ -0,0 +1,81 @@
+import asyncio
+import io
+
+from fastapi import FastAPI, File, UploadFile
+from PIL import Image
+
+from upload_limits import ImageUploadGuard, sniff_multipart_image
+
+BOUNDARY = b'----testboundary'
+CHUNK = 64 * 1024
+
+
+def multipart_body(payload: bytes, field='image') -> bytes:
+    return (b'--' + BOUNDARY + b'\r\n'
+            b'Content-Disposition: form-data; name="' + field.encode() + b'"; filename="photo.jpg"\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + payload + b'\r\n--' + BOUNDARY + b'--\r\n')
+
+
+def jpeg_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def post(body: bytes, max_bytes: int, declare_length: bool = True):
+    """Send ``body`` through the guard in CHUNK-sized messages; returns (status, chunks read)"""
+    app = FastAPI()
+
+    @app.post('/upload')
+    async def upload(image: UploadFile = File(...)):
+        return {'size': image.size}
+
+    guarded = ImageUploadGuard(app, paths=['/upload'], max_bytes=max_bytes)
+    headers = [(b'content-type', b'multipart/form-data; boundary=' + BOUNDARY)]
+    if declare_length:
+        headers.append((b'content-length', str(len(body)).encode()))
+    scope = {'type': 'http', 'method': 'POST', 'path': '/upload', 'headers': headers,
+             'query_string': b'', 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+             'server': ('test', 80), 'client': ('test', 1)}
+    chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+    read = 0
+    sent = {}
+
+    async def receive():
+        nonlocal read
+        read += 1
+        if read > len(chunks):
+            return {'type': 'http.disconnect'}
+        return {'type': 'http.request', 'body': chunks[read - 1], 'more_body': read < len(chunks)}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            sent['status'] = message['status']
+
+    asyncio.run(guarded(scope, receive, send))
+    return sent['status'], read
+
+
+def test_sniff_multipart_image():
+    assert sniff_multipart_image(multipart_body(jpeg_bytes()), BOUNDARY, 'image') is True
+    assert sniff_multipart_image(multipart_body(b'%PDF-1.7 not an image'), BOUNDARY, 'image') is False
+    assert sniff_multipart_image(multipart_body(b'\xff\xd8')[:-30], BOUNDARY, 'image') is None
+    assert sniff_multipart_image(multipart_body(jpeg_bytes(), field='other'), BOUNDARY, 'image') is None
+
+
+def test_image_within_cap_is_accepted():
+    assert post(multipart_body(jpeg_bytes()), max_bytes=1024 * 1024)[0] == 200
+
+
+def test_non_image_rejected_after_first_chunk():
+    status, read = post(multipart_body(b'not an image' * 100000), max_bytes=10 * 1024 * 1024)
+    assert status == 415 and read == 1
+
+
+def test_oversized_upload_rejected_early():
+    body = multipart_body(jpeg_bytes() + b'\0' * (2 * 1024 * 1024))
+    status, read = post(body, max_bytes=1024 * 1024)
+    assert status == 413 and read == 0
+    # Without a Content-Length the cap applies while the body streams in
+    status, read = post(body, max_bytes=1024 * 1024, declare_length=False)
+    assert status == 413 and read * CHUNK < len(body)
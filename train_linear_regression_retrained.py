@@ -1,68 +1,51 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score
+import sys
+from datetime import datetime, timezone
+import sklearn
 import joblib
 
-# Load the data
-# Use the same file as before
-# Note: Adjust the path if needed
+sys.path.insert(0, 'backend')
+from predictor import save_artifact
+from sparse_training import train_price_model
 
-df = pd.read_csv('socal2.csv')
-
-# Remove outliers using the IQR method for key numeric columns
-def remove_outliers_iqr(df, columns):
-    for col in columns:
-        Q1 = df[col].quantile(0.25)
-        Q3 = df[col].quantile(0.75)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        df = df[(df[col] >= lower) & (df[col] <= upper)]
-    return df
-
-# Columns to check for outliers (excluding one-hot/categorical)
-outlier_cols = ['price', 'sqft', 'bed', 'bath']
-df = remove_outliers_iqr(df, outlier_cols)
-
-# Drop non-numeric, non-useful columns
-if 'street' in df.columns:
-    df = df.drop(columns=['street'])
-if 'image_id' in df.columns:
-    df = df.drop(columns=['image_id'])
-if 'n_citi' in df.columns:
-    df = df.drop(columns=['n_citi'])
-
-# One-hot encode the city column (as before)
-df = pd.get_dummies(df, columns=['citi'])
-
-# Define features and target
-X = df.drop(columns=['price'])
-y = df['price']
-
-# Split into train and test sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Train the model
-model = LinearRegression()
-model.fit(X_train, y_train)
+# Load the data, remove outliers (1.5 IQR rule on price, sqft, bed, bath),
+# one-hot encode the city and fit on an 80/20 split, as before. The CSV is
+# streamed in chunks and the city dummies form a sparse matrix, so memory
+# grows with rows rather than rows x cities; see backend/sparse_training.py
+# (python backend/sparse_training.py bench compares it with the dense path).
+trained = train_price_model('socal2.csv', test_size=0.2, random_state=42)
+model = trained.model
 
 # Evaluate the model
-# R^2 on test set
-y_pred = model.predict(X_test)
-r2_test = r2_score(y_test, y_pred)
-print(f'R^2 score (test): {r2_test:.3f}')
-
-# R^2 on training set
-y_train_pred = model.predict(X_train)
-r2_train = r2_score(y_train, y_train_pred)
-print(f'R^2 score (train): {r2_train:.3f}')
+print(f'R^2 score (test): {trained.r2_test:.3f}')
+print(f'R^2 score (train): {trained.r2_train:.3f}')
 
 # Print intercept and coefficients
 print('Intercept:', model.intercept_)
 print('Coefficients:')
-for name, coef in zip(X.columns, model.coef_):
+for name, coef in zip(trained.feature_names, model.coef_):
     print(f'{name}: {coef}')
 
+# Statistics the backend needs for per-request prediction intervals
+intervals = trained.intervals
+print(f"Residual standard deviation: {intervals['sigma2'] ** 0.5:.0f} ({intervals['dof']} degrees of freedom)")
+
 # Save the trained model for backend use
-joblib.dump(model, 'linear_regression_model_retrained.joblib') 
\ No newline at end of file
+joblib.dump(model, 'linear_regression_model_retrained.joblib')
+
+# Also export a lean JSON artifact so the backend can serve predictions
+# without importing sklearn (read by backend/predictor.py:load_artifact)
+metadata = {
+    'trained_at': datetime.now(timezone.utc).isoformat(),
+    'source': 'socal2.csv',
+    'estimator': type(model).__name__,
+    'sklearn_version': sklearn.__version__,
+    'train_rows': trained.train_rows,
+    'test_rows': trained.test_rows,
+    'test_size': 0.2,
+    'random_state': 42,
+    'r2_train': trained.r2_train,
+    'r2_test': trained.r2_test
+}
+# Written atomically: the server may be watching this file (RELOAD_POLL_SECONDS)
+save_artifact('linear_regression_model_retrained.json', trained.feature_names, model.coef_, model.intercept_,
+              metadata, intervals)